@@ -2,6 +2,7 @@
 多平台 API 客户端 - 支持OpenRouter、硅基流动和AgentWorld GPT-5.1
 """
 import requests
+import asyncio
 import json
 import time
 from typing import Dict, Any, Optional
@@ -9,6 +10,10 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from config import OPENROUTER_CONFIG, SILICONFLOW_CONFIG
+from http_session import SessionPool, AsyncSessionPool
+from rate_limiter import get_rate_limiter, estimate_tokens, provider_of
+from key_scheduler import get_key_scheduler, parse_retry_after, STATE_NAMES
+from llm_cache import LLMCache
 
 # AgentWorld 配置
 AGENTWORLD_CONFIG = {
@@ -27,7 +32,14 @@ AGENTWORLD_CONFIG = {
 class OpenRouterClient:
     """多平台API客户端,支持硅基流动和OpenRouter"""
     
-    def __init__(self):
+    def __init__(self, pool_size: Optional[int] = None, pool_retries: Optional[int] = None, max_in_flight: Optional[int] = None, cache: Optional[LLMCache] = None):
+        """
+        Args:
+            pool_size: 每个API地址的连接池大小(默认见 HTTP_POOL_CONFIG)
+            pool_retries: 连接建立失败时的适配器重试次数
+            max_in_flight: 异步调用时每个服务商的在途请求上限(默认见 ASYNC_HTTP_CONFIG)
+            cache: 响应缓存(可选)
+        """
         # 优先使用硅基流动(付费稳定)
         self.use_siliconflow = True
         
@@ -41,16 +53,41 @@ class OpenRouterClient:
         self.or_models = OPENROUTER_CONFIG["models"]
         self.or_base_url = OPENROUTER_CONFIG["base_url"]
         
-        # 当前使用的索引
+        # 当前使用的索引(由密钥调度器在每次请求时更新)
         self.current_key_index = 0
         self.current_model_index = 0
         
+        # 密钥调度: 硅基流动密钥优先，OpenRouter备用；
+        # 限流的密钥冷却到期后自动恢复，硅基流动恢复后重新优先使用
+        self.key_scheduler = get_key_scheduler()
+        self.key_candidates = [
+            {"provider": provider_of(self.sf_base_url), "key": key, "priority": 0, "siliconflow": True, "index": i,
+             "base_url": self.sf_base_url, "models": self.sf_models}
+            for i, key in enumerate(self.sf_api_keys)
+        ] + [
+            {"provider": provider_of(self.or_base_url), "key": key, "priority": 1, "siliconflow": False, "index": i,
+             "base_url": self.or_base_url, "models": self.or_models}
+            for i, key in enumerate(self.or_api_keys)
+        ]
+        
+        # keep-alive 连接池(硅基流动和OpenRouter各一个Session)
+        self.http = SessionPool(pool_maxsize=pool_size, max_retries=pool_retries)
+        # asyncio 连接池(acall_llm 使用)
+        self.ahttp = AsyncSessionPool(max_in_flight=max_in_flight)
+        # 进程内共享的限流器，按 (服务商, 密钥) 限制每分钟请求数/token数
+        self.rate_limiter = get_rate_limiter()
+        # 响应缓存(可选)
+        self.cache = cache
+        
         # 统计信息
         self.stats = {
             "total_requests": 0,
             "successful_requests": 0,
             "failed_requests": 0,
-            "key_switches": 0,
+            "cache_hits": 0,
+            "key_cooldowns": 0,
+            "key_disables": 0,
+            "platform_switches": 0,
             "model_switches": 0
         }
     
@@ -68,6 +105,19 @@ class OpenRouterClient:
         else:
             return self.or_models[self.current_model_index]
     
+    def _cache_model(self) -> str:
+        """
+        响应缓存键中的模型: 本次调用请求的模型(首选平台上 current_model_index 所指的模型)
+        
+        请求实际使用的平台取决于调度器选出的密钥，会随其他线程的请求变化；
+        缓存键取调用开始时请求的模型，不随平台回退改变，--cache-replay 才能稳定命中
+        (缓存记录中另存实际应答的模型)
+        """
+        if self.key_candidates:
+            models = self.key_candidates[0]["models"]
+            return models[self.current_model_index % len(models)]
+        return self._get_current_model()
+    
     def _get_current_base_url(self) -> str:
         """获取当前API基础URL"""
         if self.use_siliconflow:
@@ -75,28 +125,29 @@ class OpenRouterClient:
         else:
             return self.or_base_url
     
-    def _switch_key(self):
-        """切换到下一个API密钥"""
-        if self.use_siliconflow:
-            api_keys = self.sf_api_keys
-            platform = "硅基流动"
-        else:
-            api_keys = self.or_api_keys
-            platform = "OpenRouter"
-            
-        self.current_key_index = (self.current_key_index + 1) % len(api_keys)
-        self.stats["key_switches"] += 1
-        print(f"⚠️  切换{platform}API密钥 -> 密钥 #{self.current_key_index + 1}")
-    
-    def _switch_platform(self):
-        """切换平台(从硅基流动切换到OpenRouter)"""
-        if self.use_siliconflow:
-            self.use_siliconflow = False
-            self.current_key_index = 0
+    def _use_candidate(self, choice: Dict[str, Any]):
+        """切换到调度器选出的密钥(平台变化时记录；同一平台内按最久未用轮换密钥不计数)"""
+        if choice["siliconflow"] != self.use_siliconflow:
+            self.use_siliconflow = choice["siliconflow"]
             self.current_model_index = 0
-            print(f"🔄 切换到OpenRouter平台")
+            self.stats["platform_switches"] += 1
+            print(f"🔄 切换到{'硅基流动' if self.use_siliconflow else 'OpenRouter'}平台")
+        self.current_key_index = choice["index"]
+    
+    def _report_failure(self, choice: Dict[str, Any], status: Optional[int], retry_after: Optional[str] = None):
+        """把失败的请求结果报告给密钥调度器"""
+        platform = "硅基流动" if choice["siliconflow"] else "OpenRouter"
+        if status == 429:
+            cooldown = self.key_scheduler.report_rate_limited(choice["provider"], choice["key"], parse_retry_after(retry_after))
+            self.stats["key_cooldowns"] += 1
+            print(f"⏳ {platform}密钥 #{choice['index'] + 1} 遇到限流(429),冷却 {cooldown:.0f} 秒")
+        elif status == 401:
+            self.key_scheduler.report_invalid(choice["provider"], choice["key"])
+            self.stats["key_disables"] += 1
+            print(f"⚠️  {platform}密钥 #{choice['index'] + 1} 无效(401),已禁用")
         else:
-            print(f"⚠️  已经在使用OpenRouter平台")
+            if self.key_scheduler.report_error(choice["provider"], choice["key"]) > 0:
+                self.stats["key_cooldowns"] += 1
     
     def _switch_model(self):
         """切换到下一个模型"""
@@ -130,17 +181,38 @@ class OpenRouterClient:
         Returns:
             生成的文本,失败返回None
         """
+        # 查询响应缓存(以调用开始时请求的模型为键，与本次请求落在哪个平台无关)
+        if self.cache:
+            cache_key, cached = self.cache.lookup(
+                self._cache_model(), [{"role": "user", "content": prompt}], temperature, max_tokens
+            )
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            if self.cache.replay:
+                return None
+        
         self.stats["total_requests"] += 1
         
         for attempt in range(max_retries):
+            # 选出当前最健康的密钥(全部冷却时等待最早恢复的密钥)
+            choice = self.key_scheduler.acquire(self.key_candidates)
+            if choice is None:
+                print(f"❌ 所有API密钥均已失效(401)")
+                break
+            self._use_candidate(choice)
+            
             try:
+                # 密钥、地址和模型都取自本次选中的候选(其他线程可能同时切换平台)
+                current_key = choice["key"]
+                base_url = choice["base_url"]
                 headers = {
-                    "Authorization": f"Bearer {self._get_current_key()}",
+                    "Authorization": f"Bearer {current_key}",
                     "Content-Type": "application/json"
                 }
                 
                 payload = {
-                    "model": self._get_current_model(),
+                    "model": choice["models"][self.current_model_index % len(choice["models"])],
                     "messages": [
                         {"role": "user", "content": prompt}
                     ],
@@ -148,8 +220,13 @@ class OpenRouterClient:
                     "max_tokens": max_tokens
                 }
                 
-                response = requests.post(
-                    self._get_current_base_url(),
+                # 应用限流(同一密钥的所有客户端共享配额)
+                provider = choice["provider"]
+                estimated_tokens = estimate_tokens(payload["messages"], max_tokens)
+                self.rate_limiter.acquire(provider, current_key, estimated_tokens)
+                
+                response = self.http.post(
+                    base_url,
                     headers=headers,
                     json=payload,
                     timeout=60
@@ -159,56 +236,130 @@ class OpenRouterClient:
                 if response.status_code == 200:
                     result = response.json()
                     content = result["choices"][0]["message"]["content"]
+                    self.rate_limiter.record_usage(
+                        provider, current_key, estimated_tokens,
+                        (result.get("usage") or {}).get("total_tokens")
+                    )
+                    self.key_scheduler.report_success(provider, current_key)
+                    if self.cache:
+                        self.cache.put(cache_key, payload["model"], content)
                     self.stats["successful_requests"] += 1
                     return content
                 
-                # 处理限流错误 (429)
-                elif response.status_code == 429:
-                    error_data = response.json()
-                    error_msg = error_data.get("error", {}).get("message", "")
-                    
-                    # 如果是硅基流动且已经尝试过所有密钥,切换到OpenRouter
-                    if self.use_siliconflow and self.current_key_index >= len(self.sf_api_keys) - 1:
-                        print(f"⚠️  硅基流动密钥已用完,切换到OpenRouter...")
-                        self._switch_platform()
-                    else:
-                        # 遇到限流直接切换API密钥
-                        print(f"⏳ 遇到限流(429),切换API密钥... (尝试 {attempt + 1}/{max_retries})")
-                        self._switch_key()
-                    
-                    time.sleep(0.5)  # 短暂等待
-                
-                # 处理认证错误 (401) - 无效密钥,快速切换
-                elif response.status_code == 401:
-                    print(f"⚠️  密钥 #{self.current_key_index + 1} 无效(401),切换...")
-                    # 如果是硅基流动且已经尝试过所有密钥,切换到OpenRouter
-                    if self.use_siliconflow and self.current_key_index >= len(self.sf_api_keys) - 1:
-                        print(f"⚠️  硅基流动密钥已用完,切换到OpenRouter...")
-                        self._switch_platform()
-                    else:
-                        self._switch_key()
-                    time.sleep(0.2)  # 无效密钥快速切换
-                
-                # 处理其他错误
-                else:
+                # 限流(429)按 Retry-After 冷却该密钥, 认证错误(401)禁用该密钥
+                if response.status_code not in (429, 401):
                     print(f"❌ API错误 {response.status_code}: {response.text[:100]}")
-                    self._switch_key()
-                    time.sleep(1)
+                self._report_failure(choice, response.status_code, response.headers.get("Retry-After"))
                     
             except requests.exceptions.Timeout:
+                # 超时不代表密钥有问题, 直接重试
                 print(f"⏱️  请求超时,重试... (尝试 {attempt + 1}/{max_retries})")
                 time.sleep(2)
                 
             except Exception as e:
                 print(f"❌ 未知错误: {str(e)}")
-                self._switch_key()
-                time.sleep(2)
+                self._report_failure(choice, None)
         
         # 所有重试都失败
         self.stats["failed_requests"] += 1
         print(f"❌ 请求失败,已达到最大重试次数 ({max_retries})")
         return None
     
+    async def acall_llm(
+        self, 
+        prompt: str, 
+        max_retries: int = 50,
+        temperature: float = 0.8,
+        max_tokens: int = 4000
+    ) -> Optional[str]:
+        """
+        call_llm 的异步版本: 密钥/模型/平台切换规则相同，
+        退避使用 asyncio.sleep，在途请求数受服务商信号量限制
+        
+        Returns:
+            生成的文本,失败返回None
+        """
+        # 查询响应缓存(以调用开始时请求的模型为键，与本次请求落在哪个平台无关)
+        if self.cache:
+            cache_key, cached = self.cache.lookup(
+                self._cache_model(), [{"role": "user", "content": prompt}], temperature, max_tokens
+            )
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            if self.cache.replay:
+                return None
+        
+        self.stats["total_requests"] += 1
+        
+        for attempt in range(max_retries):
+            choice = await self.key_scheduler.aacquire(self.key_candidates)
+            if choice is None:
+                print(f"❌ 所有API密钥均已失效(401)")
+                break
+            self._use_candidate(choice)
+            
+            try:
+                # 密钥、地址和模型都取自本次选中的候选(其他线程可能同时切换平台)
+                current_key = choice["key"]
+                base_url = choice["base_url"]
+                headers = {
+                    "Authorization": f"Bearer {current_key}",
+                    "Content-Type": "application/json"
+                }
+                
+                payload = {
+                    "model": choice["models"][self.current_model_index % len(choice["models"])],
+                    "messages": [
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": temperature,
+                    "max_tokens": max_tokens
+                }
+                
+                provider = choice["provider"]
+                estimated_tokens = estimate_tokens(payload["messages"], max_tokens)
+                await self.rate_limiter.aacquire(provider, current_key, estimated_tokens)
+                
+                async with self.ahttp.post(
+                    base_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=60
+                ) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    body = await response.text()
+                
+                if status == 200:
+                    result = json.loads(body)
+                    content = result["choices"][0]["message"]["content"]
+                    self.rate_limiter.record_usage(
+                        provider, current_key, estimated_tokens,
+                        (result.get("usage") or {}).get("total_tokens")
+                    )
+                    self.key_scheduler.report_success(provider, current_key)
+                    if self.cache:
+                        self.cache.put(cache_key, payload["model"], content)
+                    self.stats["successful_requests"] += 1
+                    return content
+                
+                if status not in (429, 401):
+                    print(f"❌ API错误 {status}: {body[:100]}")
+                self._report_failure(choice, status, retry_after)
+                    
+            except asyncio.TimeoutError:
+                print(f"⏱️  请求超时,重试... (尝试 {attempt + 1}/{max_retries})")
+                await asyncio.sleep(2)
+                
+            except Exception as e:
+                print(f"❌ 未知错误: {str(e)}")
+                self._report_failure(choice, None)
+        
+        self.stats["failed_requests"] += 1
+        print(f"❌ 请求失败,已达到最大重试次数 ({max_retries})")
+        return None
+    
     def print_stats(self):
         """打印统计信息"""
         print("\n" + "="*50)
@@ -217,8 +368,14 @@ class OpenRouterClient:
         print(f"总请求数: {self.stats['total_requests']}")
         print(f"成功: {self.stats['successful_requests']}")
         print(f"失败: {self.stats['failed_requests']}")
-        print(f"API密钥切换次数: {self.stats['key_switches']}")
+        if self.cache:
+            print(f"缓存命中: {self.stats['cache_hits']}")
+        print(f"密钥冷却次数: {self.stats['key_cooldowns']}")
+        print(f"密钥禁用次数: {self.stats['key_disables']}")
+        print(f"平台切换次数: {self.stats['platform_switches']}")
         print(f"模型切换次数: {self.stats['model_switches']}")
+        summary = self.key_scheduler.summary(self.key_candidates)
+        print("密钥状态: " + ", ".join(f"{STATE_NAMES[state]} {count}" for state, count in summary.items()))
         platform = "硅基流动" if self.use_siliconflow else "OpenRouter"
         print(f"当前平台: {platform}")
         print(f"当前使用: 密钥 #{self.current_key_index + 1}, 模型 {self._get_current_model()}")
@@ -228,17 +385,34 @@ class OpenRouterClient:
 class AgentWorldClient:
     """AgentWorld GPT-5.1 API客户端"""
     
-    def __init__(self):
+    def __init__(self, pool_size: Optional[int] = None, pool_retries: Optional[int] = None, max_in_flight: Optional[int] = None, cache: Optional[LLMCache] = None):
+        """
+        Args:
+            pool_size: 连接池大小(默认见 HTTP_POOL_CONFIG)
+            pool_retries: 连接建立失败时的适配器重试次数
+            max_in_flight: 异步调用时的在途请求上限(默认见 ASYNC_HTTP_CONFIG)
+            cache: 响应缓存(可选)
+        """
         self.model_api_mapping = AGENTWORLD_CONFIG["model_api_mapping"]
         self.base_url = AGENTWORLD_CONFIG["base_url"]
         self.models = AGENTWORLD_CONFIG["models"]
         self.current_model_index = 0
         
+        # keep-alive 连接池
+        self.http = SessionPool(pool_maxsize=pool_size, max_retries=pool_retries)
+        # asyncio 连接池(acall_llm 使用)
+        self.ahttp = AsyncSessionPool(max_in_flight=max_in_flight)
+        # 进程内共享的限流器，按 (服务商, 密钥) 限制每分钟请求数/token数
+        self.rate_limiter = get_rate_limiter()
+        # 响应缓存(可选)
+        self.cache = cache
+        
         # 统计信息
         self.stats = {
             "total_requests": 0,
             "successful_requests": 0,
             "failed_requests": 0,
+            "cache_hits": 0,
             "model_switches": 0
         }
         
@@ -285,13 +459,26 @@ class AgentWorldClient:
         Returns:
             生成的文本,失败返回None
         """
+        # 查询响应缓存(以调用开始时请求的模型为键，调用中切换模型不影响缓存键；
+        # 目标模型由 current_model_index 指定，见 pipeline 的 --model)
+        if self.cache:
+            cache_key, cached = self.cache.lookup(
+                self.get_current_model(), [{"role": "user", "content": prompt}], temperature, max_tokens
+            )
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            if self.cache.replay:
+                return None
+        
         self.stats["total_requests"] += 1
         
         for attempt in range(max_retries):
             try:
+                current_key = self.get_current_api_key()
                 headers = {
                     'Accept': 'text/event-stream' if stream else 'application/json',
-                    'Authorization': f'Bearer {self.get_current_api_key()}',
+                    'Authorization': f'Bearer {current_key}',
                     'Content-Type': 'application/json'
                 }
                 
@@ -305,7 +492,12 @@ class AgentWorldClient:
                     "stream": stream
                 }
                 
-                response = requests.post(
+                # 应用限流(同一密钥的所有客户端共享配额)
+                provider = provider_of(self.base_url)
+                estimated_tokens = estimate_tokens(payload["messages"], max_tokens)
+                self.rate_limiter.acquire(provider, current_key, estimated_tokens)
+                
+                response = self.http.post(
                     self.base_url,
                     headers=headers,
                     json=payload,
@@ -331,19 +523,28 @@ class AgentWorldClient:
                                                 content += delta['content']
                                     except json.JSONDecodeError:
                                         continue
+                        if self.cache:
+                            self.cache.put(cache_key, payload["model"], content)
                         self.stats["successful_requests"] += 1
                         return content
                     else:
                         # 处理普通响应
                         result = response.json()
                         content = result["choices"][0]["message"]["content"]
+                        self.rate_limiter.record_usage(
+                            provider, current_key, estimated_tokens,
+                            (result.get("usage") or {}).get("total_tokens")
+                        )
+                        if self.cache:
+                            self.cache.put(cache_key, payload["model"], content)
                         self.stats["successful_requests"] += 1
                         return content
                 
                 # 处理限流错误 (429)
                 elif response.status_code == 429:
                     print(f"⏳ 遇到限流(429),等待重试... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(2 ** attempt)  # 指数退避
+                    # 优先按 Retry-After 等待，否则指数退避
+                    time.sleep(parse_retry_after(response.headers.get("Retry-After")) or 2 ** attempt)
                 
                 # 处理认证错误 (401) - 尝试切换模型
                 elif response.status_code == 401:
@@ -380,6 +581,135 @@ class AgentWorldClient:
         print(f"❌ 请求失败,已达到最大重试次数 ({max_retries})")
         return None
     
+    async def acall_llm(
+        self, 
+        prompt: str, 
+        max_retries: int = 10,
+        temperature: float = 0.8,
+        max_tokens: int = 4000,
+        stream: bool = False
+    ) -> Optional[str]:
+        """
+        call_llm 的异步版本: 模型切换规则相同，
+        退避使用 asyncio.sleep，在途请求数受服务商信号量限制
+        
+        Returns:
+            生成的文本,失败返回None
+        """
+        # 查询响应缓存(以调用开始时请求的模型为键，调用中切换模型不影响缓存键；
+        # 目标模型由 current_model_index 指定，见 pipeline 的 --model)
+        if self.cache:
+            cache_key, cached = self.cache.lookup(
+                self.get_current_model(), [{"role": "user", "content": prompt}], temperature, max_tokens
+            )
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            if self.cache.replay:
+                return None
+        
+        self.stats["total_requests"] += 1
+        
+        for attempt in range(max_retries):
+            try:
+                current_key = self.get_current_api_key()
+                headers = {
+                    'Accept': 'text/event-stream' if stream else 'application/json',
+                    'Authorization': f'Bearer {current_key}',
+                    'Content-Type': 'application/json'
+                }
+                
+                payload = {
+                    "model": self.get_current_model(),
+                    "messages": [
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "stream": stream
+                }
+                
+                content = None
+                # 应用限流(同一密钥的所有客户端共享配额)
+                provider = provider_of(self.base_url)
+                estimated_tokens = estimate_tokens(payload["messages"], max_tokens)
+                await self.rate_limiter.aacquire(provider, current_key, estimated_tokens)
+                
+                async with self.ahttp.post(
+                    self.base_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=120
+                ) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    if status == 200 and stream:
+                        # 逐行读取流式响应
+                        content = ""
+                        async for raw_line in response.content:
+                            line = raw_line.decode('utf-8').strip()
+                            if not line.startswith('data: '):
+                                continue
+                            if line == 'data: [DONE]':
+                                break
+                            try:
+                                data = json.loads(line[6:])
+                                if 'choices' in data and len(data['choices']) > 0:
+                                    delta = data['choices'][0].get('delta', {})
+                                    if 'content' in delta:
+                                        content += delta['content']
+                            except json.JSONDecodeError:
+                                continue
+                    else:
+                        body = await response.text()
+                
+                if status == 200:
+                    if content is None:
+                        result = json.loads(body)
+                        content = result["choices"][0]["message"]["content"]
+                        self.rate_limiter.record_usage(
+                            provider, current_key, estimated_tokens,
+                            (result.get("usage") or {}).get("total_tokens")
+                        )
+                    if self.cache:
+                        self.cache.put(cache_key, payload["model"], content)
+                    self.stats["successful_requests"] += 1
+                    return content
+                
+                elif status == 429:
+                    print(f"⏳ 遇到限流(429),等待重试... (尝试 {attempt + 1}/{max_retries})")
+                    await asyncio.sleep(parse_retry_after(retry_after) or 2 ** attempt)
+                
+                elif status == 401:
+                    print(f"❌ 认证失败(401),尝试切换模型...")
+                    self.switch_model()
+                    await asyncio.sleep(1)
+                
+                elif status == 400:
+                    if "model" in body.lower():
+                        print(f"⚠️  模型错误,尝试切换模型...")
+                        self.switch_model()
+                        await asyncio.sleep(1)
+                    else:
+                        print(f"❌ 请求错误 {status}: {body[:200]}")
+                        await asyncio.sleep(2)
+                
+                else:
+                    print(f"❌ API错误 {status}: {body[:200]}")
+                    await asyncio.sleep(2)
+                    
+            except asyncio.TimeoutError:
+                print(f"⏱️  请求超时,重试... (尝试 {attempt + 1}/{max_retries})")
+                await asyncio.sleep(5)
+                
+            except Exception as e:
+                print(f"❌ 未知错误: {str(e)}")
+                await asyncio.sleep(3)
+        
+        self.stats["failed_requests"] += 1
+        print(f"❌ 请求失败,已达到最大重试次数 ({max_retries})")
+        return None
+    
     def print_stats(self):
         """打印统计信息"""
         print("\n" + "="*50)
@@ -388,6 +718,8 @@ class AgentWorldClient:
         print(f"总请求数: {self.stats['total_requests']}")
         print(f"成功: {self.stats['successful_requests']}")
         print(f"失败: {self.stats['failed_requests']}")
+        if self.cache:
+            print(f"缓存命中: {self.stats['cache_hits']}")
         print(f"成功率: {self.stats['successful_requests']/self.stats['total_requests']*100:.1f}%" if self.stats['total_requests'] > 0 else "成功率: 0%")
         print(f"模型切换次数: {self.stats['model_switches']}")
         print(f"当前模型: {self.get_current_model()}")
@@ -0,0 +1,292 @@
+"""
+数据集流式读取 - 不再 json.load 整个文件
+扫描 {"dataset_info": {...}, "samples": [...]} 格式的 JSON(或每行一个样本的 JSONL)，
+只记录每个样本的字节偏移，按需解析单个样本:
+    iter_samples      顺序流式读取，第一个样本立即可用
+    LazySampleList    基于偏移索引的随机访问，内存中只保存偏移量
+偏移索引缓存在数据文件旁的 .idx 文件中，文件未修改时再次打开无需重新扫描
+"""
+import json
+import mmap
+import os
+import re
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
+
+# JSON 中影响嵌套层级的字符
+_STRUCTURE = re.compile(rb'[{}\[\]"]')
+# 字符串内部只需关心结束引号和转义
+_STRING_END = re.compile(rb'["\\]')
+# 样本开头到键之间出现括号时，该键可能属于嵌套对象
+_NESTED = re.compile(rb'[{\[]')
+
+_OPEN = (ord('{'), ord('['))
+_QUOTE = ord('"')
+_BACKSLASH = ord('\\')
+
+INDEX_SUFFIX = ".idx"
+
+
+def _open_map(path: Path) -> Optional[mmap.mmap]:
+    """只读映射数据文件(空文件返回 None)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _scan_json(buf) -> Iterator[Tuple[str, int, int]]:
+    """
+    扫描 JSON 数据集的结构，不解析内容
+    
+    Yields:
+        ("info", 起点, 终点) dataset_info 对象的字节范围;
+        ("sample", 起点, 终点) 每个样本对象的字节范围(samples 数组或顶层数组中的元素)
+    """
+    depth = 0
+    pos = 0
+    key = None             # 顶层对象中最近读到的字符串(容器前的即为其键)
+    samples_depth = None   # samples 数组所在层级
+    item_start = None      # 当前样本的起点
+    info_start = None      # dataset_info 的起点
+    
+    while True:
+        match = _STRUCTURE.search(buf, pos)
+        if match is None:
+            return
+        start = match.start()
+        char = buf[start]
+        pos = match.end()
+        
+        if char == _QUOTE:
+            # 跳过整个字符串(其中的括号不计入层级)
+            while True:
+                end = _STRING_END.search(buf, pos)
+                if end is None:
+                    return
+                if buf[end.start()] == _BACKSLASH:
+                    pos = end.start() + 2
+                    continue
+                pos = end.end()
+                break
+            if depth == 1:
+                key = buf[start:pos]
+            continue
+        
+        if char in _OPEN:
+            depth += 1
+            if depth == 1 and char == _OPEN[1]:
+                # 顶层直接是样本数组
+                samples_depth = 1
+            elif depth == 2 and samples_depth is None and key == b'"samples"' and char == _OPEN[1]:
+                samples_depth = 2
+            elif depth == 2 and key == b'"dataset_info"' and char == _OPEN[0]:
+                info_start = start
+            elif samples_depth is not None and depth == samples_depth + 1 and item_start is None:
+                item_start = start
+        else:
+            depth -= 1
+            if item_start is not None and depth == samples_depth:
+                yield "sample", item_start, pos
+                item_start = None
+            elif info_start is not None and depth == 1:
+                yield "info", info_start, pos
+                info_start = None
+            elif samples_depth is not None and depth < samples_depth:
+                samples_depth = -1
+
+
+def _scan_jsonl(buf) -> Iterator[Tuple[str, int, int]]:
+    """扫描 JSONL 数据集，每个非空行是一个样本(跳过崩溃时写了一半的末尾行)"""
+    pos = 0
+    size = len(buf)
+    while pos < size:
+        end = buf.find(b"\n", pos)
+        if end == -1:
+            # 没有换行结尾的最后一行可能不完整
+            end = size
+            try:
+                json.loads(buf[pos:end])
+            except json.JSONDecodeError:
+                return
+        if buf[pos:end].strip():
+            yield "sample", pos, end
+        pos = end + 1
+
+
+def _is_jsonl(path: Path) -> bool:
+    return path.suffix == ".jsonl"
+
+
+def _scan(path: Path, buf) -> Iterator[Tuple[str, int, int]]:
+    return _scan_jsonl(buf) if _is_jsonl(path) else _scan_json(buf)
+
+
+def _jsonl_info(path: Path) -> Dict[str, Any]:
+    """JSONL 数据集的 dataset_info 旁路文件(见 dataset_writer.jsonl_paths)"""
+    info_path = path.with_name(f"{path.stem}.info.json")
+    if info_path.exists():
+        with open(info_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def iter_samples(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """顺序流式读取样本，扫描到一个样本就解析并返回一个"""
+    path = Path(path)
+    buf = _open_map(path)
+    if buf is None:
+        return
+    try:
+        for kind, start, end in _scan(path, buf):
+            if kind == "sample":
+                try:
+                    yield json.loads(buf[start:end])
+                except json.JSONDecodeError:
+                    continue
+    finally:
+        buf.close()
+
+
+def build_index(path: Union[str, Path]) -> Tuple[array, Dict[str, Any]]:
+    """
+    扫描数据文件，返回样本偏移索引和 dataset_info
+    
+    Returns:
+        (偏移数组 [起点0, 终点0, 起点1, 终点1, ...], dataset_info)
+    """
+    path = Path(path)
+    offsets = array('q')
+    info = _jsonl_info(path) if _is_jsonl(path) else {}
+    buf = _open_map(path)
+    if buf is None:
+        return offsets, info
+    try:
+        for kind, start, end in _scan(path, buf):
+            if kind == "sample":
+                offsets.append(start)
+                offsets.append(end)
+            else:
+                info = json.loads(buf[start:end])
+    finally:
+        buf.close()
+    return offsets, info
+
+
+def load_index(path: Union[str, Path]) -> Tuple[array, Dict[str, Any]]:
+    """读取缓存的偏移索引(数据文件大小和修改时间不变时)，否则重新扫描并写入缓存"""
+    path = Path(path)
+    index_path = path.with_name(path.name + INDEX_SUFFIX)
+    stat = path.stat()
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    
+    if index_path.exists():
+        try:
+            with open(index_path, 'rb') as f:
+                header = json.loads(f.readline())
+                if header.get("signature") == signature:
+                    offsets = array('q')
+                    offsets.frombytes(f.read())
+                    return offsets, header.get("dataset_info", {})
+        except (OSError, ValueError):
+            pass
+    
+    offsets, info = build_index(path)
+    try:
+        tmp_path = index_path.with_name(index_path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps({"signature": signature, "dataset_info": info}, ensure_ascii=False).encode('utf-8') + b"\n")
+            offsets.tofile(f)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        # 数据目录只读时不缓存索引
+        pass
+    return offsets, info
+
+
+class LazySampleList(Sequence):
+    """
+    按偏移索引随机访问的样本列表
+    
+    内存中只保存每个样本的字节偏移，每次取元素时从映射的文件中解析该样本
+    (每次返回新的字典，修改不会影响文件或其他调用方)。
+    切片和 select 返回共用同一文件的子列表；可以 pickle 传给子进程。
+    """
+    
+    def __init__(self, path: Union[str, Path], offsets: Optional[array] = None, dataset_info: Optional[Dict[str, Any]] = None):
+        self.path = Path(path)
+        if offsets is None:
+            offsets, dataset_info = load_index(self.path)
+        self.offsets = offsets
+        self.dataset_info = dataset_info or {}
+        self._buf = None
+    
+    def _map(self):
+        if self._buf is None:
+            self._buf = _open_map(self.path)
+        return self._buf
+    
+    def __len__(self) -> int:
+        return len(self.offsets) // 2
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.select(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("样本索引超出范围")
+        return json.loads(self._map()[self.offsets[2 * index]:self.offsets[2 * index + 1]])
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self)):
+            yield self[index]
+    
+    def id_index(self, key: str = "benchmark_id") -> Dict[str, int]:
+        """
+        样本 ID -> 位置 的索引(ID 统一为字符串，重复的 ID 以最后一个为准)
+        
+        只在每个样本的字节范围内查找该键的值，不解析整个样本；
+        键之前出现嵌套对象或找不到键时退回完整解析该样本
+        """
+        pattern = re.compile(rb'"' + re.escape(key.encode('utf-8')) + rb'"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+)')
+        buf = self._map()
+        index = {}
+        for position in range(len(self)):
+            start, end = self.offsets[2 * position], self.offsets[2 * position + 1]
+            match = pattern.search(buf, start, end)
+            if match is not None and _NESTED.search(buf, start + 1, match.start()) is None:
+                value = json.loads(match.group(1))
+            else:
+                value = json.loads(buf[start:end]).get(key)
+            index[str(value)] = position
+        return index
+    
+    def select(self, indices) -> "LazySampleList":
+        """按位置选出子列表(不解析样本)"""
+        offsets = array('q')
+        for index in indices:
+            offsets.append(self.offsets[2 * index])
+            offsets.append(self.offsets[2 * index + 1])
+        return LazySampleList(self.path, offsets, self.dataset_info)
+    
+    def __getstate__(self):
+        return {"path": self.path, "offsets": self.offsets, "dataset_info": self.dataset_info, "_buf": None}
+    
+    def close(self):
+        """关闭文件映射"""
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+
+
+def open_dataset(path: Union[str, Path]) -> LazySampleList:
+    """打开 JSON/JSONL 数据集(只建立偏移索引，不解析样本)"""
+    return LazySampleList(path)
+
+
+def load_dataset_info(path: Union[str, Path]) -> Dict[str, Any]:
+    """只读取 dataset_info"""
+    return load_index(path)[1]
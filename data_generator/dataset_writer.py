@@ -0,0 +1,207 @@
+"""
+数据集流式写出 - 逐条追加写入 JSONL，dataset_info 单独写入旁路文件
+生成结束(或中断后)再由 finalize_jsonl_dataset 组装为原有的单一 JSON 格式，
+供标注平台和评测器继续使用
+"""
+import json
+import os
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+
+def jsonl_paths(output_file: str) -> Tuple[Path, Path]:
+    """
+    根据最终 JSON 输出路径推导 JSONL 数据文件和 dataset_info 旁路文件路径
+    
+    例如 benchmark_zh_N200.json -> benchmark_zh_N200.jsonl, benchmark_zh_N200.info.json
+    """
+    output_path = Path(output_file)
+    stem = output_path.stem if output_path.suffix in ('.json', '.jsonl') else output_path.name
+    return output_path.with_name(f"{stem}.jsonl"), output_path.with_name(f"{stem}.info.json")
+
+
+def write_json_atomic(path, data: Dict[str, Any], indent: Optional[int] = 2):
+    """先写临时文件再替换，避免中途崩溃留下半个 JSON 文件"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def iter_jsonl_samples(jsonl_path) -> Iterator[Dict[str, Any]]:
+    """逐行读取 JSONL 样本，忽略崩溃时写了一半的末尾行"""
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️  跳过无法解析的行: {line[:80]}...")
+
+
+def truncate_partial_tail(jsonl_path):
+    """截掉崩溃时写了一半的末尾行，保证续写从完整的行边界开始"""
+    jsonl_path = Path(jsonl_path)
+    with open(jsonl_path, "rb+") as f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return
+        last_newline = data.rfind(b"\n")
+        f.truncate(last_newline + 1)
+    print(f"✂️  已截掉 {jsonl_path.name} 末尾不完整的一行")
+
+
+def load_partial_dataset(output_file: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    读取一次(可能中断的)生成运行已经写出的内容
+    
+    优先读取 JSONL 数据文件和 dataset_info 旁路文件，否则读取单一 JSON 文件。
+    
+    Returns:
+        (dataset_info, 样本列表)，没有任何输出时返回 ({}, [])
+    """
+    jsonl_path, info_path = jsonl_paths(output_file)
+    if jsonl_path.exists():
+        truncate_partial_tail(jsonl_path)
+        dataset_info = {}
+        if info_path.exists():
+            with open(info_path, "r", encoding="utf-8") as f:
+                dataset_info = json.load(f)
+        return dataset_info, list(iter_jsonl_samples(jsonl_path))
+    
+    if Path(output_file).exists():
+        with open(output_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("dataset_info", {}), data.get("samples", [])
+    
+    return {}, []
+
+
+class JsonlDatasetWriter:
+    """
+    JSONL 数据集写入器
+    
+    每条样本追加一行，按条数或时间批量 fsync；
+    dataset_info 定期原子写入旁路文件。
+    """
+    
+    def __init__(
+        self,
+        output_file: str,
+        fsync_every: int = 20,
+        fsync_interval: float = 5.0,
+        info_interval: float = 10.0,
+        append: bool = False
+    ):
+        """
+        Args:
+            output_file: 最终 JSON 输出路径(JSONL 与旁路文件由此推导)
+            fsync_every: 每写入多少条样本执行一次 fsync
+            fsync_interval: 距上次 fsync 超过多少秒时执行 fsync
+            info_interval: dataset_info 旁路文件的最短更新间隔(秒)
+            append: 是否追加到已有的 JSONL 文件
+        """
+        self.jsonl_path, self.info_path = jsonl_paths(output_file)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.info_interval = info_interval
+        
+        self.file = open(self.jsonl_path, "a" if append else "w", encoding="utf-8")
+        self.pending = 0
+        self.written = 0
+        self.last_sync = time.time()
+        self.last_info_write = 0.0
+    
+    def append(self, sample: Dict[str, Any]):
+        """追加一条样本(立即写入操作系统缓冲, 按批次 fsync 落盘)"""
+        self.file.write(json.dumps(sample, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.pending += 1
+        self.written += 1
+        if self.pending >= self.fsync_every or time.time() - self.last_sync >= self.fsync_interval:
+            self.sync()
+    
+    def sync(self):
+        """把缓冲的样本刷到磁盘"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.time()
+    
+    def update_info(self, dataset_info: Dict[str, Any], force: bool = False):
+        """定期更新 dataset_info 旁路文件"""
+        if not force and time.time() - self.last_info_write < self.info_interval:
+            return
+        # 先落盘样本，保证旁路文件中的统计不超前于数据文件
+        self.sync()
+        write_json_atomic(self.info_path, dataset_info)
+        self.last_info_write = time.time()
+    
+    def close(self, dataset_info: Optional[Dict[str, Any]] = None):
+        """同步并关闭文件，可同时写入最终的 dataset_info"""
+        if self.file.closed:
+            return
+        self.sync()
+        if dataset_info is not None:
+            self.update_info(dataset_info, force=True)
+        self.file.close()
+
+
+def finalize_jsonl_dataset(jsonl_path, info_path=None, output_file=None) -> Dict[str, Any]:
+    """
+    将 JSONL 数据和 dataset_info 旁路文件组装为单一 JSON 数据集
+    
+    样本按 benchmark_id 排序，重复的 benchmark_id 以最后写入的为准。
+    
+    Args:
+        jsonl_path: JSONL 数据文件
+        info_path: dataset_info 旁路文件(默认按 jsonl_path 推导)
+        output_file: 输出 JSON 路径(默认与 jsonl_path 同名的 .json)
+    
+    Returns:
+        组装后的数据集
+    """
+    jsonl_path = Path(jsonl_path)
+    if info_path is None or output_file is None:
+        default_output = jsonl_path.with_suffix(".json")
+        _, default_info = jsonl_paths(str(default_output))
+        info_path = info_path or default_info
+        output_file = output_file or default_output
+    
+    dataset_info = {}
+    if Path(info_path).exists():
+        with open(info_path, "r", encoding="utf-8") as f:
+            dataset_info = json.load(f)
+    
+    samples_by_id = {}
+    for sample in iter_jsonl_samples(jsonl_path):
+        samples_by_id[sample["benchmark_id"]] = sample
+    samples = [samples_by_id[bid] for bid in sorted(samples_by_id)]
+    
+    dataset_info["actual_samples"] = len(samples)
+    dataset = {"dataset_info": dataset_info, "samples": samples}
+    write_json_atomic(output_file, dataset)
+    print(f"📦 已组装数据集: {output_file} ({len(samples)} 条样本)")
+    return dataset
+
+
+def main():
+    """命令行: 将中断或完成的 JSONL 生成结果组装为单一 JSON"""
+    parser = argparse.ArgumentParser(description="将 JSONL 生成结果组装为单一 JSON 数据集")
+    parser.add_argument("jsonl", help="JSONL 数据文件路径")
+    parser.add_argument("--info", default=None, help="dataset_info 旁路文件路径(默认自动推导)")
+    parser.add_argument("--output", default=None, help="输出 JSON 路径(默认与 JSONL 同名)")
+    args = parser.parse_args()
+    
+    finalize_jsonl_dataset(args.jsonl, args.info, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+HTTP 连接池 - 为每个 API 基础地址维护一个 keep-alive 的 requests.Session
+避免每次请求都重新进行 TCP+TLS 握手，可在生成和评测的工作线程之间共享
+
+AsyncSessionPool 是 asyncio 版本(需要 aiohttp)，单个进程内用少量线程即可保持数百个在途请求
+"""
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    # 允许在 config.py 中覆盖默认连接池配置
+    from config import HTTP_POOL_CONFIG
+except ImportError:
+    HTTP_POOL_CONFIG = {}
+
+try:
+    from config import ASYNC_HTTP_CONFIG
+except ImportError:
+    ASYNC_HTTP_CONFIG = {}
+
+DEFAULT_POOL_CONFIG = {
+    "pool_maxsize": 32,        # 每个基础地址保持的最大连接数(应不小于并发线程数)
+    "max_retries": 2,          # 连接建立失败时由适配器自动重试的次数
+    "backoff_factor": 0.5      # 适配器重试的退避系数
+}
+
+DEFAULT_ASYNC_CONFIG = {
+    "max_in_flight": 64,       # 每个服务商(API主机)同时在途的最大请求数
+    "provider_max_in_flight": {}  # 按主机单独设置, 如 {"api.siliconflow.cn": 128}
+}
+
+
+def _base_url(url: str) -> str:
+    """url 的基础地址(scheme + host)"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class SessionPool:
+    """
+    按基础地址(scheme + host)划分的 Session 池
+    
+    requests.Session 底层的 urllib3 连接池是线程安全的，同一基础地址的
+    所有线程共享一个 Session；只有连接建立失败才由适配器重试，
+    HTTP 状态码(429/401等)仍交给各客户端自己的重试逻辑处理，避免重复计费。
+    """
+    
+    def __init__(
+        self,
+        pool_maxsize: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_factor: Optional[float] = None
+    ):
+        config = {**DEFAULT_POOL_CONFIG, **HTTP_POOL_CONFIG}
+        self.pool_maxsize = pool_maxsize or config["pool_maxsize"]
+        self.max_retries = config["max_retries"] if max_retries is None else max_retries
+        self.backoff_factor = config["backoff_factor"] if backoff_factor is None else backoff_factor
+        
+        self.sessions: Dict[str, requests.Session] = {}
+        self.lock = threading.Lock()
+    
+    def _build_session(self) -> requests.Session:
+        """创建带连接池和重试适配器的 Session"""
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=0,
+            backoff_factor=self.backoff_factor
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def get(self, url: str) -> requests.Session:
+        """获取 url 对应基础地址的 Session(不存在时创建)"""
+        base = _base_url(url)
+        session = self.sessions.get(base)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(base)
+                if session is None:
+                    session = self._build_session()
+                    self.sessions[base] = session
+        return session
+    
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """通过连接池发送 POST 请求"""
+        return self.get(url).post(url, **kwargs)
+    
+    def close(self):
+        """关闭所有 Session"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+class AsyncSessionPool:
+    """
+    asyncio 版连接池
+    
+    每个事件循环共享一个 aiohttp.ClientSession，并为每个服务商(API主机)维护一个
+    在途请求信号量；同一进程内的所有客户端实例共用这些信号量，
+    因此多个模型客户端指向同一服务商时也不会超过该服务商的并发上限。
+    重试与退避由各客户端用 asyncio.sleep 完成，等待期间不占用信号量。
+    """
+    
+    # 事件循环 -> {"session": ClientSession, "semaphores": {基础地址: Semaphore}}
+    _loop_state = weakref.WeakKeyDictionary()
+    
+    def __init__(self, max_in_flight: Optional[int] = None):
+        """
+        Args:
+            max_in_flight: 每个服务商的在途请求上限(默认见 ASYNC_HTTP_CONFIG)
+        """
+        config = {**DEFAULT_ASYNC_CONFIG, **ASYNC_HTTP_CONFIG}
+        self.max_in_flight = max_in_flight or config["max_in_flight"]
+        self.provider_max_in_flight = config["provider_max_in_flight"]
+    
+    def _state(self) -> Dict:
+        """当前事件循环的共享状态(不存在时创建)"""
+        if aiohttp is None:
+            raise RuntimeError("异步客户端需要 aiohttp，请先执行 pip install aiohttp")
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None or state["session"].closed:
+            state = {
+                # 并发上限由各服务商的信号量控制，连接器本身不再限制
+                "session": aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)),
+                "semaphores": {}
+            }
+            self._loop_state[loop] = state
+        return state
+    
+    def semaphore(self, url: str) -> asyncio.Semaphore:
+        """url 所属服务商的在途请求信号量"""
+        semaphores = self._state()["semaphores"]
+        base = _base_url(url)
+        if base not in semaphores:
+            limit = self.provider_max_in_flight.get(urlsplit(url).netloc, self.max_in_flight)
+            semaphores[base] = asyncio.Semaphore(limit)
+        return semaphores[base]
+    
+    @asynccontextmanager
+    async def post(self, url: str, timeout: Optional[float] = None, **kwargs):
+        """
+        在服务商信号量内发送 POST 请求
+        
+        用法: async with pool.post(url, json=payload, timeout=60) as response: ...
+        """
+        session = self._state()["session"]
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        async with self.semaphore(url):
+            async with session.post(url, **kwargs) as response:
+                yield response
+    
+    async def close(self):
+        """关闭当前事件循环的共享 Session(在 asyncio.run 结束前调用)"""
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.pop(loop, None)
+        if state is not None:
+            await state["session"].close()
@@ -0,0 +1,202 @@
+"""
+密钥/平台调度器 - 记录每个 (服务商, API密钥) 的健康状态并挑选当前最健康的密钥
+代替遇到任何错误就顺序切换下一个密钥的做法:
+    429 -> 按 Retry-After(或指数退避)进入冷却，到期自动恢复
+    401 -> 禁用该密钥，不再选择
+    其他错误 -> 短暂冷却
+进程内共享，一个客户端发现的失效密钥对其他客户端同样生效
+"""
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+HEALTHY = "healthy"
+COOLING = "cooling"
+DISABLED = "disabled"
+
+STATE_NAMES = {
+    HEALTHY: "可用",
+    COOLING: "冷却中",
+    DISABLED: "已禁用"
+}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头(秒数或 HTTP 日期)，返回需要等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class KeyScheduler:
+    """
+    密钥健康状态调度
+    
+    候选密钥用字典描述: {"provider": 服务商, "key": 密钥, "priority": 优先级(越小越优先), ...}，
+    其余字段原样返回给调用方(如 base_url、模型列表)。
+    同优先级的可用密钥中选择最久未被使用的，使请求均匀分摊到各密钥。
+    """
+    
+    def __init__(
+        self,
+        rate_limit_cooldown: float = 5.0,
+        error_cooldown: float = 2.0,
+        max_cooldown: float = 120.0
+    ):
+        """
+        Args:
+            rate_limit_cooldown: 429 且没有 Retry-After 时的首次冷却秒数(连续429时翻倍)
+            error_cooldown: 服务端错误/网络异常后的首次冷却秒数(连续出错时翻倍)
+            max_cooldown: 冷却时间上限
+        """
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.error_cooldown = error_cooldown
+        self.max_cooldown = max_cooldown
+        
+        # (服务商, 密钥) -> {state, until, failures, last_used, successes}
+        self.health: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+    
+    def _get(self, provider: str, key: str) -> Dict[str, Any]:
+        """获取密钥健康记录(调用方持有锁)"""
+        record = self.health.get((provider, key))
+        if record is None:
+            record = {"state": HEALTHY, "until": 0.0, "failures": 0, "last_used": 0.0, "successes": 0}
+            self.health[(provider, key)] = record
+        return record
+    
+    def pick(self, candidates: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+        """
+        挑选当前最健康的密钥
+        
+        Returns:
+            (候选, 0) 有可用密钥;
+            (None, 等待秒数) 全部在冷却中, 等待最早到期的密钥恢复;
+            (None, None) 全部已禁用
+        """
+        with self.lock:
+            now = time.time()
+            best = None
+            best_rank = None
+            earliest = None
+            for candidate in candidates:
+                record = self._get(candidate["provider"], candidate["key"])
+                if record["state"] == DISABLED:
+                    continue
+                if record["state"] == COOLING:
+                    if record["until"] > now:
+                        earliest = record["until"] if earliest is None else min(earliest, record["until"])
+                        continue
+                    # 冷却到期，恢复可用
+                    record["state"] = HEALTHY
+                rank = (candidate.get("priority", 0), record["last_used"])
+                if best_rank is None or rank < best_rank:
+                    best, best_rank = candidate, rank
+            
+            if best is not None:
+                self._get(best["provider"], best["key"])["last_used"] = now
+                return best, 0.0
+            if earliest is not None:
+                return None, earliest - now
+            return None, None
+    
+    def acquire(self, candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """挑选密钥，全部冷却时阻塞等待；全部禁用时返回None"""
+        while True:
+            choice, wait = self.pick(candidates)
+            if choice is not None or wait is None:
+                return choice
+            time.sleep(wait)
+    
+    async def aacquire(self, candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """acquire 的异步版本"""
+        while True:
+            choice, wait = self.pick(candidates)
+            if choice is not None or wait is None:
+                return choice
+            await asyncio.sleep(wait)
+    
+    def report_success(self, provider: str, key: str):
+        """请求成功: 清零连续失败计数"""
+        with self.lock:
+            record = self._get(provider, key)
+            record["failures"] = 0
+            record["successes"] += 1
+    
+    def _cool_down(self, provider: str, key: str, seconds: float):
+        """进入冷却(调用方持有锁)"""
+        record = self._get(provider, key)
+        if record["state"] == DISABLED:
+            return
+        record["state"] = COOLING
+        record["until"] = max(record["until"], time.time() + seconds)
+    
+    def report_rate_limited(self, provider: str, key: str, retry_after: Optional[float] = None) -> float:
+        """
+        429: 冷却到 Retry-After 指定的时刻，没有时按连续失败次数指数退避
+        
+        Returns:
+            冷却秒数
+        """
+        with self.lock:
+            record = self._get(provider, key)
+            record["failures"] += 1
+            if retry_after is None:
+                retry_after = min(self.max_cooldown, self.rate_limit_cooldown * 2 ** (record["failures"] - 1))
+            self._cool_down(provider, key, retry_after)
+        return retry_after
+    
+    def report_error(self, provider: str, key: str) -> float:
+        """
+        服务端错误/网络异常: 短暂冷却
+        
+        Returns:
+            冷却秒数
+        """
+        with self.lock:
+            record = self._get(provider, key)
+            record["failures"] += 1
+            seconds = min(self.max_cooldown, self.error_cooldown * 2 ** (record["failures"] - 1))
+            self._cool_down(provider, key, seconds)
+        return seconds
+    
+    def report_invalid(self, provider: str, key: str):
+        """401: 禁用密钥"""
+        with self.lock:
+            self._get(provider, key)["state"] = DISABLED
+    
+    def summary(self, candidates: List[Dict[str, Any]]) -> Dict[str, int]:
+        """统计候选密钥中各状态的数量"""
+        counts = {HEALTHY: 0, COOLING: 0, DISABLED: 0}
+        with self.lock:
+            now = time.time()
+            for candidate in candidates:
+                record = self._get(candidate["provider"], candidate["key"])
+                state = record["state"]
+                if state == COOLING and record["until"] <= now:
+                    state = HEALTHY
+                counts[state] += 1
+        return counts
+
+
+_shared_scheduler = None
+_shared_lock = threading.Lock()
+
+
+def get_key_scheduler() -> KeyScheduler:
+    """获取进程内共享的密钥调度器"""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        with _shared_lock:
+            if _shared_scheduler is None:
+                _shared_scheduler = KeyScheduler()
+    return _shared_scheduler
@@ -0,0 +1,229 @@
+"""
+LLM 响应缓存 - 以 (model, messages, temperature, max_tokens) 的哈希为键，持久化到本地 SQLite
+崩溃重跑或只修改了部分提示词时，相同的请求直接读取缓存，不再重复付费
+
+同一进程内相同请求的第 N 次调用对应缓存中的第 N 个响应，
+因此生成阶段因解析失败而重试同一提示词时不会反复拿到同一个坏响应，
+重跑时则按原来的顺序重放每一次响应
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    # 允许在 config.py 中配置缓存的淘汰策略
+    from config import LLM_CACHE_CONFIG
+except ImportError:
+    LLM_CACHE_CONFIG = {}
+
+DEFAULT_CACHE_CONFIG = {
+    "max_entries": 200000,     # 最多保留的响应条数(按最近访问时间淘汰)
+    "max_bytes": None,         # 响应总大小上限(字节), None 表示不限制
+    "max_age_days": 30,        # 超过多少天的响应被淘汰, None 表示不限制
+    "evict_every": 500         # 每写入多少条执行一次淘汰
+}
+
+MODE_READWRITE = "readwrite"
+MODE_REPLAY = "replay"
+
+
+class LLMCache:
+    """
+    SQLite 响应缓存(线程安全)
+    
+    readwrite: 命中直接返回，未命中时调用 API 并写入缓存
+    replay: 只读重放，命中返回缓存，未命中直接返回 None 且不发送请求
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        mode: str = MODE_READWRITE,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_age_days: Optional[float] = None
+    ):
+        config = {**DEFAULT_CACHE_CONFIG, **LLM_CACHE_CONFIG}
+        self.path = str(path)
+        self.mode = mode
+        self.max_entries = max_entries if max_entries is not None else config["max_entries"]
+        self.max_bytes = max_bytes if max_bytes is not None else config["max_bytes"]
+        self.max_age_days = max_age_days if max_age_days is not None else config["max_age_days"]
+        self.evict_every = config["evict_every"]
+        
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self.conn.commit()
+        self.lock = threading.Lock()
+        
+        # 同一请求在本进程内出现的次数
+        self.occurrences: Dict[str, int] = {}
+        self.writes_since_evict = 0
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+    
+    @property
+    def replay(self) -> bool:
+        """是否为只读重放模式"""
+        return self.mode == MODE_REPLAY
+    
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], temperature: float, max_tokens: int) -> str:
+        """请求内容的 sha256 哈希"""
+        payload = json.dumps(
+            {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def lookup(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> Tuple[str, Optional[str]]:
+        """
+        查询一次请求的缓存
+        
+        Returns:
+            (缓存键, 缓存的响应)，未命中时响应为 None；请求成功后用同一个缓存键调用 put
+        """
+        base_key = self.make_key(model, messages, temperature, max_tokens)
+        with self.lock:
+            occurrence = self.occurrences.get(base_key, 0)
+            self.occurrences[base_key] = occurrence + 1
+            key = f"{base_key}:{occurrence}"
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return key, None
+            self.stats["hits"] += 1
+            if not self.replay:
+                self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+            return key, row[0]
+    
+    def put(self, key: str, model: str, response: str):
+        """写入一条响应(重放模式下忽略)"""
+        if self.replay or response is None:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now)
+            )
+            self.conn.commit()
+            self.stats["writes"] += 1
+            self.writes_since_evict += 1
+            evict_due = self.writes_since_evict >= self.evict_every
+        if evict_due:
+            self.evict()
+    
+    def evict(self) -> int:
+        """
+        按年龄、条数和总大小淘汰最久未访问的响应
+        
+        Returns:
+            淘汰的条数
+        """
+        with self.lock:
+            before = self.conn.total_changes
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                self.conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+            if self.max_entries:
+                self.conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+            if self.max_bytes:
+                self.conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS running_size FROM responses
+                        ) WHERE running_size > ?
+                    )
+                """, (self.max_bytes,))
+            self.conn.commit()
+            evicted = self.conn.total_changes - before
+            self.stats["evictions"] += evicted
+            self.writes_since_evict = 0
+        return evicted
+    
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.occurrences.clear()
+    
+    def size_info(self) -> Dict[str, int]:
+        """缓存中的条数和总字节数"""
+        with self.lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": total}
+    
+    def print_stats(self):
+        """打印缓存统计"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        info = self.size_info()
+        print(f"💾 响应缓存 ({'只读重放' if self.replay else '读写'}): {self.path}")
+        print(f"   命中: {self.stats['hits']}/{lookups} ({self.stats['hits'] / max(lookups, 1) * 100:.1f}%) "
+              f"| 写入: {self.stats['writes']} | 淘汰: {self.stats['evictions']}")
+        print(f"   缓存条数: {info['entries']} | 大小: {info['bytes'] / 1024 / 1024:.1f} MB")
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+
+_caches: Dict[Tuple[str, str], LLMCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache(path: str, mode: str = MODE_READWRITE) -> LLMCache:
+    """获取进程内共享的缓存实例(同一路径只打开一次)"""
+    key = (str(Path(path).resolve()), mode)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = LLMCache(path, mode=mode)
+        return _caches[key]
+
+
+def main():
+    """命令行: 查看缓存统计、执行淘汰或清空缓存"""
+    parser = argparse.ArgumentParser(description="LLM 响应缓存管理")
+    parser.add_argument("path", help="缓存数据库路径")
+    parser.add_argument("--evict", action="store_true", help="按淘汰策略清理缓存")
+    parser.add_argument("--max-age-days", type=float, default=None, help="淘汰超过该天数的响应")
+    parser.add_argument("--max-entries", type=int, default=None, help="最多保留的响应条数")
+    parser.add_argument("--clear", action="store_true", help="清空缓存")
+    args = parser.parse_args()
+    
+    cache = LLMCache(args.path, max_entries=args.max_entries, max_age_days=args.max_age_days)
+    if args.clear:
+        cache.clear()
+        print("🧹 缓存已清空")
+    elif args.evict:
+        print(f"🧹 已淘汰 {cache.evict()} 条响应")
+    cache.print_stats()
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,15 @@
 统一数据生成主流水线 - 支持中英法日德文数据生成
 使用 --language 参数控制生成中文、英文、法语、日语或德语数据
 """
-import json
 import argparse
+import asyncio
+import queue
 import time
 import sys
 import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional
@@ -15,6 +19,9 @@ from api_client import OpenRouterClient, AgentWorldClient
 from scenario_generator import ScenarioGenerator, ScenarioGeneratorEN, ScenarioGeneratorFR, ScenarioGeneratorJP, ScenarioGeneratorDE
 from dialogue_simulator import DialogueSimulator, DialogueSimulatorEN, DialogueSimulatorFR, DialogueSimulatorJP, DialogueSimulatorDE
 from label_annotator import LabelAnnotator, LabelAnnotatorEN, LabelAnnotatorFR, LabelAnnotatorJP, LabelAnnotatorDE
+from stage_pipeline import StagePipelineEngine, STAGES
+from dataset_writer import JsonlDatasetWriter, finalize_jsonl_dataset, load_partial_dataset, write_json_atomic
+from llm_cache import get_llm_cache, MODE_READWRITE, MODE_REPLAY
 
 
 def print_progress_bar(current, total, prefix='', suffix='', length=50):
@@ -65,13 +72,70 @@ def build_scene_atmosphere_index(language='zh'):
     return index_map
 
 
+class _CapturedCall(BaseException):
+    """_PromptCapture 截获的 call_llm 调用(继承 BaseException, 不会被生成器内的 except Exception 吞掉)"""
+    
+    def __init__(self, kwargs: Dict[str, Any]):
+        super().__init__()
+        self.kwargs = kwargs
+
+
+class _PromptCapture:
+    """
+    代替 api_client 交给同步生成器: 第一次运行 generate() 时截获 call_llm 的参数,
+    第二次运行时直接返回异步请求得到的响应，由 generate() 完成解析与校验
+    """
+    
+    def __init__(self, client, response: Optional[str] = None, replay: bool = False):
+        self._client = client
+        self._response = response
+        self._replay = replay
+    
+    def __getattr__(self, name):
+        # 生成器会检查客户端属性(如 models)来决定温度
+        return getattr(self._client, name)
+    
+    def call_llm(self, prompt: str, **kwargs) -> Optional[str]:
+        if self._replay:
+            return self._response
+        raise _CapturedCall({"prompt": prompt, **kwargs})
+
+
+async def run_generator_async(generator, *args, **kwargs):
+    """
+    在事件循环中运行情境/对话/标签生成器的 generate()
+    
+    生成器的提示词构建和解析是同步的纯计算，只有 call_llm 需要等待网络，
+    因此先截获请求参数，await 客户端的 acall_llm，再回放响应完成解析；
+    各生成器类无需改动，也不需要为每个在途请求占用一个线程。
+    """
+    client = generator.api_client
+    generator.api_client = _PromptCapture(client)
+    try:
+        # 不需要调用 LLM 的情况下直接返回结果
+        return generator.generate(*args, **kwargs)
+    except _CapturedCall as call:
+        call_kwargs = call.kwargs
+    finally:
+        generator.api_client = client
+    
+    response = await client.acall_llm(**call_kwargs)
+    
+    generator.api_client = _PromptCapture(client, response=response, replay=True)
+    try:
+        return generator.generate(*args, **kwargs)
+    finally:
+        generator.api_client = client
+
+
 class DataGenerationPipeline:
     """统一数据生成流水线 - 支持中英法日德文"""
     
-    def __init__(self, use_gpt51=True, target_model=None, language='zh'):
-        # 初始化API客户端
+    def __init__(self, use_gpt51=True, target_model=None, language='zh', pool_size=None, max_in_flight=None, cache=None):
+        # 初始化API客户端(pool_size 为连接池大小，并发生成时应不小于线程数;
+        # max_in_flight 为异步模式下每个服务商的在途请求上限; cache 为可选的响应缓存)
         if use_gpt51:
-            self.api_client = AgentWorldClient()
+            self.api_client = AgentWorldClient(pool_size=pool_size, max_in_flight=max_in_flight, cache=cache)
             if target_model:
                 # 设置目标模型 - 处理模型名称映射
                 actual_model_name = target_model
@@ -83,7 +147,7 @@ class DataGenerationPipeline:
                     self.api_client.current_model_index = model_index
                     print(f"🎯 已设置目标模型: {actual_model_name}")
         else:
-            self.api_client = OpenRouterClient()
+            self.api_client = OpenRouterClient(pool_size=pool_size, max_in_flight=max_in_flight, cache=cache)
             # 对于硅基流动，可以在这里设置特定的deepseek-v3模型
         
         self.language = language
@@ -129,6 +193,86 @@ class DataGenerationPipeline:
         # 完全自由发挥 - 不限制主题，让GPT-5.1充分发挥创造力
         # 基于强大的prompt设计，LLM能够自主创造各种复杂的社交场景
         self.use_free_generation = True
+        
+        # 每个场景组合最多允许连续失败的次数
+        self.max_failures_per_combination = 3
+    
+    def _make_benchmark_id(self, current_id: int) -> str:
+        """根据语言生成 benchmark_id"""
+        if self.language in ('zh', 'en', 'fr', 'jp', 'de'):
+            return f"atm-mcq-{self.language}-2025-{current_id:05d}"
+        return f"atm-mcq-zh-2025-{current_id:05d}"  # 默认中文
+    
+    def _make_skipped_sample(self, benchmark_id: str) -> Dict[str, Any]:
+        """创建一个跳过标记的样本(场景组合失败次数过多时使用)"""
+        return {
+            "benchmark_id": benchmark_id,
+            "meta_theme": "Skipped - Too Many Failures",
+            "scene_index": -1,
+            "atmosphere": "skipped",
+            "is_core_atmosphere": False,
+            "scenario_setup": {"skipped": True},
+            "dialogue": {"skipped": True},
+            "tasks": {"skipped": True}
+        }
+    
+    def _save_dataset(self, dataset: Dict[str, Any], output_file: str) -> bool:
+        """保存完整数据集(原子替换,中途崩溃不会损坏已有文件),成功返回True"""
+        try:
+            write_json_atomic(output_file, dataset)
+            return True
+        except Exception as e:
+            print(f"⚠️  保存失败: {e}")
+            return False
+    
+    def _record_sample(self, dataset: Dict[str, Any], sample: Dict[str, Any], writer: Optional[JsonlDatasetWriter]):
+        """记录一条完成的样本: JSONL 模式直接追加写出, JSON 模式加入内存中的数据集"""
+        if writer:
+            writer.append(sample)
+        else:
+            dataset["samples"].append(sample)
+    
+    def _save_progress(self, dataset: Dict[str, Any], output_file: str, writer: Optional[JsonlDatasetWriter]) -> bool:
+        """保存进度: JSONL 模式只定期更新 dataset_info 旁路文件, JSON 模式重写整个数据集"""
+        if writer:
+            writer.update_info(dataset["dataset_info"])
+            return True
+        return self._save_dataset(dataset, output_file)
+    
+    def get_combination(self, combination_index: Optional[int]):
+        """
+        获取 scene×atmosphere 组合信息
+        
+        Returns:
+            (scene_idx, atmosphere, is_core)，索引无效时均为None
+        """
+        if combination_index is not None and combination_index < len(self.index_map):
+            combo = self.index_map[combination_index]
+            return combo['scene_idx'], combo['atmosphere'], combo['is_core']
+        return None, None, None
+    
+    def assemble_sample(
+        self,
+        benchmark_id: str,
+        theme: Optional[str],
+        combination_index: Optional[int],
+        scenario_data: Dict[str, Any],
+        dialogue_data: Dict[str, Any],
+        label_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """将三个阶段的产出组装为最终样本"""
+        scene_idx, atmosphere, is_core = self.get_combination(combination_index)
+        return {
+            "benchmark_id": benchmark_id,
+            "meta_theme": theme if theme else ("自由主题" if self.language == 'zh' else "Free Theme"),
+            "scene_index": scene_idx,
+            "atmosphere": atmosphere,
+            "is_core_atmosphere": is_core,
+            "scenario_setup": scenario_data,
+            "dialogue_transcript": dialogue_data["dialogue_transcript"],
+            "evaluation_trigger": dialogue_data["evaluation_trigger"],
+            "evaluation_labels": label_data
+        }
     
     def generate_one_sample(
         self, 
@@ -150,15 +294,7 @@ class DataGenerationPipeline:
             完整的样本数据,失败返回None
         """
         # 获取当前组合信息
-        if combination_index is not None and combination_index < len(self.index_map):
-            combo = self.index_map[combination_index]
-            scene_idx = combo['scene_idx']
-            atmosphere = combo['atmosphere']
-            is_core = combo['is_core']
-        else:
-            scene_idx = None
-            atmosphere = None
-            is_core = None
+        scene_idx, atmosphere, is_core = self.get_combination(combination_index)
         
         if show_details:
             print(f"\n{'='*60}")
@@ -215,27 +351,106 @@ class DataGenerationPipeline:
             print(f"      KY测试: {len(label_data['ky_test']['mcq_options'])} 选项")
         
         # 组装最终数据
-        final_sample = {
-            "benchmark_id": benchmark_id,
-            "meta_theme": theme if theme else ("自由主题" if self.language == 'zh' else "Free Theme"),
-            "scene_index": scene_idx,
-            "atmosphere": atmosphere,
-            "is_core_atmosphere": is_core,
-            "scenario_setup": scenario_data,
-            "dialogue_transcript": dialogue_data["dialogue_transcript"],
-            "evaluation_trigger": dialogue_data["evaluation_trigger"],
-            "evaluation_labels": label_data
-        }
+        final_sample = self.assemble_sample(
+            benchmark_id, theme, combination_index, scenario_data, dialogue_data, label_data
+        )
         
         if show_details:
             print(f"\n✨ 样本 {benchmark_id} 生成完成!")
         return final_sample
     
+    async def agenerate_one_sample(
+        self,
+        benchmark_id: str,
+        combination_index: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        异步生成一条完整的数据样本(三个阶段依次 await, 不打印详细信息)
+        
+        Returns:
+            完整的样本数据,失败返回None
+        """
+        scene_idx, atmosphere, _ = self.get_combination(combination_index)
+        
+        scenario_data = await run_generator_async(
+            self.scenario_gen, theme=None, seed_index=scene_idx, atmosphere=atmosphere
+        )
+        if not scenario_data:
+            return None
+        
+        dialogue_data = await run_generator_async(self.dialogue_sim, scenario_data)
+        if not dialogue_data:
+            return None
+        
+        label_data = await run_generator_async(self.label_ann, scenario_data, dialogue_data)
+        if not label_data:
+            return None
+        
+        return self.assemble_sample(
+            benchmark_id, None, combination_index, scenario_data, dialogue_data, label_data
+        )
+    
+    def _new_run_state(self) -> Dict[str, Any]:
+        """创建批量生成的运行状态"""
+        return {
+            "completed": {},               # slot -> 已完成(含跳过)的样本
+            "combination_failures": {},    # 每个场景组合的连续失败次数
+            "failures_lock": threading.Lock(),
+            "attempt_count": 0,
+            "failed_count": 0,
+            "elapsed_seconds": 0.0,        # 之前运行累计的耗时
+            "dataset_info": {}
+        }
+    
+    def _restore_run_state(self, output_file: str, start_id: int, num_samples: int) -> Dict[str, Any]:
+        """
+        从已有输出重建运行状态, 用于崩溃后续跑
+        
+        已完成的样本位由输出中的 benchmark_id 推出; 组合失败计数、尝试次数和
+        累计耗时来自 dataset_info (JSON 文件内或 JSONL 的 .info.json 旁路文件)。
+        """
+        run_state = self._new_run_state()
+        dataset_info, samples = load_partial_dataset(output_file)
+        if not samples and not dataset_info:
+            print(f"ℹ️  未找到可续跑的输出, 从头开始生成")
+            return run_state
+        
+        for sample in samples:
+            try:
+                slot = int(sample["benchmark_id"].rsplit("-", 1)[1]) - start_id
+            except (KeyError, ValueError, IndexError):
+                continue
+            if 0 <= slot < num_samples:
+                run_state["completed"][slot] = sample
+        
+        run_state["combination_failures"] = {
+            int(k): v for k, v in dataset_info.get("combination_failures", {}).items()
+        }
+        # JSONL 的旁路文件可能略落后于数据文件, 尝试次数至少为已完成数加失败数
+        run_state["failed_count"] = dataset_info.get("failed_samples", 0)
+        run_state["attempt_count"] = max(
+            dataset_info.get("total_attempts", 0),
+            len(run_state["completed"]) + run_state["failed_count"]
+        )
+        run_state["elapsed_seconds"] = dataset_info.get("total_time_seconds", 0.0)
+        run_state["dataset_info"] = dataset_info
+        
+        print(f"♻️  续跑: 已完成 {len(run_state['completed'])}/{num_samples} 条, "
+              f"累计尝试 {run_state['attempt_count']} 次, 失败 {run_state['failed_count']} 次, "
+              f"已耗时 {run_state['elapsed_seconds']:.0f} 秒")
+        return run_state
+    
     def generate_batch(
         self, 
         num_samples: int, 
         output_file: str,
-        start_id: int = 1
+        start_id: int = 1,
+        concurrency: int = 1,
+        stage_workers: Optional[Dict[str, int]] = None,
+        stage_queue_size: int = 8,
+        output_format: str = "json",
+        resume: bool = False,
+        use_async: bool = False
     ):
         """
         批量生成数据
@@ -244,6 +459,14 @@ class DataGenerationPipeline:
             num_samples: 要生成的样本数量
             output_file: 输出文件路径
             start_id: 起始ID
+            concurrency: 同时生成的样本数(默认1为顺序生成)
+            stage_workers: 分阶段流水线各阶段线程数(可选),
+                如 {"scenario": 2, "dialogue": 4, "labels": 2}, 指定后忽略 concurrency
+            stage_queue_size: 分阶段流水线中阶段间队列的容量
+            output_format: "json" 每条样本后重写整个数据集;
+                "jsonl" 逐条追加到 .jsonl 并定期更新 .info.json, 结束时组装为 JSON
+            resume: 从 output_file 已有的输出续跑, 跳过已完成的样本并恢复组合游标与失败计数
+            use_async: 使用 asyncio 客户端在单个事件循环中保持 concurrency 条样本在生成
         """
         print(f"\n{'#'*60}")
         lang_name = "中文" if self.language == 'zh' else ("英文" if self.language == 'en' else ("法语" if self.language == 'fr' else ("日语" if self.language == 'jp' else "德语")))
@@ -253,6 +476,14 @@ class DataGenerationPipeline:
         print(f"📁 输出文件: {output_file}")
         print(f"🔢 起始ID: {start_id}")
         print(f"🌏 数据语言: {lang_name}")
+        if output_format == "jsonl":
+            print(f"📝 输出格式: JSONL 流式追加")
+        if stage_workers:
+            print(f"🏭 分阶段流水线: " + ", ".join(f"{stage}={stage_workers.get(stage, 1)}" for stage in STAGES))
+        elif use_async:
+            print(f"⚡ 异步并发样本数: {concurrency}")
+        elif concurrency > 1:
+            print(f"🧵 并发样本数: {concurrency}")
         
         # 检查客户端类型并显示相应信息
         if hasattr(self.api_client, 'use_siliconflow'):
@@ -271,10 +502,13 @@ class DataGenerationPipeline:
             print(f"🔑 API密钥: 已配置")
         print(f"{'#'*60}\n")
         
-        successful_samples = []
-        failed_count = 0
+        if resume:
+            run_state = self._restore_run_state(output_file, start_id, num_samples)
+        else:
+            run_state = self._new_run_state()
         
-        start_time = time.time()
+        # 续跑时把之前的耗时计入, 使统计和预估剩余时间连续
+        start_time = time.time() - run_state["elapsed_seconds"]
         
         # 创建数据集结构
         if hasattr(self.api_client, 'use_siliconflow'):
@@ -302,48 +536,131 @@ class DataGenerationPipeline:
             },
             "samples": []
         }
+        if run_state["dataset_info"].get("generation_time"):
+            dataset["dataset_info"]["generation_time"] = run_state["dataset_info"]["generation_time"]
+        
+        completed = run_state["completed"]
+        if output_format == "jsonl":
+            writer = JsonlDatasetWriter(output_file, append=resume)
+        else:
+            writer = None
+            dataset["samples"] = [completed[s] for s in sorted(completed)]
+        
+        if stage_workers:
+            successful_samples, failed_count, attempt_count = self._run_batch_staged(
+                num_samples, output_file, start_id, stage_workers, stage_queue_size, dataset, start_time, writer, run_state
+            )
+        elif use_async:
+            successful_samples, failed_count, attempt_count = self._run_batch_async(
+                num_samples, output_file, start_id, concurrency, dataset, start_time, writer, run_state
+            )
+        elif concurrency > 1:
+            successful_samples, failed_count, attempt_count = self._run_batch_concurrent(
+                num_samples, output_file, start_id, concurrency, dataset, start_time, writer, run_state
+            )
+        else:
+            successful_samples, failed_count, attempt_count = self._run_batch_sequential(
+                num_samples, output_file, start_id, dataset, start_time, writer, run_state
+            )
+        
+        # 统计信息
+        elapsed_time = time.time() - start_time
+        
+        # 更新数据集的最终统计信息
+        dataset["dataset_info"].update({
+            "actual_samples": len(successful_samples),
+            "failed_samples": failed_count,
+            "total_attempts": attempt_count,
+            "success_rate": round(len(successful_samples) / attempt_count * 100, 2) if attempt_count > 0 else 0,
+            "total_time_seconds": round(elapsed_time, 2),
+            "avg_time_per_sample": round(elapsed_time / max(len(successful_samples), 1), 2),
+            "combination_failures": {str(k): v for k, v in run_state["combination_failures"].items()}
+        })
+        
+        # 最终保存完整数据集
+        if writer:
+            writer.close(dataset["dataset_info"])
+            final_output = Path(output_file).with_suffix(".json")
+            finalize_jsonl_dataset(writer.jsonl_path, writer.info_path, final_output)
+            output_file = str(final_output)
+        else:
+            dataset["samples"].sort(key=lambda x: x["benchmark_id"])
+            write_json_atomic(output_file, dataset)
+        
+        print(f"\n{'#'*60}")
+        print(f"🎉 目标完成! 成功收集到 {len(successful_samples)} 条有效{lang_name}样本!")
+        print(f"{'#'*60}")
+        print(f"✅ 成功样本: {len(successful_samples)}")
+        print(f"❌ 失败次数: {failed_count}")
+        print(f"🎯 总尝试次数: {attempt_count}")
+        print(f"📊 成功率: {len(successful_samples) / max(attempt_count, 1) * 100:.1f}%")
+        print(f"⏱️  总耗时: {elapsed_time:.2f} 秒")
+        print(f"⚡ 平均每条: {elapsed_time / max(len(successful_samples), 1):.1f} 秒")
+        print(f"📁 输出文件: {output_file}")
+        print(f"{'#'*60}\n")
         
-        attempt_count = 0
-        current_combination_failures = {}  # 记录每个场景组合的连续失败次数
-        max_failures_per_combination = 3   # 每个场景组合最多允许失败3次
+        # 打印API统计
+        self.api_client.print_stats()
         
-        while len(successful_samples) < num_samples:
+        return successful_samples
+    
+    def _update_progress_info(self, dataset: Dict[str, Any], num_successful: int, failed_count: int, attempt_count: int, start_time: float, run_state: Dict[str, Any]):
+        """更新数据集的进度统计信息(含续跑所需的组合失败计数)"""
+        elapsed_time = time.time() - start_time
+        with run_state["failures_lock"]:
+            dataset["dataset_info"]["combination_failures"] = {
+                str(k): v for k, v in run_state["combination_failures"].items()
+            }
+        dataset["dataset_info"]["actual_samples"] = num_successful
+        dataset["dataset_info"]["failed_samples"] = failed_count
+        dataset["dataset_info"]["total_attempts"] = attempt_count
+        dataset["dataset_info"]["success_rate"] = num_successful / attempt_count * 100 if attempt_count > 0 else 0
+        dataset["dataset_info"]["total_time_seconds"] = elapsed_time
+        dataset["dataset_info"]["avg_time_per_sample"] = elapsed_time / num_successful if num_successful > 0 else 0
+    
+    def _run_batch_sequential(
+        self,
+        num_samples: int,
+        output_file: str,
+        start_id: int,
+        dataset: Dict[str, Any],
+        start_time: float,
+        writer: Optional[JsonlDatasetWriter],
+        run_state: Dict[str, Any]
+    ):
+        """
+        顺序生成: 一次只生成一条样本
+        
+        Returns:
+            (成功样本列表, 失败次数, 总尝试次数)
+        """
+        completed = run_state["completed"]
+        successful_samples = [completed[s] for s in sorted(completed)]
+        failed_count = run_state["failed_count"]
+        attempt_count = run_state["attempt_count"]
+        current_combination_failures = run_state["combination_failures"]  # 记录每个场景组合的连续失败次数
+        max_failures_per_combination = self.max_failures_per_combination
+        
+        # 待生成的样本位(续跑时跳过已完成的)
+        pending_slots = deque(slot for slot in range(num_samples) if slot not in completed)
+        
+        while pending_slots:
+            slot = pending_slots[0]
             attempt_count += 1
-            current_id = start_id + len(successful_samples)
-            
-            # 根据语言设置 benchmark_id 前缀
-            if self.language == 'zh':
-                benchmark_id = f"atm-mcq-zh-2025-{current_id:05d}"
-            elif self.language == 'en':
-                benchmark_id = f"atm-mcq-en-2025-{current_id:05d}"
-            elif self.language == 'fr':
-                benchmark_id = f"atm-mcq-fr-2025-{current_id:05d}"
-            elif self.language == 'jp':
-                benchmark_id = f"atm-mcq-jp-2025-{current_id:05d}"
-            elif self.language == 'de':
-                benchmark_id = f"atm-mcq-de-2025-{current_id:05d}"
-            else:
-                benchmark_id = f"atm-mcq-zh-2025-{current_id:05d}"  # 默认中文
+            current_id = start_id + slot
+            benchmark_id = self._make_benchmark_id(current_id)
             
             # 计算当前应该使用的 scene×atmosphere 组合索引
-            combination_index = len(successful_samples) % len(self.index_map)
+            combination_index = slot % len(self.index_map)
             
             # 检查当前组合是否已经失败太多次，如果是则跳过
             if current_combination_failures.get(combination_index, 0) >= max_failures_per_combination:
                 print(f"⚠️  场景组合 #{combination_index} 已失败 {max_failures_per_combination} 次，跳过到下一个样本")
                 # 创建一个跳过标记的样本
-                skipped_sample = {
-                    "benchmark_id": benchmark_id,
-                    "meta_theme": "Skipped - Too Many Failures",
-                    "scene_index": -1,
-                    "atmosphere": "skipped",
-                    "is_core_atmosphere": False,
-                    "scenario_setup": {"skipped": True},
-                    "dialogue": {"skipped": True},
-                    "tasks": {"skipped": True}
-                }
+                skipped_sample = self._make_skipped_sample(benchmark_id)
+                pending_slots.popleft()
                 successful_samples.append(skipped_sample)
-                dataset["samples"].append(skipped_sample)
+                self._record_sample(dataset, skipped_sample, writer)
                 print(f"⏭️  已跳过样本 {benchmark_id}")
                 continue
             
@@ -362,28 +679,19 @@ class DataGenerationPipeline:
             sample_time = time.time() - sample_start
             
             if sample:
+                pending_slots.popleft()
                 successful_samples.append(sample)
-                dataset["samples"].append(sample)
+                self._record_sample(dataset, sample, writer)
                 # 重置当前组合的失败计数
                 current_combination_failures[combination_index] = 0
                 
                 # 更新数据集统计信息
-                current_time = time.time()
-                elapsed_time = current_time - start_time
-                dataset["dataset_info"]["actual_samples"] = len(successful_samples)
-                dataset["dataset_info"]["failed_samples"] = failed_count
-                dataset["dataset_info"]["total_attempts"] = attempt_count
-                dataset["dataset_info"]["success_rate"] = len(successful_samples) / attempt_count * 100
-                dataset["dataset_info"]["total_time_seconds"] = elapsed_time
-                dataset["dataset_info"]["avg_time_per_sample"] = elapsed_time / len(successful_samples) if len(successful_samples) > 0 else 0
+                self._update_progress_info(dataset, len(successful_samples), failed_count, attempt_count, start_time, run_state)
+                elapsed_time = time.time() - start_time
                 
                 # 🔄 每成功生成一条就立即保存
-                try:
-                    with open(output_file, "w", encoding="utf-8") as f:
-                        json.dump(dataset, f, ensure_ascii=False, indent=2)
+                if self._save_progress(dataset, output_file, writer):
                     print(f"💾 已保存: {len(successful_samples)} 条样本")
-                except Exception as e:
-                    print(f"⚠️  保存失败: {e}")
                 
                 # 计算预估剩余时间
                 avg_time_per_success = elapsed_time / len(successful_samples)
@@ -413,43 +721,268 @@ class DataGenerationPipeline:
                 )
             
             # 短暂休息,避免过快请求
-            if len(successful_samples) < num_samples:
+            if pending_slots:
                 time.sleep(0.5)
         
-        # 统计信息
-        elapsed_time = time.time() - start_time
+        successful_samples.sort(key=lambda x: x["benchmark_id"])
+        return successful_samples, failed_count, attempt_count
+    
+    def _generate_slot(
+        self,
+        slot: int,
+        start_id: int,
+        combination_failures: Dict[int, int],
+        failures_lock: threading.Lock
+    ):
+        """
+        并发模式下生成第 slot 个样本位
         
-        # 更新数据集的最终统计信息
-        dataset["dataset_info"].update({
-            "actual_samples": len(successful_samples),
-            "failed_samples": failed_count,
-            "total_attempts": attempt_count,
-            "success_rate": round(len(successful_samples) / attempt_count * 100, 2) if attempt_count > 0 else 0,
-            "total_time_seconds": round(elapsed_time, 2),
-            "avg_time_per_sample": round(elapsed_time / max(len(successful_samples), 1), 2)
-        })
+        benchmark_id 与组合索引只由 slot 决定(与顺序模式一致)，
+        失败时在同一位置重试，直到该组合的失败预算耗尽后写入跳过样本。
         
-        # 最终保存完整数据集
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(dataset, f, ensure_ascii=False, indent=2)
+        Returns:
+            (slot, 样本, 尝试次数, 失败次数)
+        """
+        benchmark_id = self._make_benchmark_id(start_id + slot)
+        combination_index = slot % len(self.index_map)
+        attempts = 0
+        failures = 0
         
-        lang_name = "中文" if self.language == 'zh' else ("英文" if self.language == 'en' else ("法语" if self.language == 'fr' else ("日语" if self.language == 'jp' else "德语")))
-        print(f"\n{'#'*60}")
-        print(f"🎉 目标完成! 成功收集到 {len(successful_samples)} 条有效{lang_name}样本!")
-        print(f"{'#'*60}")
-        print(f"✅ 成功样本: {len(successful_samples)}")
-        print(f"❌ 失败次数: {failed_count}")
-        print(f"🎯 总尝试次数: {attempt_count}")
-        print(f"📊 成功率: {len(successful_samples) / attempt_count * 100:.1f}%")
-        print(f"⏱️  总耗时: {elapsed_time:.2f} 秒")
-        print(f"⚡ 平均每条: {elapsed_time / len(successful_samples):.1f} 秒")
-        print(f"📁 输出文件: {output_file}")
-        print(f"{'#'*60}\n")
+        while True:
+            attempts += 1
+            with failures_lock:
+                if combination_failures.get(combination_index, 0) >= self.max_failures_per_combination:
+                    print(f"\n⚠️  场景组合 #{combination_index} 已失败 {self.max_failures_per_combination} 次，跳过样本 {benchmark_id}")
+                    return slot, self._make_skipped_sample(benchmark_id), attempts, failures
+            
+            try:
+                sample = self.generate_one_sample(
+                    benchmark_id,
+                    theme=None,
+                    show_details=False,
+                    combination_index=combination_index
+                )
+            except Exception as e:
+                print(f"\n❌ 样本 {benchmark_id} 生成异常: {e}")
+                sample = None
+            
+            with failures_lock:
+                if sample:
+                    # 重置当前组合的失败计数
+                    combination_failures[combination_index] = 0
+                    return slot, sample, attempts, failures
+                failures += 1
+                combination_failures[combination_index] = combination_failures.get(combination_index, 0) + 1
+                print(f"\n❌ 样本 {benchmark_id} 生成失败 (组合 #{combination_index} 失败次数: {combination_failures[combination_index]}/{self.max_failures_per_combination})")
+            
+            # 短暂休息,避免过快请求
+            time.sleep(0.5)
+    
+    def _run_batch_concurrent(
+        self,
+        num_samples: int,
+        output_file: str,
+        start_id: int,
+        concurrency: int,
+        dataset: Dict[str, Any],
+        start_time: float,
+        writer: Optional[JsonlDatasetWriter],
+        run_state: Dict[str, Any]
+    ):
+        """
+        并发生成: 线程池中同时保持 concurrency 条样本在生成
         
-        # 打印API统计
-        self.api_client.print_stats()
+        每个样本位的 benchmark_id 与组合索引预先确定，
+        输出文件中的样本始终按 benchmark_id 顺序排列。
         
-        return successful_samples
+        Returns:
+            (成功样本列表, 失败次数, 总尝试次数)
+        """
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(
+                    self._generate_slot, slot, start_id,
+                    run_state["combination_failures"], run_state["failures_lock"]
+                )
+                for slot in range(num_samples) if slot not in run_state["completed"]
+            ]
+            results = (future.result() for future in as_completed(futures))
+            return self._collect_slot_results(results, num_samples, output_file, dataset, start_time, writer, run_state)
+    
+    async def _agenerate_slot(
+        self,
+        slot: int,
+        start_id: int,
+        combination_failures: Dict[int, int],
+        failures_lock: threading.Lock
+    ):
+        """
+        异步模式下生成第 slot 个样本位(重试与跳过规则同 _generate_slot)
+        
+        Returns:
+            (slot, 样本, 尝试次数, 失败次数)
+        """
+        benchmark_id = self._make_benchmark_id(start_id + slot)
+        combination_index = slot % len(self.index_map)
+        attempts = 0
+        failures = 0
+        
+        while True:
+            attempts += 1
+            with failures_lock:
+                if combination_failures.get(combination_index, 0) >= self.max_failures_per_combination:
+                    print(f"\n⚠️  场景组合 #{combination_index} 已失败 {self.max_failures_per_combination} 次，跳过样本 {benchmark_id}")
+                    return slot, self._make_skipped_sample(benchmark_id), attempts, failures
+            
+            try:
+                sample = await self.agenerate_one_sample(benchmark_id, combination_index)
+            except Exception as e:
+                print(f"\n❌ 样本 {benchmark_id} 生成异常: {e}")
+                sample = None
+            
+            with failures_lock:
+                if sample:
+                    combination_failures[combination_index] = 0
+                    return slot, sample, attempts, failures
+                failures += 1
+                combination_failures[combination_index] = combination_failures.get(combination_index, 0) + 1
+                print(f"\n❌ 样本 {benchmark_id} 生成失败 (组合 #{combination_index} 失败次数: {combination_failures[combination_index]}/{self.max_failures_per_combination})")
+            
+            await asyncio.sleep(0.5)
+    
+    async def _agenerate_slots(self, slots: List[int], start_id: int, concurrency: int, run_state: Dict[str, Any], results: queue.Queue):
+        """concurrency 个协程依次领取样本位，完成结果放入 results 队列"""
+        pending = iter(slots)
+        
+        async def worker():
+            for slot in pending:
+                results.put(await self._agenerate_slot(
+                    slot, start_id, run_state["combination_failures"], run_state["failures_lock"]
+                ))
+        
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(slots))))))
+        finally:
+            await self.api_client.ahttp.close()
+    
+    def _run_batch_async(
+        self,
+        num_samples: int,
+        output_file: str,
+        start_id: int,
+        concurrency: int,
+        dataset: Dict[str, Any],
+        start_time: float,
+        writer: Optional[JsonlDatasetWriter],
+        run_state: Dict[str, Any]
+    ):
+        """
+        异步生成: 一个后台线程运行事件循环保持 concurrency 条样本在生成，
+        主线程按完成顺序收集结果并保存(文件写入不阻塞事件循环)
+        
+        Returns:
+            (成功样本列表, 失败次数, 总尝试次数)
+        """
+        slots = [slot for slot in range(num_samples) if slot not in run_state["completed"]]
+        results = queue.Queue()
+        done = object()
+        errors = []
+        
+        def run_loop():
+            try:
+                asyncio.run(self._agenerate_slots(slots, start_id, concurrency, run_state, results))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                results.put(done)
+        
+        loop_thread = threading.Thread(target=run_loop, name="async-generation", daemon=True)
+        loop_thread.start()
+        collected = self._collect_slot_results(iter(results.get, done), num_samples, output_file, dataset, start_time, writer, run_state)
+        loop_thread.join()
+        if errors:
+            raise errors[0]
+        return collected
+    
+    def _run_batch_staged(
+        self,
+        num_samples: int,
+        output_file: str,
+        start_id: int,
+        stage_workers: Dict[str, int],
+        stage_queue_size: int,
+        dataset: Dict[str, Any],
+        start_time: float,
+        writer: Optional[JsonlDatasetWriter],
+        run_state: Dict[str, Any]
+    ):
+        """
+        分阶段流水线生成: 情境/对话/标签各自拥有队列和工作线程
+        
+        Returns:
+            (成功样本列表, 失败次数, 总尝试次数)
+        """
+        engine = StagePipelineEngine(
+            self,
+            start_id=start_id,
+            workers=stage_workers,
+            queue_size=stage_queue_size,
+            combination_failures=run_state["combination_failures"],
+            failures_lock=run_state["failures_lock"]
+        )
+        pending_slots = [slot for slot in range(num_samples) if slot not in run_state["completed"]]
+        return self._collect_slot_results(engine.run(pending_slots), num_samples, output_file, dataset, start_time, writer, run_state)
+    
+    def _collect_slot_results(
+        self,
+        results,
+        num_samples: int,
+        output_file: str,
+        dataset: Dict[str, Any],
+        start_time: float,
+        writer: Optional[JsonlDatasetWriter],
+        run_state: Dict[str, Any]
+    ):
+        """
+        收集乱序完成的样本位结果，按 benchmark_id 顺序保存
+        (JSONL 模式按完成顺序追加，组装时再排序)
+        
+        Args:
+            results: 产出 (slot, 样本, 尝试次数, 失败次数) 的迭代器
+        
+        Returns:
+            (成功样本列表, 失败次数, 总尝试次数)
+        """
+        completed = run_state["completed"]  # slot -> sample
+        failed_count = run_state["failed_count"]
+        attempt_count = run_state["attempt_count"]
+        
+        for slot, sample, attempts, failures in results:
+            completed[slot] = sample
+            attempt_count += attempts
+            failed_count += failures
+            
+            if writer:
+                writer.append(sample)
+            else:
+                dataset["samples"] = [completed[s] for s in sorted(completed)]
+            self._update_progress_info(dataset, len(completed), failed_count, attempt_count, start_time, run_state)
+            
+            # 🔄 每完成一条就立即保存
+            self._save_progress(dataset, output_file, writer)
+            
+            elapsed_time = time.time() - start_time
+            estimated_remaining_time = elapsed_time / len(completed) * (num_samples - len(completed))
+            success_rate = len(completed) / attempt_count * 100 if attempt_count > 0 else 0
+            print_progress_bar(
+                len(completed),
+                num_samples,
+                prefix='成功样本:',
+                suffix=f'尝试:{attempt_count} 成功率:{success_rate:.1f}% 失败:{failed_count} 预计剩余:{estimated_remaining_time:.0f}秒'
+            )
+        
+        successful_samples = [completed[s] for s in sorted(completed)]
+        return successful_samples, failed_count, attempt_count
 
 
 def main():
@@ -487,9 +1020,62 @@ def main():
         choices=["zh", "en", "fr", "jp", "de"],
         help="数据语言: zh=中文, en=英文, fr=法语, jp=日语, de=德语 (默认: zh)"
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="同时生成的样本数, 大于1时启用线程池并发生成 (默认: 1)"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="使用 asyncio 客户端, 单个事件循环保持 --concurrency 条样本在生成 (需要 aiohttp)"
+    )
+    parser.add_argument(
+        "--stage-workers",
+        type=int,
+        nargs=3,
+        default=None,
+        metavar=("SCENARIO", "DIALOGUE", "LABELS"),
+        help="启用分阶段流水线, 依次指定情境/对话/标签阶段的线程数 (例如: --stage-workers 2 4 2)"
+    )
+    parser.add_argument(
+        "--stage-queue-size",
+        type=int,
+        default=8,
+        help="分阶段流水线中阶段间队列的容量 (默认: 8)"
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="json",
+        choices=["json", "jsonl"],
+        help="输出格式: json=每条样本后重写整个文件, jsonl=逐条追加并在结束时组装为json (默认: json)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="从 --output 指定的已有输出续跑, 跳过已完成的样本 (需与中断前使用相同的 --num/--start-id/--format)"
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="LLM 响应缓存文件(SQLite), 相同请求直接读取缓存, 崩溃重跑或只修改部分提示词时不再重复付费"
+    )
+    parser.add_argument(
+        "--cache-replay",
+        action="store_true",
+        help="只读重放 --cache 中的响应, 未命中的请求直接失败而不调用 API"
+    )
     
     args = parser.parse_args()
     
+    if args.resume and args.output is None:
+        print("❌ 续跑需要通过 --output 指定中断前的输出文件")
+        return
+    
     # 生成默认输出文件名
     if args.output is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -499,8 +1085,8 @@ def main():
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # 如果文件已存在,清空它
-    if output_path.exists():
+    # 如果文件已存在,清空它(续跑时保留)
+    if output_path.exists() and not args.resume:
         output_path.unlink()
     
     # 根据模型选择确定使用哪个客户端
@@ -512,17 +1098,43 @@ def main():
         use_gpt51 = False
         print(f"🚀 使用硅基流动平台调用 {args.model} 生成{lang_name}数据")
     
+    # 连接池大小跟随同时在途的请求数
+    pool_size = sum(args.stage_workers) if args.stage_workers else args.concurrency
+    
+    if args.use_async and args.stage_workers:
+        print("⚠️  --async 与 --stage-workers 不能同时使用, 将使用分阶段流水线")
+        args.use_async = False
+    
+    cache = None
+    if args.cache:
+        cache = get_llm_cache(args.cache, MODE_REPLAY if args.cache_replay else MODE_READWRITE)
+        print(f"💾 响应缓存: {args.cache} ({'只读重放' if args.cache_replay else '读写'})")
+    elif args.cache_replay:
+        print("❌ --cache-replay 需要通过 --cache 指定缓存文件")
+        return
+    
     # 创建流水线并运行
     pipeline = DataGenerationPipeline(
         use_gpt51=use_gpt51, 
         target_model=args.model,
-        language=args.language
+        language=args.language,
+        pool_size=pool_size if pool_size > 1 else None,
+        max_in_flight=args.concurrency if args.use_async else None,
+        cache=cache
     )
     pipeline.generate_batch(
         num_samples=args.num,
         output_file=args.output,
-        start_id=args.start_id
+        start_id=args.start_id,
+        concurrency=args.concurrency,
+        stage_workers=dict(zip(STAGES, args.stage_workers)) if args.stage_workers else None,
+        stage_queue_size=args.stage_queue_size,
+        output_format=args.format,
+        resume=args.resume,
+        use_async=args.use_async
     )
+    if cache:
+        cache.print_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""
+令牌桶限流器 - 按 (服务商, API密钥) 限制每分钟请求数和 token 数
+进程内共享，同一密钥被多个客户端实例/线程/协程使用时共用同一组令牌桶
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    # 允许在 config.py 中按服务商/密钥配置真实配额
+    from config import RATE_LIMIT_CONFIG
+except ImportError:
+    RATE_LIMIT_CONFIG = {}
+
+DEFAULT_RATE_LIMIT_CONFIG = {
+    "default": {"rpm": 120, "tpm": None},  # 未单独配置的密钥(None 表示不限制)
+    "providers": {},                       # 按API主机配置, 如 {"api.siliconflow.cn": {"rpm": 1000, "tpm": 50000}}
+    "keys": {},                            # 按密钥单独配置(优先级最高)
+    "burst_seconds": 10                    # 令牌桶容量 = 多少秒的配额, 控制突发请求量
+}
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int = 0) -> int:
+    """
+    粗略估算一次请求消耗的 token 数(提示词 + 最大输出)
+    
+    按 UTF-8 字节数/3 估算: 中文约每字 1 token, 英文约每 3 个字符 1 token；
+    请求完成后用 record_usage 按实际用量修正
+    """
+    prompt_bytes = sum(len(str(m.get("content", "")).encode("utf-8")) for m in messages)
+    return prompt_bytes // 3 + max_tokens
+
+
+class TokenBucket:
+    """
+    令牌桶(调用方负责加锁)
+    
+    预留式扣减: 令牌可以被扣成负数，返回值为令牌回到非负所需的等待时间，
+    因此并发请求按预留顺序依次放行而不会同时醒来争抢
+    """
+    
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self, amount: float, now: float) -> float:
+        """扣减 amount 个令牌，返回需要等待的秒数"""
+        self._refill(now)
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+    
+    def refund(self, amount: float, now: float):
+        """归还(或在 amount 为负时追加扣减)令牌"""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """按 (服务商, 密钥) 管理请求数和 token 数两个令牌桶"""
+    
+    def __init__(self, config: Optional[Dict] = None):
+        config = config or {}
+        self.default_limits = config.get("default", DEFAULT_RATE_LIMIT_CONFIG["default"])
+        self.provider_limits = config.get("providers", {})
+        self.key_limits = config.get("keys", {})
+        self.burst_seconds = config.get("burst_seconds", DEFAULT_RATE_LIMIT_CONFIG["burst_seconds"])
+        
+        self.buckets: Dict[Tuple[str, str], Dict[str, Optional[TokenBucket]]] = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "wait_seconds": 0.0}
+    
+    def get_limits(self, provider: str, key: str) -> Dict[str, Optional[float]]:
+        """密钥配置 > 服务商配置 > 默认配置"""
+        return {
+            **self.default_limits,
+            **self.provider_limits.get(provider, {}),
+            **self.key_limits.get(key, {})
+        }
+    
+    def share(self, parts: int):
+        """
+        多个进程共用同一组密钥时，本进程只使用 1/parts 的配额
+        
+        各进程的令牌桶互不可见，需在发出第一个请求(创建令牌桶)之前调用
+        """
+        def scaled(limits: Dict) -> Dict:
+            return {name: value / parts if value else value for name, value in limits.items()}
+        
+        with self.lock:
+            self.default_limits = scaled(self.default_limits)
+            self.provider_limits = {provider: scaled(limits) for provider, limits in self.provider_limits.items()}
+            self.key_limits = {key: scaled(limits) for key, limits in self.key_limits.items()}
+            self.buckets.clear()
+    
+    def _get_buckets(self, provider: str, key: str) -> Dict[str, Optional[TokenBucket]]:
+        """获取 (服务商, 密钥) 对应的令牌桶(调用方持有锁)"""
+        buckets = self.buckets.get((provider, key))
+        if buckets is None:
+            limits = self.get_limits(provider, key)
+            buckets = {
+                "rpm": TokenBucket(limits["rpm"], self.burst_seconds) if limits.get("rpm") else None,
+                "tpm": TokenBucket(limits["tpm"], self.burst_seconds) if limits.get("tpm") else None
+            }
+            self.buckets[(provider, key)] = buckets
+        return buckets
+    
+    def reserve(self, provider: str, key: str, tokens: int = 0) -> float:
+        """
+        为一次请求预留配额
+        
+        Args:
+            provider: 服务商(API主机)
+            key: API密钥
+            tokens: 预计消耗的 token 数
+        
+        Returns:
+            发送请求前需要等待的秒数
+        """
+        with self.lock:
+            now = time.monotonic()
+            buckets = self._get_buckets(provider, key)
+            wait = 0.0
+            if buckets["rpm"]:
+                wait = max(wait, buckets["rpm"].reserve(1, now))
+            if buckets["tpm"] and tokens:
+                wait = max(wait, buckets["tpm"].reserve(tokens, now))
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["wait_seconds"] += wait
+        return wait
+    
+    def acquire(self, provider: str, key: str, tokens: int = 0):
+        """预留配额并阻塞等待(线程使用)"""
+        wait = self.reserve(provider, key, tokens)
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def aacquire(self, provider: str, key: str, tokens: int = 0):
+        """预留配额并异步等待(协程使用，不占用线程)"""
+        wait = self.reserve(provider, key, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def record_usage(self, provider: str, key: str, estimated_tokens: int, actual_tokens: Optional[int]):
+        """按响应中的实际 token 用量修正预留量"""
+        if actual_tokens is None:
+            return
+        with self.lock:
+            bucket = self._get_buckets(provider, key)["tpm"]
+            if bucket:
+                bucket.refund(estimated_tokens - actual_tokens, time.monotonic())
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取进程内共享的限流器"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        with _shared_lock:
+            if _shared_limiter is None:
+                _shared_limiter = RateLimiter({**DEFAULT_RATE_LIMIT_CONFIG, **RATE_LIMIT_CONFIG})
+    return _shared_limiter
+
+
+def provider_of(url: str) -> str:
+    """API 地址对应的服务商标识(主机名)"""
+    return urlsplit(url).netloc
@@ -0,0 +1,249 @@
+"""
+分阶段流水线生成引擎 - 情境/对话/标签三个阶段各自拥有独立的队列和工作线程
+情境阶段可以提前生成，标签阶段在后面消化，各阶段线程数可按其接口延迟单独配置
+"""
+import queue
+import threading
+import time
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+STAGES = ("scenario", "dialogue", "labels")
+
+STAGE_NAMES = {
+    "scenario": "情境生成",
+    "dialogue": "对话生成",
+    "labels": "标签生成"
+}
+
+# 关闭工作线程的哨兵
+_STOP = object()
+
+
+class StageStats:
+    """单个阶段的运行统计(线程安全)"""
+    
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+    
+    def record(self, duration: float, success: bool):
+        """记录一次阶段处理"""
+        with self.lock:
+            self.busy_seconds += duration
+            if success:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+
+class StagePipelineEngine:
+    """
+    分阶段生成引擎
+    
+    每个样本位(slot)依次经过 scenario -> dialogue -> labels 三个阶段。
+    阶段之间使用有界队列连接，某一阶段失败时该样本位回到情境阶段重试，
+    组合失败预算(max_failures_per_combination)耗尽后产出跳过样本。
+    """
+    
+    def __init__(
+        self,
+        pipeline,
+        start_id: int = 1,
+        workers: Optional[Dict[str, int]] = None,
+        queue_size: int = 8,
+        report_interval: float = 30.0,
+        combination_failures: Optional[Dict[int, int]] = None,
+        failures_lock: Optional[threading.Lock] = None
+    ):
+        """
+        Args:
+            pipeline: DataGenerationPipeline 实例
+            start_id: 起始ID
+            workers: 各阶段线程数, 如 {"scenario": 2, "dialogue": 4, "labels": 2}
+            queue_size: 对话/标签阶段输入队列的容量
+            report_interval: 打印阶段统计的间隔(秒)
+            combination_failures: 组合失败计数(续跑时传入已恢复的计数)
+            failures_lock: 保护 combination_failures 的锁
+        """
+        self.pipeline = pipeline
+        self.start_id = start_id
+        self.workers = {stage: 1 for stage in STAGES}
+        if workers:
+            self.workers.update({stage: max(1, n) for stage, n in workers.items() if stage in self.workers})
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        
+        # 情境阶段的输入是待生成的样本位(含重试)，不设上限以免重试时死锁
+        self.queues = {
+            "scenario": queue.Queue(),
+            "dialogue": queue.Queue(maxsize=queue_size),
+            "labels": queue.Queue(maxsize=queue_size)
+        }
+        self.results = queue.Queue()
+        self.stats = {stage: StageStats(self.workers[stage]) for stage in STAGES}
+        
+        # 组合失败计数(与顺序模式语义一致)
+        self.combination_failures = combination_failures if combination_failures is not None else {}
+        self.failures_lock = failures_lock or threading.Lock()
+        
+        self.start_time = None
+        self.threads = []
+    
+    def _new_job(self, slot: int) -> Dict[str, Any]:
+        """创建样本位任务"""
+        return {
+            "slot": slot,
+            "benchmark_id": self.pipeline._make_benchmark_id(self.start_id + slot),
+            "combination_index": slot % len(self.pipeline.index_map),
+            "attempts": 0,
+            "failures": 0
+        }
+    
+    def _handle_failure(self, job: Dict[str, Any], stage: str):
+        """阶段失败: 增加组合失败计数，样本位回到情境阶段(预算耗尽时由情境阶段产出跳过样本)"""
+        combination_index = job["combination_index"]
+        with self.failures_lock:
+            job["failures"] += 1
+            self.combination_failures[combination_index] = self.combination_failures.get(combination_index, 0) + 1
+            count = self.combination_failures[combination_index]
+        print(f"\n❌ 样本 {job['benchmark_id']} {STAGE_NAMES[stage]}失败 (组合 #{combination_index} 失败次数: {count}/{self.pipeline.max_failures_per_combination})")
+        job.pop("scenario", None)
+        job.pop("dialogue", None)
+        self.queues["scenario"].put(job)
+    
+    def _run_stage(self, stage: str, job: Dict[str, Any]) -> Optional[Any]:
+        """执行单个阶段的生成调用"""
+        pipeline = self.pipeline
+        if stage == "scenario":
+            scene_idx, atmosphere, _ = pipeline.get_combination(job["combination_index"])
+            return pipeline.scenario_gen.generate(theme=None, seed_index=scene_idx, atmosphere=atmosphere)
+        if stage == "dialogue":
+            return pipeline.dialogue_sim.generate(job["scenario"])
+        return pipeline.label_ann.generate(job["scenario"], job["dialogue"])
+    
+    def _worker(self, stage: str):
+        """阶段工作线程"""
+        in_queue = self.queues[stage]
+        next_stage = STAGES[STAGES.index(stage) + 1] if stage != STAGES[-1] else None
+        
+        while True:
+            job = in_queue.get()
+            if job is _STOP:
+                break
+            
+            if stage == "scenario":
+                job["attempts"] += 1
+                with self.failures_lock:
+                    exhausted = self.combination_failures.get(job["combination_index"], 0) >= self.pipeline.max_failures_per_combination
+                if exhausted:
+                    print(f"\n⚠️  场景组合 #{job['combination_index']} 已失败 {self.pipeline.max_failures_per_combination} 次，跳过样本 {job['benchmark_id']}")
+                    skipped = self.pipeline._make_skipped_sample(job["benchmark_id"])
+                    self.results.put((job["slot"], skipped, job["attempts"], job["failures"]))
+                    continue
+            
+            stage_start = time.time()
+            try:
+                output = self._run_stage(stage, job)
+            except Exception as e:
+                print(f"\n❌ 样本 {job['benchmark_id']} {STAGE_NAMES[stage]}异常: {e}")
+                output = None
+            self.stats[stage].record(time.time() - stage_start, bool(output))
+            
+            if not output:
+                self._handle_failure(job, stage)
+                continue
+            
+            if next_stage:
+                job[stage] = output
+                self.queues[next_stage].put(job)
+            else:
+                with self.failures_lock:
+                    # 重置当前组合的失败计数
+                    self.combination_failures[job["combination_index"]] = 0
+                sample = self.pipeline.assemble_sample(
+                    job["benchmark_id"], None, job["combination_index"],
+                    job["scenario"], job["dialogue"], output
+                )
+                self.results.put((job["slot"], sample, job["attempts"], job["failures"]))
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取各阶段的实时统计
+        
+        Returns:
+            {stage: {queue_depth, workers, processed, failed, throughput_per_min, avg_latency, utilization}}
+        """
+        elapsed = max(time.time() - self.start_time, 1e-6) if self.start_time else 1e-6
+        report = {}
+        for stage in STAGES:
+            stats = self.stats[stage]
+            with stats.lock:
+                handled = stats.processed + stats.failed
+                report[stage] = {
+                    "queue_depth": self.queues[stage].qsize(),
+                    "workers": stats.workers,
+                    "processed": stats.processed,
+                    "failed": stats.failed,
+                    "throughput_per_min": stats.processed / elapsed * 60,
+                    "avg_latency": stats.busy_seconds / handled if handled else 0.0,
+                    "utilization": stats.busy_seconds / (elapsed * stats.workers)
+                }
+        return report
+    
+    def print_stats(self):
+        """打印各阶段的队列深度和吞吐量"""
+        report = self.snapshot()
+        print(f"\n{'─'*60}")
+        print("📊 阶段统计")
+        print(f"{'阶段':<8} {'队列':>4} {'线程':>4} {'完成':>6} {'失败':>4} {'吞吐/分':>8} {'平均耗时':>8} {'利用率':>7}")
+        for stage in STAGES:
+            r = report[stage]
+            print(f"{STAGE_NAMES[stage]:<8} {r['queue_depth']:>4} {r['workers']:>4} {r['processed']:>6} {r['failed']:>4} "
+                  f"{r['throughput_per_min']:>8.1f} {r['avg_latency']:>7.1f}s {r['utilization']*100:>6.1f}%")
+        bottleneck = max(STAGES, key=lambda stage: report[stage]["utilization"])
+        print(f"🐢 当前瓶颈阶段: {STAGE_NAMES[bottleneck]}")
+        print(f"{'─'*60}")
+    
+    def run(self, slots: List[int]) -> Iterator[Tuple[int, Dict[str, Any], int, int]]:
+        """
+        运行引擎，按完成顺序产出结果
+        
+        Args:
+            slots: 待生成的样本位
+        
+        Yields:
+            (slot, 样本, 尝试次数, 失败次数)
+        """
+        self.start_time = time.time()
+        for slot in slots:
+            self.queues["scenario"].put(self._new_job(slot))
+        
+        for stage in STAGES:
+            for i in range(self.workers[stage]):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"{stage}-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        
+        last_report = time.time()
+        completed = 0
+        while completed < len(slots):
+            try:
+                result = self.results.get(timeout=1.0)
+            except queue.Empty:
+                result = None
+            if time.time() - last_report >= self.report_interval:
+                self.print_stats()
+                last_report = time.time()
+            if result is not None:
+                completed += 1
+                yield result
+        
+        self.print_stats()
+        
+        # 所有样本位都已完成，各队列为空，逐阶段发送停止信号
+        for stage in STAGES:
+            for _ in range(self.workers[stage]):
+                self.queues[stage].put(_STOP)
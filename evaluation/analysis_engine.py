@@ -0,0 +1,297 @@
+"""
+评测结果分析引擎 - 把逐条结果装入列式 DataFrame(模型/任务/主题/氛围为分类列)，
+模型、任务、主题以及氛围/核心氛围/场景的各个统计视图都由向量化 groupby 计算
+
+结果文件中没有样本的氛围和场景信息，传入数据集样本时按 benchmark_id 关联
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional
+
+import pandas as pd
+
+# 添加主目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent / "data_generator"))
+
+from result_writer import RESULT_FILES
+from result_aggregator import TASK_NAMES, difficulty_level
+from significance import significance_analysis
+
+RESULT_COLUMNS = ['benchmark_id', 'model', 'task_type', 'meta_theme', 'is_correct']
+SAMPLE_COLUMNS = ['benchmark_id', 'atmosphere', 'is_core_atmosphere', 'scene_index']
+
+# 按样本属性拆分准确率的维度
+BREAKDOWN_DIMENSIONS = {
+    'atmosphere': '氛围',
+    'is_core_atmosphere': '核心氛围',
+    'scene_index': '场景'
+}
+
+
+def _categorical(values: pd.Series, categories: Optional[List] = None) -> pd.Categorical:
+    """分类列，类别按给定顺序或首次出现的顺序排列"""
+    if categories is None:
+        categories = pd.unique(values.dropna())
+    return pd.Categorical(values, categories=categories)
+
+
+def load_result_frame(output_path: Path) -> pd.DataFrame:
+    """读取结果目录中的逐条结果文件(CSV / JSONL / Parquet)，只保留分析需要的列"""
+    output_path = Path(output_path)
+    frames = []
+    csv_file = output_path / RESULT_FILES["csv"]
+    if csv_file.exists():
+        frames.append(pd.read_csv(csv_file, usecols=RESULT_COLUMNS, dtype={'benchmark_id': str}, on_bad_lines='skip'))
+    jsonl_file = output_path / RESULT_FILES["jsonl"]
+    if jsonl_file.exists() and jsonl_file.stat().st_size:
+        frames.append(pd.read_json(jsonl_file, lines=True, dtype={'benchmark_id': str})[RESULT_COLUMNS])
+    parquet_file = output_path / RESULT_FILES["parquet"]
+    if parquet_file.exists():
+        frames.append(pd.read_parquet(parquet_file, columns=RESULT_COLUMNS))
+    if not frames:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    frame = pd.concat(frames, ignore_index=True)
+    # 同一任务出现在多种格式的文件中时只计一次
+    return frame.drop_duplicates(subset=['benchmark_id', 'model', 'task_type'], keep='last')
+
+
+def sample_frame(samples: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """数据集样本的氛围/场景属性(每个样本一行)"""
+    columns = {column: [] for column in SAMPLE_COLUMNS}
+    for sample in samples:
+        for column in SAMPLE_COLUMNS:
+            columns[column].append(sample.get(column))
+    frame = pd.DataFrame(columns)
+    frame['benchmark_id'] = frame['benchmark_id'].astype(str)
+    return frame
+
+
+def _value_order(item):
+    """拆分取值的排列顺序: 数字(场景编号)按数值，其余按字符串"""
+    value = item[0]
+    return (0, int(value), "") if value.lstrip('-').isdigit() else (1, 0, value)
+
+
+def merge_breakdowns(breakdowns: Iterable[Optional[Dict]]) -> Dict:
+    """合并多个(分片的)拆分统计: 对正确数和总数求和后重新计算准确率"""
+    merged = {}
+    for breakdown in breakdowns:
+        for dimension, models in (breakdown or {}).items():
+            for model, values in models.items():
+                for value, stats in values.items():
+                    counts = merged.setdefault(dimension, {}).setdefault(model, {}).setdefault(value, [0, 0])
+                    counts[0] += stats['correct']
+                    counts[1] += stats['total']
+    return {
+        dimension: {
+            model: {
+                value: {'correct': correct, 'total': total, 'accuracy': correct / total}
+                for value, (correct, total) in sorted(values.items(), key=_value_order)
+            }
+            for model, values in models.items()
+        }
+        for dimension, models in merged.items()
+    }
+
+
+class AnalysisEngine:
+    """列式评测结果分析"""
+    
+    def __init__(self, results: pd.DataFrame, samples: Optional[pd.DataFrame] = None, models: Optional[List[str]] = None):
+        """
+        Args:
+            results: 逐条结果，至少包含 RESULT_COLUMNS
+            samples: sample_frame() 生成的样本属性，用于按氛围/场景拆分；
+                给出时只分析这些样本的结果
+            models: 模型顺序(包括没有任何有效结果的模型)；给出时只分析这些模型的结果
+        """
+        frame = results.copy()
+        frame['benchmark_id'] = frame['benchmark_id'].astype(str)
+        if frame['is_correct'].dtype != bool:
+            frame['is_correct'] = frame['is_correct'].astype(str).str.lower().eq('true')
+        if samples is not None:
+            # 续跑时结果文件中可能留有其他 --start/--limit 范围的样本，只保留当前样本
+            frame = frame.merge(samples.drop_duplicates('benchmark_id'), on='benchmark_id', how='inner')
+            frame['atmosphere'] = _categorical(frame['atmosphere'], sorted(frame['atmosphere'].dropna().unique()))
+        
+        self.models = list(models) if models is not None else list(pd.unique(frame['model']))
+        frame['model'] = _categorical(frame['model'], self.models)
+        frame['task_type'] = _categorical(frame['task_type'], list(TASK_NAMES))
+        # 不在模型列表中的模型(如续跑前的其他 --models)和未知任务不计入任何统计
+        frame = frame[frame['model'].notna() & frame['task_type'].notna()].reset_index(drop=True)
+        frame['meta_theme'] = _categorical(frame['meta_theme'].fillna('未知'))
+        if 'run' in frame:
+            frame['run'] = _categorical(frame['run'])
+        self.frame = frame
+    
+    @classmethod
+    def from_output(cls, output_paths: Iterable[Path], samples: Optional[pd.DataFrame] = None, models: Optional[List[str]] = None) -> "AnalysisEngine":
+        """读取一个或多个结果目录，run 列为目录名"""
+        frames = []
+        for output_path in output_paths:
+            frame = load_result_frame(output_path)
+            frame['run'] = Path(output_path).name
+            frames.append(frame)
+        return cls(pd.concat(frames, ignore_index=True), samples, models)
+    
+    def accuracy(self, by: List[str]) -> pd.DataFrame:
+        """按给定列分组的 正确数/总数/准确率(没有结果的组不出现)"""
+        grouped = self.frame.groupby(by, observed=True)['is_correct'].agg(correct='sum', total='size').reset_index()
+        grouped['correct'] = grouped['correct'].astype(int)
+        grouped['accuracy'] = grouped['correct'] / grouped['total']
+        return grouped
+    
+    def breakdowns(self) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+        """按样本属性拆分的准确率: {维度: {模型: {取值: {correct, total, accuracy}}}}"""
+        breakdowns = {}
+        for dimension in BREAKDOWN_DIMENSIONS:
+            if dimension not in self.frame or self.frame[dimension].isna().all():
+                continue
+            table = {}
+            for row in self.accuracy(['model', dimension]).itertuples(index=False):
+                value = getattr(row, dimension)
+                # 场景编号在 JSON 中统一为整数的字符串形式
+                key = str(int(value)) if dimension == 'scene_index' else str(value)
+                table.setdefault(row.model, {})[key] = {
+                    'correct': int(row.correct),
+                    'total': int(row.total),
+                    'accuracy': float(row.accuracy)
+                }
+            breakdowns[dimension] = {
+                model: dict(sorted(values.items(), key=_value_order))
+                for model, values in table.items()
+            }
+        return breakdowns
+    
+    def analysis(self, total_samples: int, failed_tasks: int = 0) -> Dict[str, Any]:
+        """生成与 ResultAggregator.analysis 相同结构的分析结果，另加 breakdowns 和 significance(置信区间与显著性检验)"""
+        analysis = {
+            'summary': {},
+            'model_performance': {},
+            'task_performance': {},
+            'theme_performance': {},
+            'detailed_comparison': {},
+            'breakdowns': self.breakdowns(),
+            'significance': significance_analysis(self.frame, self.models)
+        }
+        
+        by_model_task = {
+            (row.model, row.task_type): (int(row.correct), int(row.total))
+            for row in self.accuracy(['model', 'task_type']).itertuples(index=False)
+        }
+        by_model_theme = {
+            (row.model, row.meta_theme): (int(row.correct), int(row.total))
+            for row in self.accuracy(['model', 'meta_theme']).itertuples(index=False)
+        }
+        
+        # 模型表现
+        for model in self.models:
+            model_stats = {
+                'total_samples': 0,
+                'correct_predictions': 0,
+                'accuracy': 0.0,
+                'task_accuracies': {}
+            }
+            for task_type, task_name in TASK_NAMES.items():
+                if (model, task_type) not in by_model_task:
+                    continue
+                correct, total = by_model_task[(model, task_type)]
+                model_stats['task_accuracies'][task_type] = {
+                    'task_name': task_name,
+                    'correct': correct,
+                    'total': total,
+                    'accuracy': correct / total
+                }
+                model_stats['total_samples'] += total
+                model_stats['correct_predictions'] += correct
+            if model_stats['total_samples'] > 0:
+                model_stats['accuracy'] = model_stats['correct_predictions'] / model_stats['total_samples']
+            analysis['model_performance'][model] = model_stats
+        
+        # 任务难度
+        for task_type, task_name in TASK_NAMES.items():
+            task_stats = {
+                'task_name': task_name,
+                'model_results': {},
+                'average_accuracy': 0.0,
+                'difficulty_level': ''
+            }
+            accuracies = []
+            for model in self.models:
+                if (model, task_type) not in by_model_task:
+                    continue
+                correct, total = by_model_task[(model, task_type)]
+                task_stats['model_results'][model] = {'accuracy': correct / total, 'correct': correct, 'total': total}
+                accuracies.append(correct / total)
+            if accuracies:
+                task_stats['average_accuracy'] = sum(accuracies) / len(accuracies)
+                task_stats['difficulty_level'] = difficulty_level(task_stats['average_accuracy'])
+            analysis['task_performance'][task_type] = task_stats
+        
+        # 主题表现
+        for theme in self.frame['meta_theme'].cat.categories:
+            theme_analysis = {
+                'theme_name': theme,
+                'model_accuracies': {},
+                'average_accuracy': 0.0
+            }
+            accuracies = []
+            for model in self.models:
+                if (model, theme) not in by_model_theme:
+                    continue
+                correct, total = by_model_theme[(model, theme)]
+                theme_analysis['model_accuracies'][model] = {'accuracy': correct / total, 'correct': correct, 'total': total}
+                accuracies.append(correct / total)
+            if accuracies:
+                theme_analysis['average_accuracy'] = sum(accuracies) / len(accuracies)
+            analysis['theme_performance'][theme] = theme_analysis
+        
+        successful = len(self.frame)
+        best_model = max(analysis['model_performance'].items(),
+                         key=lambda x: x[1]['accuracy']) if analysis['model_performance'] else None
+        analysis['summary'] = {
+            'total_samples_in_dataset': total_samples,
+            'successfully_evaluated_samples': int(self.frame['benchmark_id'].nunique()),
+            'successful_tasks': successful,
+            'failed_tasks': failed_tasks,
+            'success_rate': successful / (successful + failed_tasks) * 100 if (successful + failed_tasks) > 0 else 0,
+            'models_tested': len(self.models),
+            'tasks_tested': len(TASK_NAMES),
+            'best_model': best_model[0] if best_model else None,
+            'best_model_accuracy': best_model[1]['accuracy'] if best_model else 0.0
+        }
+        return analysis
+    
+    def compare_runs(self) -> pd.DataFrame:
+        """多次运行对比: 行为 (模型, 任务)，列为各次运行的准确率"""
+        table = self.accuracy(['model', 'task_type', 'run'])
+        return table.pivot_table(index=['model', 'task_type'], columns='run', values='accuracy', observed=True)
+
+
+def main():
+    """命令行: 分析/对比一个或多个结果目录"""
+    parser = argparse.ArgumentParser(description="评测结果分析")
+    parser.add_argument("outputs", nargs="+", help="结果目录(可以是多次运行)")
+    parser.add_argument("--data", default=None, help="数据集文件, 提供时按氛围/核心氛围/场景拆分准确率")
+    args = parser.parse_args()
+    
+    samples = None
+    if args.data:
+        from dataset_loader import iter_samples
+        samples = sample_frame(iter_samples(args.data))
+    
+    engine = AnalysisEngine.from_output([Path(output) for output in args.outputs], samples)
+    print(f"📊 结果条数: {len(engine.frame)} | 运行数: {len(args.outputs)} | 模型数: {len(engine.models)}")
+    
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:.1%}'.format):
+        print("\n🤖 各次运行的模型/任务准确率:")
+        print(engine.compare_runs())
+        for dimension, name in BREAKDOWN_DIMENSIONS.items():
+            if dimension in engine.frame and not engine.frame[dimension].isna().all():
+                print(f"\n🎭 按{name}拆分:")
+                print(engine.accuracy(['model', dimension]).pivot_table(index=dimension, columns='model', values='accuracy', observed=True))
+
+
+if __name__ == "__main__":
+    main()
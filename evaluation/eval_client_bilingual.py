@@ -2,14 +2,17 @@
 双语评测API客户端 - 支持中英文数据评测
 """
 import requests
+import asyncio
 import json
+import re
 import time
 import threading
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable
 from pathlib import Path
 import sys
 from queue import Queue
 import random
+from collections import OrderedDict
 
 # 添加主目录到Python路径
 sys.path.append(str(Path(__file__).parent.parent))
@@ -17,11 +20,84 @@ from config import OPENROUTER_CONFIG, SILICONFLOW_CONFIG, YUNWU_CONFIG
 # 导入AgentWorld配置
 sys.path.append(str(Path(__file__).parent.parent / "data_generator"))
 from api_client import AGENTWORLD_CONFIG
+from http_session import SessionPool, AsyncSessionPool
+from rate_limiter import get_rate_limiter, estimate_tokens, provider_of
+from key_scheduler import get_key_scheduler, parse_retry_after, STATE_NAMES
+from llm_cache import LLMCache
+
+try:
+    # 允许在 config.py 中配置哪些服务商/模型支持显式的提示词缓存标记
+    from config import PROMPT_CACHE_CONFIG
+except ImportError:
+    PROMPT_CACHE_CONFIG = {}
+
+DEFAULT_PROMPT_CACHE_CONFIG = {
+    # 服务商(API主机) -> 需要 cache_control 标记才会缓存前缀的模型名片段；
+    # 其余服务商(OpenAI、DeepSeek 等)按相同前缀自动缓存，只需保证前缀逐字节一致
+    "cache_control": {
+        "openrouter.ai": ["anthropic/", "google/gemini"]
+    }
+}
+
+# 每个样本的三个评测任务
+TASK_TYPES = ["atmosphere_recognition", "ky_test", "subtext_deciphering"]
+
+# 渲染后的样本上下文最多缓存多少条
+CONTEXT_CACHE_SIZE = 2048
+
+
+def flatten_messages(messages: List[Dict]) -> List[Dict]:
+    """把分段的消息内容拼接为纯文本(缓存键、token估算和不支持缓存标记的服务商使用)"""
+    return [
+        {**message, "content": "".join(part["text"] for part in message["content"])}
+        if isinstance(message["content"], list) else message
+        for message in messages
+    ]
+
+class ContextCache:
+    """
+    渲染后的样本上下文 LRU 缓存(线程安全)
+    
+    以 (benchmark_id, 评估模式, 语言) 为键，多个模型客户端共用时
+    同一样本的对话和角色设定只渲染一次，而不是 任务数 × 模型数 次
+    """
+    
+    def __init__(self, max_entries: int = CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+    
+    def get_or_render(self, key: tuple, render: Callable[[], str]) -> str:
+        """返回缓存的上下文，未命中时调用 render 渲染并缓存(超出容量时淘汰最久未使用的)"""
+        with self.lock:
+            context = self.entries.get(key)
+            if context is not None:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return context
+            self.stats["misses"] += 1
+        
+        # 在锁外渲染，并发渲染同一样本时结果相同，后写入的覆盖即可
+        context = render()
+        with self.lock:
+            self.entries[key] = context
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return context
+    
+    def print_stats(self):
+        """打印缓存统计"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        print(f"🧩 上下文缓存: 命中 {self.stats['hits']}/{lookups} ({self.stats['hits'] / max(lookups, 1) * 100:.1f}%) "
+              f"| 缓存条数: {len(self.entries)}/{self.max_entries}")
+
 
 class BilingualEvaluationClient:
     """双语评测API客户端"""
     
-    def __init__(self, models: List[str] = None, use_siliconflow: bool = False, use_agentworld: bool = False, use_yunwu: bool = False, language: str = "zh", evaluation_mode: str = "full"):
+    def __init__(self, models: List[str] = None, use_siliconflow: bool = False, use_agentworld: bool = False, use_yunwu: bool = False, language: str = "zh", evaluation_mode: str = "full", pool_size: Optional[int] = None, max_in_flight: Optional[int] = None, cache: Optional[LLMCache] = None, context_cache: Optional[ContextCache] = None):
         self.use_siliconflow = use_siliconflow
         self.use_agentworld = use_agentworld
         self.use_yunwu = use_yunwu
@@ -62,9 +138,31 @@ class BilingualEvaluationClient:
         self.current_model_index = 0
         self.lock = threading.Lock()
         
-        # 限流设置
-        self.rate_limit_delay = 0.5  # 每次请求间隔
-        self.key_last_used = {}  # 记录每个密钥的最后使用时间
+        # keep-alive 连接池，评测线程共享
+        self.http = SessionPool(pool_maxsize=pool_size)
+        # asyncio 连接池，同一服务商的在途请求上限由所有客户端共享
+        self.ahttp = AsyncSessionPool(max_in_flight=max_in_flight)
+        
+        # 限流设置: 进程内共享的令牌桶，按 (服务商, 密钥) 限制每分钟请求数/token数
+        self.rate_limiter = get_rate_limiter()
+        self.provider = provider_of(self.base_url)
+        
+        # 密钥调度: 记录每个密钥的健康状态(冷却/禁用)，总是选择最健康的密钥
+        self.key_scheduler = get_key_scheduler()
+        self.key_candidates = [
+            {"provider": self.provider, "key": key, "index": i}
+            for i, key in enumerate(self.api_keys)
+        ]
+        
+        # 响应缓存(可选)，同一评测请求重跑时直接读取
+        self.cache = cache
+        
+        # 渲染后的样本上下文缓存(可选)，评测器让所有模型客户端共用一个
+        self.context_cache = context_cache
+        
+        # 服务商的提示词前缀缓存: 需要显式标记的模型在共享前缀末尾加 cache_control
+        prompt_cache_config = {**DEFAULT_PROMPT_CACHE_CONFIG, **PROMPT_CACHE_CONFIG}
+        self.cache_control_models = prompt_cache_config["cache_control"].get(self.provider, [])
         
         # 重试设置
         self.max_retries = 10
@@ -74,8 +172,13 @@ class BilingualEvaluationClient:
             'total_requests': 0,
             'successful_requests': 0,
             'failed_requests': 0,
-            'key_switches': 0,
+            'cache_hits': 0,
+            'single_call_fallbacks': 0,
+            'prompt_tokens': 0,
+            'cached_prompt_tokens': 0,
             'rate_limit_hits': 0,
+            'key_cooldowns': 0,
+            'key_disables': 0,
             'model_usage': {model: 0 for model in self.models}
         }
         
@@ -111,14 +214,31 @@ class BilingualEvaluationClient:
             # 其他模式：使用密钥轮换
             return self.api_keys[self.current_key_index]
     
-    def _switch_key(self):
-        """切换到下一个API密钥"""
-        current_model = self._get_current_model()
-        # AgentWorld模式或使用模型专用密钥时不需要切换密钥
-        if not self.use_agentworld and current_model not in self.model_specific_keys:
-            with self.lock:
-                self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-                self.stats['key_switches'] += 1
+    def _key_candidates(self, model: str) -> List[Dict]:
+        """模型可用的候选密钥(AgentWorld和模型专用密钥只有一个，其余模式为整个密钥池)"""
+        if self.use_agentworld or model in self.model_specific_keys:
+            return [{"provider": self.provider, "key": self._get_current_key(model), "index": self.current_key_index}]
+        return self.key_candidates
+    
+    def _use_candidate(self, choice: Dict):
+        """记录调度器选出的密钥(按最久未用轮换密钥不计入统计)"""
+        with self.lock:
+            self.current_key_index = choice["index"]
+    
+    def _report_failure(self, choice: Dict, status: int, retry_after: Optional[str] = None):
+        """把失败的请求结果报告给密钥调度器"""
+        if status == 429:
+            self.stats['rate_limit_hits'] += 1
+            self.stats['key_cooldowns'] += 1
+            cooldown = self.key_scheduler.report_rate_limited(choice["provider"], choice["key"], parse_retry_after(retry_after))
+            print(f"⚠️ 限流错误 (429), 密钥 {choice['index'] + 1} 冷却 {cooldown:.0f}s")
+        elif status == 401:
+            self.key_scheduler.report_invalid(choice["provider"], choice["key"])
+            self.stats['key_disables'] += 1
+            print(f"❌ 认证错误 (401), 禁用密钥 {choice['index'] + 1}")
+        else:
+            if self.key_scheduler.report_error(choice["provider"], choice["key"]) > 0:
+                self.stats['key_cooldowns'] += 1
     
     def _switch_model(self):
         """切换到下一个模型"""
@@ -126,31 +246,63 @@ class BilingualEvaluationClient:
             self.current_model_index = (self.current_model_index + 1) % len(self.models)
             print(f"🔄 切换模型: {self._get_current_model()}")
     
-    def _apply_rate_limit(self):
-        """应用限流延迟"""
-        current_time = time.time()
-        current_key = self._get_current_key()
-        
-        # 检查该密钥的上次使用时间
-        if current_key in self.key_last_used:
-            time_since_last = current_time - self.key_last_used[current_key]
-            if time_since_last < self.rate_limit_delay:
-                sleep_time = self.rate_limit_delay - time_since_last
-                time.sleep(sleep_time)
+    def _uses_cache_control(self, model: str) -> bool:
+        """该模型是否需要显式的 cache_control 标记才会缓存提示词前缀"""
+        return any(fragment in model for fragment in self.cache_control_models)
+    
+    def _payload_messages(self, messages: List[Dict], model: str) -> List[Dict]:
+        """
+        请求体中的消息
         
-        self.key_last_used[current_key] = time.time()
+        支持显式缓存的模型保留分段内容，在共享前缀段上加 cache_control；
+        其余模型拼接为纯文本，依靠服务商的自动前缀缓存
+        """
+        if not self._uses_cache_control(model):
+            return flatten_messages(messages)
+        return [
+            {**message, "content": [
+                {"type": "text", "text": part["text"], **({"cache_control": {"type": "ephemeral"}} if part.get("cacheable") else {})}
+                for part in message["content"]
+            ]} if isinstance(message["content"], list) else message
+            for message in messages
+        ]
+    
+    def _record_prompt_usage(self, usage: Dict):
+        """统计提示词 token 数及其中命中服务商前缀缓存的部分"""
+        self.stats['prompt_tokens'] += usage.get('prompt_tokens') or 0
+        # OpenAI/OpenRouter: prompt_tokens_details.cached_tokens; DeepSeek: prompt_cache_hit_tokens
+        cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or usage.get('prompt_cache_hit_tokens') or 0
+        self.stats['cached_prompt_tokens'] += cached
     
     def call_llm(self, messages: List[Dict], temperature: float = 0.3) -> Optional[str]:
-        """调用LLM API"""
+        """调用LLM API(用户消息的内容可以是分段的, 见 _build_messages)"""
+        payload_messages = messages
+        messages = flatten_messages(messages)
+        if self.cache:
+            cache_key, cached = self.cache.lookup(self._get_current_model(), messages, temperature, 1000)
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                return cached
+            if self.cache.replay:
+                return None
+        
         self.stats['total_requests'] += 1
         
         for attempt in range(self.max_retries):
+            # 选出当前最健康的密钥(全部冷却时等待最早恢复的密钥)
+            current_model = self._get_current_model()
+            choice = self.key_scheduler.acquire(self._key_candidates(current_model))
+            if choice is None:
+                print(f"❌ 所有API密钥均已失效(401)")
+                break
+            self._use_candidate(choice)
+            
             try:
-                # 应用限流
-                self._apply_rate_limit()
+                current_key = choice["key"]
                 
-                current_model = self._get_current_model()
-                current_key = self._get_current_key(current_model)
+                # 应用限流(同一密钥的所有客户端共享配额)
+                estimated_tokens = estimate_tokens(messages, 1000)
+                self.rate_limiter.acquire(self.provider, current_key, estimated_tokens)
                 
                 headers = {
                     "Authorization": f"Bearer {current_key}",
@@ -159,12 +311,12 @@ class BilingualEvaluationClient:
                 
                 payload = {
                     "model": current_model,
-                    "messages": messages,
+                    "messages": self._payload_messages(payload_messages, current_model),
                     "temperature": temperature,
                     "max_tokens": 1000
                 }
                 
-                response = requests.post(
+                response = self.http.post(
                     self.base_url,
                     headers=headers,
                     json=payload,
@@ -174,6 +326,12 @@ class BilingualEvaluationClient:
                 if response.status_code == 200:
                     data = response.json()
                     content = data['choices'][0]['message']['content']
+                    usage = data.get('usage') or {}
+                    self.rate_limiter.record_usage(self.provider, current_key, estimated_tokens, usage.get('total_tokens'))
+                    self._record_prompt_usage(usage)
+                    self.key_scheduler.report_success(self.provider, current_key)
+                    if self.cache:
+                        self.cache.put(cache_key, current_model, content)
                     
                     # 更新统计
                     self.stats['successful_requests'] += 1
@@ -181,29 +339,10 @@ class BilingualEvaluationClient:
                     
                     return content
                 
-                elif response.status_code == 429:
-                    # 限流错误
-                    self.stats['rate_limit_hits'] += 1
-                    print(f"⚠️ 限流错误 (429), 尝试 {attempt + 1}/{self.max_retries}, "
-                          f"当前密钥: {self.current_key_index + 1}/{len(self.api_keys) if not self.use_agentworld else 'N/A'}")
-                    
-                    if attempt < self.max_retries - 1:
-                        # 如果有多个API密钥，则切换；否则保持当前密钥
-                        if not self.use_agentworld and len(self.api_keys) > 1:
-                            self._switch_key()
-                            print(f"🔄 切换API密钥: {self.current_key_index+1}/{len(self.api_keys)}")
-                        
-                        sleep_time = 1.0  # 固定1秒延迟
-                        print(f"⏱️ 延迟 {sleep_time:.1f}s 后重试")
-                        time.sleep(sleep_time)
-                    
-                elif response.status_code == 401:
-                    # 认证错误，切换密钥
-                    print(f"❌ 认证错误 (401), 切换密钥")
-                    self._switch_key()
-                    
-                else:
+                # 限流(429)按 Retry-After 冷却该密钥, 认证错误(401)禁用该密钥
+                if response.status_code not in (429, 401):
                     print(f"❌ API错误: {response.status_code} - {response.text}")
+                self._report_failure(choice, response.status_code, response.headers.get("Retry-After"))
                     
             except requests.exceptions.Timeout:
                 print(f"⏰ 请求超时, 尝试 {attempt + 1}/{self.max_retries}")
@@ -219,42 +358,89 @@ class BilingualEvaluationClient:
         self.stats['failed_requests'] += 1
         return None
     
+    async def acall_llm(self, messages: List[Dict], temperature: float = 0.3) -> Optional[str]:
+        """调用LLM API(异步版本, 重试与切换规则同 call_llm)"""
+        payload_messages = messages
+        messages = flatten_messages(messages)
+        if self.cache:
+            cache_key, cached = self.cache.lookup(self._get_current_model(), messages, temperature, 1000)
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                return cached
+            if self.cache.replay:
+                return None
+        
+        self.stats['total_requests'] += 1
+        
+        for attempt in range(self.max_retries):
+            current_model = self._get_current_model()
+            choice = await self.key_scheduler.aacquire(self._key_candidates(current_model))
+            if choice is None:
+                print(f"❌ 所有API密钥均已失效(401)")
+                break
+            self._use_candidate(choice)
+            
+            try:
+                current_key = choice["key"]
+                
+                estimated_tokens = estimate_tokens(messages, 1000)
+                await self.rate_limiter.aacquire(self.provider, current_key, estimated_tokens)
+                
+                headers = {
+                    "Authorization": f"Bearer {current_key}",
+                    "Content-Type": "application/json"
+                }
+                
+                payload = {
+                    "model": current_model,
+                    "messages": self._payload_messages(payload_messages, current_model),
+                    "temperature": temperature,
+                    "max_tokens": 1000
+                }
+                
+                async with self.ahttp.post(
+                    self.base_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                ) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    body = await response.text()
+                
+                if status == 200:
+                    data = json.loads(body)
+                    content = data['choices'][0]['message']['content']
+                    usage = data.get('usage') or {}
+                    self.rate_limiter.record_usage(self.provider, current_key, estimated_tokens, usage.get('total_tokens'))
+                    self._record_prompt_usage(usage)
+                    self.key_scheduler.report_success(self.provider, current_key)
+                    if self.cache:
+                        self.cache.put(cache_key, current_model, content)
+                    self.stats['successful_requests'] += 1
+                    self.stats['model_usage'][current_model] += 1
+                    return content
+                
+                if status not in (429, 401):
+                    print(f"❌ API错误: {status} - {body}")
+                self._report_failure(choice, status, retry_after)
+                    
+            except asyncio.TimeoutError:
+                print(f"⏰ 请求超时, 尝试 {attempt + 1}/{self.max_retries}")
+                
+            except Exception as e:
+                print(f"❌ 请求异常: {e}")
+                
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(random.uniform(1, 2))
+        
+        self.stats['failed_requests'] += 1
+        return None
+    
     def evaluate_sample(self, sample: Dict, task_type: str) -> Optional[Dict]:
         """评测单个样本的特定任务"""
         try:
-            # 构建评测prompt
-            prompt = self._build_evaluation_prompt(sample, task_type)
-            
-            # 根据语言和评估模式选择system prompt
-            if self.evaluation_mode == "limited":
-                if self.language == "zh":
-                    system_prompt = "你是一个专业的对话分析专家。请以审慎的态度仔细观察对话中的细节，从语言、语调、互动模式等方面进行推理分析。"
-                else:
-                    system_prompt = "You are a professional dialogue analysis expert. Please approach the analysis with caution and carefully observe details in the conversation, reasoning from language, tone, and interaction patterns."
-            elif self.evaluation_mode == "chat":
-                # Chat模式根据是否有完整角色信息来调整系统提示
-                if self._has_full_persona_info(sample):
-                    # 有完整角色信息，使用全知视角提示
-                    if self.language == "zh":
-                        system_prompt = "你是一个专业的对话分析专家。请仔细分析包含闲聊内容的多人对话场景，你可以看到每个角色的隐藏动机和集体意图，注意区分闲聊话题和核心冲突内容。"
-                    else:
-                        system_prompt = "You are a professional dialogue analysis expert. Please carefully analyze multi-person dialogue scenarios that include casual chat content. You can see each character's hidden motives and collective intentions. Distinguish between casual topics and core conflict content."
-                else:
-                    # 没有完整角色信息，使用有限信息提示
-                    if self.language == "zh":
-                        system_prompt = "你是一个专业的对话分析专家。请仔细分析包含闲聊内容的多人对话场景，注意区分闲聊话题和核心冲突内容。"
-                    else:
-                        system_prompt = "You are a professional dialogue analysis expert. Please carefully analyze multi-person dialogue scenarios that include casual chat content, distinguishing between casual topics and core conflict content."
-            else:
-                if self.language == "zh":
-                    system_prompt = "你是一个专业的对话分析专家，请仔细分析给定的多人对话场景。"
-                else:
-                    system_prompt = "You are a professional dialogue analysis expert. Please carefully analyze the given multi-person dialogue scenario."
-            
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ]
+            messages = self._build_messages(sample, task_type)
             
             # 调用API
             response = self.call_llm(messages)
@@ -269,43 +455,197 @@ class BilingualEvaluationClient:
             print(f"❌ 评测样本失败: {e}")
             return None
     
-    def _build_evaluation_prompt(self, sample: Dict, task_type: str) -> str:
-        """构建评测prompt - 支持中英文和不同评估模式"""
+    async def aevaluate_sample(self, sample: Dict, task_type: str) -> Optional[Dict]:
+        """评测单个样本的特定任务(异步版本)"""
+        try:
+            messages = self._build_messages(sample, task_type)
+            response = await self.acall_llm(messages)
+            if not response:
+                return None
+            return self._parse_evaluation_response(response, sample, task_type)
+            
+        except Exception as e:
+            print(f"❌ 评测样本失败: {e}")
+            return None
+    
+    def evaluate_sample_all_tasks(self, sample: Dict, task_types: List[str] = TASK_TYPES) -> Dict[str, Optional[Dict]]:
+        """
+        一次请求回答同一样本的全部问题(共享一份上下文)
+        
+        解析失败或缺少答案的任务回退为逐个任务单独请求
+        
+        Returns:
+            {任务类型: 评测结果(失败为None)}
+        """
+        results = {}
+        try:
+            response = self.call_llm(self._build_all_tasks_messages(sample, task_types))
+            if response:
+                results = self._parse_all_tasks_response(response, sample, task_types)
+        except Exception as e:
+            print(f"❌ 合并评测样本失败: {e}")
         
+        for task_type in task_types:
+            if task_type not in results:
+                self.stats['single_call_fallbacks'] += 1
+                results[task_type] = self.evaluate_sample(sample, task_type)
+        return results
+    
+    async def aevaluate_sample_all_tasks(self, sample: Dict, task_types: List[str] = TASK_TYPES) -> Dict[str, Optional[Dict]]:
+        """evaluate_sample_all_tasks 的异步版本"""
+        results = {}
+        try:
+            response = await self.acall_llm(self._build_all_tasks_messages(sample, task_types))
+            if response:
+                results = self._parse_all_tasks_response(response, sample, task_types)
+        except Exception as e:
+            print(f"❌ 合并评测样本失败: {e}")
+        
+        for task_type in task_types:
+            if task_type not in results:
+                self.stats['single_call_fallbacks'] += 1
+                results[task_type] = await self.aevaluate_sample(sample, task_type)
+        return results
+    
+    def _get_system_prompt(self, sample: Dict) -> str:
+        """根据语言和评估模式选择system prompt"""
+        if self.evaluation_mode == "limited":
+            if self.language == "zh":
+                return "你是一个专业的对话分析专家。请以审慎的态度仔细观察对话中的细节，从语言、语调、互动模式等方面进行推理分析。"
+            else:
+                return "You are a professional dialogue analysis expert. Please approach the analysis with caution and carefully observe details in the conversation, reasoning from language, tone, and interaction patterns."
+        elif self.evaluation_mode == "chat":
+            # Chat模式根据是否有完整角色信息来调整系统提示
+            if self._has_full_persona_info(sample):
+                # 有完整角色信息，使用全知视角提示
+                if self.language == "zh":
+                    return "你是一个专业的对话分析专家。请仔细分析包含闲聊内容的多人对话场景，你可以看到每个角色的隐藏动机和集体意图，注意区分闲聊话题和核心冲突内容。"
+                else:
+                    return "You are a professional dialogue analysis expert. Please carefully analyze multi-person dialogue scenarios that include casual chat content. You can see each character's hidden motives and collective intentions. Distinguish between casual topics and core conflict content."
+            else:
+                # 没有完整角色信息，使用有限信息提示
+                if self.language == "zh":
+                    return "你是一个专业的对话分析专家。请仔细分析包含闲聊内容的多人对话场景，注意区分闲聊话题和核心冲突内容。"
+                else:
+                    return "You are a professional dialogue analysis expert. Please carefully analyze multi-person dialogue scenarios that include casual chat content, distinguishing between casual topics and core conflict content."
+        else:
+            if self.language == "zh":
+                return "你是一个专业的对话分析专家，请仔细分析给定的多人对话场景。"
+            else:
+                return "You are a professional dialogue analysis expert. Please carefully analyze the given multi-person dialogue scenario."
+    
+    def _build_messages(self, sample: Dict, task_type: str) -> List[Dict]:
+        """
+        构建评测消息(system prompt + 评测prompt)
+        
+        用户消息分为两段: 同一样本所有任务逐字节相同的前缀(上下文)和任务后缀(问题)，
+        system prompt + 前缀可以被服务商缓存，评测同一样本的其他任务时只需处理后缀
+        """
+        return [
+            {"role": "system", "content": self._get_system_prompt(sample)},
+            {"role": "user", "content": [
+                {"text": self._build_prompt_prefix(sample), "cacheable": True},
+                {"text": self._build_question(sample, task_type)}
+            ]}
+        ]
+    
+    def _build_all_tasks_messages(self, sample: Dict, task_types: List[str]) -> List[Dict]:
+        """构建一次回答全部问题的评测消息(前缀与单任务消息相同)"""
+        return [
+            {"role": "system", "content": self._get_system_prompt(sample)},
+            {"role": "user", "content": [
+                {"text": self._build_prompt_prefix(sample), "cacheable": True},
+                {"text": self._build_all_tasks_suffix(sample, task_types)}
+            ]}
+        ]
+    
+    def _build_prompt_prefix(self, sample: Dict) -> str:
+        """同一样本所有评测请求共用的prompt前缀"""
+        return f"{self._build_context(sample)}\n\n"
+    
+    def _build_evaluation_prompt(self, sample: Dict, task_type: str) -> str:
+        """构建评测prompt - 支持中英文和不同评估模式(上下文 + 问题)"""
+        return self._build_prompt_prefix(sample) + self._build_question(sample, task_type)
+    
+    def _build_all_tasks_prompt(self, sample: Dict, task_types: List[str]) -> str:
+        """构建一次回答全部问题的prompt: 上下文只出现一次，各问题依次列出，要求以JSON作答"""
+        return self._build_prompt_prefix(sample) + self._build_all_tasks_suffix(sample, task_types)
+    
+    def _build_all_tasks_suffix(self, sample: Dict, task_types: List[str]) -> str:
+        """一次回答全部问题时上下文之后的部分"""
+        if self.language == "zh":
+            questions = [f"【问题{i}】\n{self._build_question(sample, task_type)}" for i, task_type in enumerate(task_types, 1)]
+            answer_format = ", ".join(f'"{task_type}": <问题{i}的选项编号>' for i, task_type in enumerate(task_types, 1))
+            instruction = f"请依次回答以上{len(task_types)}个问题，只输出如下JSON，不要解释：\n{{{answer_format}}}"
+        else:
+            questions = [f"[Question {i}]\n{self._build_question(sample, task_type)}" for i, task_type in enumerate(task_types, 1)]
+            answer_format = ", ".join(f'"{task_type}": <option number for Question {i}>' for i, task_type in enumerate(task_types, 1))
+            instruction = f"Please answer all {len(task_types)} questions above. Output only the following JSON, no explanation:\n{{{answer_format}}}"
+        return "\n\n".join([*questions, instruction])
+    
+    def _build_context(self, sample: Dict) -> str:
+        """构建评测上下文(场景、角色、对话、关键时刻)，同一样本的所有问题共用"""
+        if self.context_cache is None or sample.get('benchmark_id') is None:
+            return self._render_context(sample)
+        key = (sample['benchmark_id'], self.evaluation_mode, self.language)
+        return self.context_cache.get_or_render(key, lambda: self._render_context(sample))
+    
+    def _render_context(self, sample: Dict) -> str:
+        """按语言和评估模式渲染评测上下文"""
         if self.evaluation_mode == "limited":
             # 有限信息模式：只提供基本身份和对话
             if self.language == "zh":
-                return self._build_chinese_limited_prompt(sample, task_type)
+                return self._build_chinese_limited_context(sample)
             else:
-                return self._build_english_limited_prompt(sample, task_type)
+                return self._build_english_limited_context(sample)
         elif self.evaluation_mode == "chat":
-            # 闲聊模式：可以是全知视角或有限信息，但使用闲聊数据集
-            # 这里我们需要检查是否有完整的角色信息来决定使用哪种模式
+            # 闲聊模式：有完整的角色信息时使用全知视角，否则使用有限信息模式
             if self._has_full_persona_info(sample):
-                # 如果有完整的角色信息，使用全知视角
                 if self.language == "zh":
-                    return self._build_chinese_chat_full_prompt(sample, task_type)
+                    return self._build_chinese_chat_full_context(sample)
                 else:
-                    return self._build_english_chat_full_prompt(sample, task_type)
+                    return self._build_english_chat_full_context(sample)
             else:
-                # 否则使用有限信息模式
                 if self.language == "zh":
-                    return self._build_chinese_limited_prompt(sample, task_type)
+                    return self._build_chinese_limited_context(sample)
                 else:
-                    return self._build_english_limited_prompt(sample, task_type)
+                    return self._build_english_limited_context(sample)
         else:
             # 全知视角模式：提供完整信息
             if self.language == "zh":
-                return self._build_chinese_prompt(sample, task_type)
+                return self._build_chinese_context(sample)
             else:
-                return self._build_english_prompt(sample, task_type)
+                return self._build_english_context(sample)
     
-    def _build_chinese_prompt(self, sample: Dict, task_type: str) -> str:
-        """构建中文评测prompt"""
+    def _build_question(self, sample: Dict, task_type: str) -> str:
+        """构建单个任务的问题部分(分析提示、问题、选项和作答要求)"""
+        if self.evaluation_mode == "limited":
+            if self.language == "zh":
+                return self._build_chinese_limited_question(sample, task_type)
+            else:
+                return self._build_english_limited_question(sample, task_type)
+        elif self.evaluation_mode == "chat":
+            if self._has_full_persona_info(sample):
+                if self.language == "zh":
+                    return self._build_chinese_chat_full_question(sample, task_type)
+                else:
+                    return self._build_english_chat_full_question(sample, task_type)
+            else:
+                if self.language == "zh":
+                    return self._build_chinese_limited_question(sample, task_type)
+                else:
+                    return self._build_english_limited_question(sample, task_type)
+        else:
+            if self.language == "zh":
+                return self._build_chinese_question(sample, task_type)
+            else:
+                return self._build_english_question(sample, task_type)
+    
+    def _build_chinese_context(self, sample: Dict) -> str:
+        """中文全知视角上下文(场景、角色动机、集体意图、对话)"""
         scenario = sample['scenario_setup']
         dialogue = sample['dialogue_transcript']
         trigger = sample['evaluation_trigger']
-        labels = sample['evaluation_labels']
         
         # 构建对话文本
         dialogue_text = "\n".join([
@@ -313,7 +653,7 @@ class BilingualEvaluationClient:
             for turn in dialogue
         ])
         
-        base_context = f"""
+        return f"""
 场景描述: {scenario['scenario_description']}
 
 角色设定:
@@ -326,12 +666,14 @@ class BilingualEvaluationClient:
 
 关键时刻: Turn {trigger['trigger_turn_id']} - {trigger['trigger_description']}
 """
+    
+    def _build_chinese_question(self, sample: Dict, task_type: str) -> str:
+        """中文评测问题"""
+        labels = sample['evaluation_labels']
         
         if task_type == "atmosphere_recognition":
             question = labels['atmosphere_recognition']
-            return f"""{base_context}
-
-请分析在关键时刻后，群体氛围最突出的变化是什么？
+            return f"""请分析在关键时刻后，群体氛围最突出的变化是什么？
 
 问题: {question['question']}
 
@@ -342,9 +684,7 @@ class BilingualEvaluationClient:
 
         elif task_type == "ky_test":
             question = labels['ky_test']
-            return f"""{base_context}
-
-请分析在当前情况下，最合时宜的回应应该是什么？
+            return f"""请分析在当前情况下，最合时宜的回应应该是什么？
 
 问题: {question['question']}
 
@@ -355,9 +695,7 @@ class BilingualEvaluationClient:
 
         elif task_type == "subtext_deciphering":
             question = labels['subtext_deciphering']
-            return f"""{base_context}
-
-请分析以下对话中的潜台词含义：
+            return f"""请分析以下对话中的潜台词含义：
 
 问题: {question['question']}
 
@@ -368,12 +706,11 @@ class BilingualEvaluationClient:
         
         return ""
     
-    def _build_chinese_limited_prompt(self, sample: Dict, task_type: str) -> str:
-        """构建中文有限信息评测prompt - 只提供基本身份和对话"""
+    def _build_chinese_limited_context(self, sample: Dict) -> str:
+        """中文有限信息上下文 - 只提供基本身份和对话"""
         scenario = sample['scenario_setup']
         dialogue = sample['dialogue_transcript']
         trigger = sample['evaluation_trigger']
-        labels = sample['evaluation_labels']
         
         # 构建对话文本
         dialogue_text = "\n".join([
@@ -384,7 +721,7 @@ class BilingualEvaluationClient:
         # 只提供基本角色名称（不包含任何目标、动机和集体意图）
         basic_personas = "\n".join([f"- {p['name']}" for p in scenario['personas']])
         
-        base_context = f"""
+        return f"""
 场景描述: {scenario['scenario_description']}
 
 角色设定:
@@ -395,12 +732,14 @@ class BilingualEvaluationClient:
 
 关键时刻: Turn {trigger['trigger_turn_id']} - {trigger['trigger_description']}
 """
+    
+    def _build_chinese_limited_question(self, sample: Dict, task_type: str) -> str:
+        """中文有限信息评测问题"""
+        labels = sample['evaluation_labels']
         
         if task_type == "atmosphere_recognition":
             question = labels['atmosphere_recognition']
-            return f"""{base_context}
-
-请仔细观察对话中的语言细节、说话方式和互动模式，基于你能观察到的具体线索进行审慎推理。
+            return f"""请仔细观察对话中的语言细节、说话方式和互动模式，基于你能观察到的具体线索进行审慎推理。
 
 请分析在关键时刻后，群体氛围最突出的变化是什么？
 
@@ -413,9 +752,7 @@ class BilingualEvaluationClient:
 
         elif task_type == "ky_test":
             question = labels['ky_test']
-            return f"""{base_context}
-
-请仔细观察对话中的语言细节、说话方式和互动模式，基于你能观察到的具体线索进行审慎推理。
+            return f"""请仔细观察对话中的语言细节、说话方式和互动模式，基于你能观察到的具体线索进行审慎推理。
 
 请分析在当前情况下，最合时宜的回应应该是什么？
 
@@ -428,9 +765,7 @@ class BilingualEvaluationClient:
 
         elif task_type == "subtext_deciphering":
             question = labels['subtext_deciphering']
-            return f"""{base_context}
-
-请仔细观察对话中的语言细节、说话方式和互动模式，基于你能观察到的具体线索进行审慎推理。
+            return f"""请仔细观察对话中的语言细节、说话方式和互动模式，基于你能观察到的具体线索进行审慎推理。
 
 请分析以下对话中的潜台词含义：
 
@@ -443,12 +778,11 @@ class BilingualEvaluationClient:
         
         return ""
     
-    def _build_english_prompt(self, sample: Dict, task_type: str) -> str:
-        """构建英文评测prompt"""
+    def _build_english_context(self, sample: Dict) -> str:
+        """英文全知视角上下文(场景、角色动机、集体意图、对话)"""
         scenario = sample['scenario_setup']
         dialogue = sample['dialogue_transcript']
         trigger = sample['evaluation_trigger']
-        labels = sample['evaluation_labels']
         
         # 构建对话文本
         dialogue_text = "\n".join([
@@ -456,7 +790,7 @@ class BilingualEvaluationClient:
             for turn in dialogue
         ])
         
-        base_context = f"""
+        return f"""
 Scenario Description: {scenario['scenario_description']}
 
 Character Settings:
@@ -469,12 +803,14 @@ Dialogue Content:
 
 Critical Moment: Turn {trigger['trigger_turn_id']} - {trigger['trigger_description']}
 """
+    
+    def _build_english_question(self, sample: Dict, task_type: str) -> str:
+        """英文评测问题"""
+        labels = sample['evaluation_labels']
         
         if task_type == "atmosphere_recognition":
             question = labels['atmosphere_recognition']
-            return f"""{base_context}
-
-Please analyze what the most prominent change in group atmosphere is after the critical moment.
+            return f"""Please analyze what the most prominent change in group atmosphere is after the critical moment.
 
 Question: {question['question']}
 
@@ -485,9 +821,7 @@ Please only answer with the option number (1-6), no explanation needed."""
 
         elif task_type == "ky_test":
             question = labels['ky_test']
-            return f"""{base_context}
-
-Please analyze what the most appropriate response should be in the current situation.
+            return f"""Please analyze what the most appropriate response should be in the current situation.
 
 Question: {question['question']}
 
@@ -498,9 +832,7 @@ Please only answer with the option number (1-6), no explanation needed."""
 
         elif task_type == "subtext_deciphering":
             question = labels['subtext_deciphering']
-            return f"""{base_context}
-
-Please analyze the subtext meaning in the following dialogue:
+            return f"""Please analyze the subtext meaning in the following dialogue:
 
 Question: {question['question']}
 
@@ -511,12 +843,11 @@ Please only answer with the option number (1-6), no explanation needed."""
         
         return ""
     
-    def _build_english_limited_prompt(self, sample: Dict, task_type: str) -> str:
-        """构建英文有限信息评测prompt - 只提供基本身份和对话"""
+    def _build_english_limited_context(self, sample: Dict) -> str:
+        """英文有限信息上下文 - 只提供基本身份和对话"""
         scenario = sample['scenario_setup']
         dialogue = sample['dialogue_transcript']
         trigger = sample['evaluation_trigger']
-        labels = sample['evaluation_labels']
         
         # 构建对话文本
         dialogue_text = "\n".join([
@@ -527,7 +858,7 @@ Please only answer with the option number (1-6), no explanation needed."""
         # 只提供基本角色名称（不包含任何目标、动机和集体意图）
         basic_personas = "\n".join([f"- {p['name']}" for p in scenario['personas']])
         
-        base_context = f"""
+        return f"""
 Scenario Description: {scenario['scenario_description']}
 
 Character Settings:
@@ -538,12 +869,14 @@ Dialogue Content:
 
 Critical Moment: Turn {trigger['trigger_turn_id']} - {trigger['trigger_description']}
 """
+    
+    def _build_english_limited_question(self, sample: Dict, task_type: str) -> str:
+        """英文有限信息评测问题"""
+        labels = sample['evaluation_labels']
         
         if task_type == "atmosphere_recognition":
             question = labels['atmosphere_recognition']
-            return f"""{base_context}
-
-Please analyze what the most prominent change in group atmosphere is after the critical moment.
+            return f"""Please analyze what the most prominent change in group atmosphere is after the critical moment.
 
 Question: {question['question']}
 
@@ -554,9 +887,7 @@ Please only answer with the option number (1-6), no explanation needed."""
 
         elif task_type == "ky_test":
             question = labels['ky_test']
-            return f"""{base_context}
-
-Please analyze what the most appropriate response should be in the current situation.
+            return f"""Please analyze what the most appropriate response should be in the current situation.
 
 Question: {question['question']}
 
@@ -567,9 +898,7 @@ Please only answer with the option number (1-6), no explanation needed."""
 
         elif task_type == "subtext_deciphering":
             question = labels['subtext_deciphering']
-            return f"""{base_context}
-
-Please analyze the subtext meaning in the following dialogue:
+            return f"""Please analyze the subtext meaning in the following dialogue:
 
 Question: {question['question']}
 
@@ -606,6 +935,36 @@ Please only answer with the option number (1-6), no explanation needed."""
             'parse_error': False
         }
     
+    def _parse_all_tasks_response(self, response: str, sample: Dict, task_types: List[str]) -> Dict[str, Dict]:
+        """
+        解析一次回答全部问题的JSON响应
+        
+        Returns:
+            {任务类型: 评测结果}，只包含成功解析出答案的任务
+        """
+        match = re.search(r'\{.*\}', response, re.S)
+        if not match:
+            return {}
+        try:
+            answers = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(answers, dict):
+            return {}
+        
+        results = {}
+        for task_type in task_types:
+            answer = answers.get(task_type)
+            if isinstance(answer, bool) or not isinstance(answer, (int, str)):
+                continue
+            # 每个答案按单任务的规则解析，编号含义与单独提问时一致
+            result = self._parse_evaluation_response(str(answer), sample, task_type)
+            if result['parse_error']:
+                continue
+            result['raw_response'] = response.strip()
+            results[task_type] = result
+        return results
+    
     def print_stats(self):
         """打印统计信息"""
         print("\n" + "="*60)
@@ -615,14 +974,25 @@ Please only answer with the option number (1-6), no explanation needed."""
         print(f"成功请求: {self.stats['successful_requests']}")
         print(f"失败请求: {self.stats['failed_requests']}")
         print(f"成功率: {self.stats['successful_requests']/max(self.stats['total_requests'], 1)*100:.1f}%")
-        print(f"密钥切换次数: {self.stats['key_switches']}")
         print(f"限流命中次数: {self.stats['rate_limit_hits']}")
+        print(f"密钥冷却次数: {self.stats['key_cooldowns']}")
+        print(f"密钥禁用次数: {self.stats['key_disables']}")
+        if self.cache:
+            print(f"缓存命中次数: {self.stats['cache_hits']}")
+        if self.stats['prompt_tokens']:
+            print(f"服务商前缀缓存: {self.stats['cached_prompt_tokens']}/{self.stats['prompt_tokens']} 提示词token "
+                  f"({self.stats['cached_prompt_tokens'] / self.stats['prompt_tokens'] * 100:.1f}%)")
+        if self.stats['single_call_fallbacks']:
+            print(f"合并评测回退为单任务请求: {self.stats['single_call_fallbacks']}次")
         print(f"当前使用模型: {self._get_current_model()}")
         if not self.use_agentworld:
             print(f"当前API密钥: {self.current_key_index + 1}/{len(self.api_keys)}")
-            print(f"密钥利用率: {(self.current_key_index + 1)/len(self.api_keys)*100:.1f}%")
-            print(f"平均每密钥请求数: {self.stats['total_requests']/max(self.stats['key_switches'] + 1, 1):.1f}")
-        print(f"当前延迟设置: {self.rate_limit_delay:.1f}秒")
+            summary = self.key_scheduler.summary(self.key_candidates)
+            print("密钥状态: " + ", ".join(f"{STATE_NAMES[state]} {count}" for state, count in summary.items()))
+        limits = self.rate_limiter.get_limits(self.provider, self._get_current_key(self._get_current_model()))
+        print(f"当前密钥配额: RPM={limits.get('rpm') or '不限'}, TPM={limits.get('tpm') or '不限'}")
+        limiter_stats = self.rate_limiter.stats
+        print(f"限流等待: {limiter_stats['throttled']}/{limiter_stats['requests']} 次请求, 共 {limiter_stats['wait_seconds']:.1f}秒 (进程内所有客户端)")
         
         print(f"\n模型使用统计:")
         for model, count in self.stats['model_usage'].items():
@@ -652,12 +1022,11 @@ Please only answer with the option number (1-6), no explanation needed."""
         except:
             return False
     
-    def _build_chinese_chat_full_prompt(self, sample: Dict, task_type: str) -> str:
-        """构建中文Chat模式全知视角prompt"""
+    def _build_chinese_chat_full_context(self, sample: Dict) -> str:
+        """中文Chat模式全知视角上下文"""
         scenario = sample['scenario_setup']
         dialogue = sample['dialogue_transcript']
         trigger = sample['evaluation_trigger']
-        labels = sample['evaluation_labels']
         
         # 构建对话文本
         dialogue_text = "\n".join([
@@ -665,7 +1034,7 @@ Please only answer with the option number (1-6), no explanation needed."""
             for turn in dialogue
         ])
         
-        base_context = f"""
+        return f"""
 场景描述: {scenario['scenario_description']}
 
 角色设定:
@@ -680,12 +1049,14 @@ Please only answer with the option number (1-6), no explanation needed."""
 
 注意：这是一个包含闲聊内容的对话场景，请注意区分闲聊话题和核心冲突内容，重点分析与社交互动相关的部分。
 """
+    
+    def _build_chinese_chat_full_question(self, sample: Dict, task_type: str) -> str:
+        """中文Chat模式全知视角评测问题"""
+        labels = sample['evaluation_labels']
         
         if task_type == "atmosphere_recognition":
             question = labels['atmosphere_recognition']
-            return f"""{base_context}
-
-问题: {question['question']}
+            return f"""问题: {question['question']}
 
 选项:
 {chr(10).join([f"{i}. {option}" for i, option in enumerate(question['mcq_options'])])}
@@ -694,9 +1065,7 @@ Please only answer with the option number (1-6), no explanation needed."""
 
         elif task_type == "ky_test":
             question = labels['ky_test']
-            return f"""{base_context}
-
-问题: {question['question']}
+            return f"""问题: {question['question']}
 
 选项:
 {chr(10).join([f"{i}. {option}" for i, option in enumerate(question['mcq_options'])])}
@@ -705,21 +1074,18 @@ Please only answer with the option number (1-6), no explanation needed."""
 
         elif task_type == "subtext_deciphering":
             question = labels['subtext_deciphering']
-            return f"""{base_context}
-
-问题: {question['question']}
+            return f"""问题: {question['question']}
 
 选项:
 {chr(10).join([f"{i}. {option}" for i, option in enumerate(question['mcq_options'])])}
 
 请深入分析对话中的潜台词，注意区分闲聊内容和真正的隐含意图。请只回答选项编号(0-{len(question['mcq_options'])-1})。"""
     
-    def _build_english_chat_full_prompt(self, sample: Dict, task_type: str) -> str:
-        """构建英文Chat模式全知视角prompt"""
+    def _build_english_chat_full_context(self, sample: Dict) -> str:
+        """英文Chat模式全知视角上下文"""
         scenario = sample['scenario_setup']
         dialogue = sample['dialogue_transcript']
         trigger = sample['evaluation_trigger']
-        labels = sample['evaluation_labels']
         
         # 构建对话文本
         dialogue_text = "\n".join([
@@ -727,7 +1093,7 @@ Please only answer with the option number (1-6), no explanation needed."""
             for turn in dialogue
         ])
         
-        base_context = f"""
+        return f"""
 Scenario Description: {scenario['scenario_description']}
 
 Character Settings:
@@ -742,12 +1108,14 @@ Key Moment: Turn {trigger['trigger_turn_id']} - {trigger['trigger_description']}
 
 Note: This is a dialogue scenario that includes casual chat content. Please distinguish between casual topics and core conflict content, focusing on analyzing social interaction aspects.
 """
+    
+    def _build_english_chat_full_question(self, sample: Dict, task_type: str) -> str:
+        """英文Chat模式全知视角评测问题"""
+        labels = sample['evaluation_labels']
         
         if task_type == "atmosphere_recognition":
             question = labels['atmosphere_recognition']
-            return f"""{base_context}
-
-Question: {question['question']}
+            return f"""Question: {question['question']}
 
 Options:
 {chr(10).join([f"{i}. {option}" for i, option in enumerate(question['mcq_options'])])}
@@ -756,9 +1124,7 @@ Please carefully analyze the atmospheric changes in the dialogue, paying special
 
         elif task_type == "ky_test":
             question = labels['ky_test']
-            return f"""{base_context}
-
-Question: {question['question']}
+            return f"""Question: {question['question']}
 
 Options:
 {chr(10).join([f"{i}. {option}" for i, option in enumerate(question['mcq_options'])])}
@@ -767,9 +1133,7 @@ Please analyze what would be the most appropriate response in this complex socia
 
         elif task_type == "subtext_deciphering":
             question = labels['subtext_deciphering']
-            return f"""{base_context}
-
-Question: {question['question']}
+            return f"""Question: {question['question']}
 
 Options:
 {chr(10).join([f"{i}. {option}" for i, option in enumerate(question['mcq_options'])])}
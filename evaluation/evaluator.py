@@ -2,27 +2,156 @@
 多线程评测器 - 支持并发评测和结果分析
 """
 import json
+import math
 import time
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 import sys
-from collections import defaultdict
 import pandas as pd
-import csv
 import os
 from datetime import datetime
 
 # 添加主目录到Python路径
 sys.path.append(str(Path(__file__).parent.parent))
 
-from eval_client_bilingual import BilingualEvaluationClient
+from eval_client_bilingual import BilingualEvaluationClient, ContextCache, TASK_TYPES
+from llm_cache import get_llm_cache, MODE_READWRITE, MODE_REPLAY
+from result_writer import ResultWriter, iter_result_rows, iter_raw_spool, assemble_raw_results, trim_partial_results
+from result_aggregator import ResultAggregator
+from dataset_loader import open_dataset
+from analysis_engine import AnalysisEngine, BREAKDOWN_DIMENSIONS, sample_frame
+
+try:
+    # 允许在 config.py 中按模型设置评测并发通道
+    from config import EVAL_LANE_CONFIG
+except ImportError:
+    EVAL_LANE_CONFIG = {}
+
+DEFAULT_LANE_CONFIG = {
+    "models": {},             # 按模型固定通道并发数, 如 {"moonshotai/kimi-k2:free": 2}
+    "expected_latency": 10    # 由配额(RPM)推算通道并发数时假设的单次请求耗时(秒)
+}
+
+# 线程池通道中未完成的评测单元最多为该通道线程数的多少倍(其余单元在处理完成的结果后再提交)
+LANE_WINDOW = 2
+
+
+def write_report(analysis: Dict, output_path: Path):
+    """生成评测报告 evaluation_report.md(单进程评测和分片合并共用)"""
+    report_file = output_path / "evaluation_report.md"
+    
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write("# 模型评测报告\n\n")
+        
+        # 概览
+        summary = analysis['summary']
+        f.write("## 📊 评测概览\n\n")
+        f.write(f"- **数据集总样本数**: {summary['total_samples_in_dataset']}\n")
+        f.write(f"- **成功评测样本数**: {summary['successfully_evaluated_samples']}\n")
+        f.write(f"- **成功任务数**: {summary['successful_tasks']}\n")
+        f.write(f"- **失败任务数**: {summary['failed_tasks']}\n")
+        f.write(f"- **任务成功率**: {summary['success_rate']:.1f}%\n")
+        f.write(f"- **测试模型数**: {summary['models_tested']}\n")
+        f.write(f"- **评测任务类型数**: {summary['tasks_tested']}\n")
+        f.write(f"- **最佳模型**: {summary['best_model']} ({summary['best_model_accuracy']*100:.1f}%)\n")
+        best = analysis.get('significance', {}).get('best_model')
+        if best:
+            verdict = "显著" if best['significant'] else "不显著, 可能只是噪声"
+            f.write(f"- **与第二名 {best['runner_up']} 的差异**: {verdict} (McNemar p={best['mcnemar_p']:.3g})\n")
+        f.write("\n")
+        f.write("**注意**: 以下所有准确率统计均基于成功评测的样本，失败的评测任务不计入统计。\n\n")
+        
+        # 模型表现
+        f.write("## 🤖 模型表现\n\n")
+        f.write("| 模型 | 总体准确率 | 氛围识别 | KY测试 | 潜台词解码 |\n")
+        f.write("|------|------------|----------|--------|----------|\n")
+        
+        for model, stats in analysis['model_performance'].items():
+            f.write(f"| {model} | {stats['accuracy']*100:.1f}% |")
+            
+            for task_type in ['atmosphere_recognition', 'ky_test', 'subtext_deciphering']:
+                if task_type in stats['task_accuracies']:
+                    acc = stats['task_accuracies'][task_type]['accuracy']
+                    f.write(f" {acc*100:.1f}% |")
+                else:
+                    f.write(" N/A |")
+            f.write("\n")
+        
+        f.write("\n")
+        
+        # 任务难度分析
+        f.write("## 📋 任务难度分析\n\n")
+        for task_type, task_stats in analysis['task_performance'].items():
+            f.write(f"### {task_stats['task_name']}\n")
+            f.write(f"- **平均准确率**: {task_stats['average_accuracy']*100:.1f}%\n")
+            f.write(f"- **难度等级**: {task_stats['difficulty_level']}\n")
+            
+            f.write("- **各模型表现**:\n")
+            for model, result in task_stats['model_results'].items():
+                f.write(f"  - {model}: {result['accuracy']*100:.1f}% ({result['correct']}/{result['total']})\n")
+            f.write("\n")
+        
+        # 主题表现分析
+        f.write("## 🎭 主题表现分析\n\n")
+        for theme, theme_stats in analysis['theme_performance'].items():
+            f.write(f"### {theme}\n")
+            f.write(f"- **平均准确率**: {theme_stats['average_accuracy']*100:.1f}%\n")
+            
+            f.write("- **各模型表现**:\n")
+            for model, result in theme_stats['model_accuracies'].items():
+                f.write(f"  - {model}: {result['accuracy']*100:.1f}% ({result['correct']}/{result['total']})\n")
+            f.write("\n")
+        
+        # 按氛围/核心氛围/场景拆分
+        for dimension, models in analysis.get('breakdowns', {}).items():
+            values = list(dict.fromkeys(value for model_values in models.values() for value in model_values))
+            f.write(f"## 🌡️ 按{BREAKDOWN_DIMENSIONS[dimension]}拆分\n\n")
+            f.write(f"| 模型 | " + " | ".join(values) + " |\n")
+            f.write("|------|" + "|".join("------" for _ in values) + "|\n")
+            for model, model_values in models.items():
+                cells = [
+                    f"{model_values[value]['accuracy']*100:.1f}% ({model_values[value]['total']})" if value in model_values else "N/A"
+                    for value in values
+                ]
+                f.write(f"| {model} | " + " | ".join(cells) + " |\n")
+            f.write("\n")
+    
+        # 置信区间与显著性检验
+        significance = analysis.get('significance')
+        if significance and significance['model_intervals']:
+            confidence = significance['config']['confidence']
+            f.write("## 📐 统计显著性\n\n")
+            f.write(f"准确率的 {confidence*100:.0f}% bootstrap 置信区间({significance['config']['bootstrap_resamples']} 次重抽样):\n\n")
+            f.write("| 模型 | 总体准确率 | 氛围识别 | KY测试 | 潜台词解码 |\n")
+            f.write("|------|------------|----------|--------|----------|\n")
+            for model, intervals in significance['model_intervals'].items():
+                cells = [intervals['overall']] + [intervals['tasks'].get(task_type) for task_type in ['atmosphere_recognition', 'ky_test', 'subtext_deciphering']]
+                f.write(f"| {model} | " + " | ".join(
+                    f"{stats['accuracy']*100:.1f}% [{stats['ci_low']*100:.1f}, {stats['ci_high']*100:.1f}]" if stats else "N/A"
+                    for stats in cells
+                ) + " |\n")
+            f.write("\n")
+            
+            if significance['pairwise']:
+                f.write(f"模型两两配对比较(相同 benchmark_id 与任务, 显著性阈值 {significance['config']['alpha']}):\n\n")
+                f.write("| 模型对 | 配对数 | 准确率差 | 置信区间 | McNemar p | 置换检验 p | 结论 |\n")
+                f.write("|--------|--------|----------|----------|-----------|------------|------|\n")
+                for pair, comparison in significance['pairwise'].items():
+                    stats = comparison['overall']
+                    f.write(f"| {pair} | {stats['shared']} | {stats['accuracy_diff']*100:+.1f}% | "
+                            f"[{stats['ci_low']*100:+.1f}, {stats['ci_high']*100:+.1f}] | {stats['mcnemar_p']:.3g} | "
+                            f"{stats['permutation_p']:.3g} | {'显著' if stats['significant'] else '不显著'} |\n")
+                f.write("\n")
+    
+    print(f"📄 评测报告已生成: {report_file}")
+
 
 class MultiThreadEvaluator:
     """多线程评测器"""
     
-    def __init__(self, models: List[str] = None, max_workers: int = 4, use_siliconflow: bool = False, use_agentworld: bool = False, use_yunwu: bool = False, language: str = "zh", evaluation_mode: str = "full"):
+    def __init__(self, models: List[str] = None, max_workers: int = 4, use_siliconflow: bool = False, use_agentworld: bool = False, use_yunwu: bool = False, language: str = "zh", evaluation_mode: str = "full", use_async: bool = False, cache_path: str = None, cache_replay: bool = False, single_call: bool = False, results_format: str = "csv"):
         self.models = models or [
             "moonshotai/kimi-k2:free",
             "z-ai/glm-4.5-air:free"
@@ -34,26 +163,77 @@ class MultiThreadEvaluator:
         self.use_yunwu = use_yunwu
         self.language = language
         self.evaluation_mode = evaluation_mode
+        # 异步模式: 单线程事件循环中同时保持各模型通道的请求在途
+        self.use_async = use_async
+        # 合并模式: 每个 (样本, 模型) 只发一次请求回答全部三个问题
+        self.single_call = single_call
+        
+        # 响应缓存: 所有模型客户端共用一个 SQLite 文件(键中包含模型名)
+        self.cache = None
+        if cache_path:
+            self.cache = get_llm_cache(cache_path, MODE_REPLAY if cache_replay else MODE_READWRITE)
         
         # 为每个模型创建独立的客户端
+        # 渲染后的样本上下文由所有模型客户端共用
+        self.context_cache = ContextCache()
+        
         self.clients = {}
         for model in self.models:
-            self.clients[model] = BilingualEvaluationClient([model], use_siliconflow=use_siliconflow, use_agentworld=use_agentworld, use_yunwu=use_yunwu, language=language, evaluation_mode=evaluation_mode)
+            # 各模型通道互不挤占, 同一服务商的在途上限按所有通道之和放宽
+            self.clients[model] = BilingualEvaluationClient([model], use_siliconflow=use_siliconflow, use_agentworld=use_agentworld, use_yunwu=use_yunwu, language=language, evaluation_mode=evaluation_mode, pool_size=max_workers, max_in_flight=max_workers * len(self.models) if use_async else None, cache=self.cache, context_cache=self.context_cache)
+        
+        # 每个模型一个并发通道, 并发数由该模型所用密钥的配额决定(不超过 max_workers)
+        self.lane_workers = {model: self._lane_limit(model) for model in self.models}
         
-        # CSV文件锁，确保多线程写入安全
-        self.csv_lock = threading.Lock()
+        # 结果文件格式(csv/jsonl/parquet)，由单独的写入线程写出
+        self.results_format = results_format
+        # 每完成多少个任务打印一次实时准确率表
+        self.table_every = 200
         
         print(f"🚀 多线程评测器初始化完成")
         print(f"🎯 评测模型: {', '.join(self.models)}")
-        print(f"🧵 最大线程数: {max_workers}")
+        if use_async:
+            print(f"⚡ 异步模式, 每个模型通道最大在途请求数: {max_workers}")
+        else:
+            print(f"🧵 每个模型通道最大线程数: {max_workers}")
+        print(f"🛣️  模型通道并发: " + ", ".join(f"{model}={workers}" for model, workers in self.lane_workers.items()))
+        if self.cache:
+            print(f"💾 响应缓存: {cache_path} ({'只读重放' if cache_replay else '读写'})")
+        if single_call:
+            print(f"🧩 合并评测: 每个样本一次请求回答全部问题")
+    
+    def _lane_limit(self, model: str) -> int:
+        """
+        模型通道的并发数
+        
+        优先使用 EVAL_LANE_CONFIG 中的固定值；否则按该模型可用密钥的 RPM 配额推算:
+        每秒可发请求数 × 单次请求耗时 = 恰好用满配额所需的在途请求数。
+        多个模型共用同一密钥时，该密钥的配额在这些模型之间平分
+        """
+        config = {**DEFAULT_LANE_CONFIG, **EVAL_LANE_CONFIG}
+        if model in config["models"]:
+            return max(1, config["models"][model])
+        
+        # 每个 (服务商, 密钥) 被多少个模型通道共用
+        sharing = {}
+        for other, other_client in self.clients.items():
+            for candidate in other_client._key_candidates(other):
+                sharing[(candidate["provider"], candidate["key"])] = sharing.get((candidate["provider"], candidate["key"]), 0) + 1
+        
+        client = self.clients[model]
+        total_rpm = 0
+        for candidate in client._key_candidates(model):
+            rpm = client.rate_limiter.get_limits(candidate["provider"], candidate["key"]).get("rpm")
+            if not rpm:
+                # 有密钥不限速, 通道并发只受 max_workers 限制
+                return self.max_workers
+            total_rpm += rpm / sharing[(candidate["provider"], candidate["key"])]
+        return max(1, min(self.max_workers, math.ceil(total_rpm / 60 * config["expected_latency"])))
     
     def load_dataset(self, file_path: str) -> List[Dict]:
-        """加载数据集"""
+        """加载数据集(只建立样本偏移索引, 评测时按需解析单个样本)"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            samples = data.get('samples', [])
+            samples = open_dataset(file_path)
             print(f"📊 加载数据集: {file_path}")
             print(f"📝 样本数量: {len(samples)}")
             
@@ -83,51 +263,228 @@ class MultiThreadEvaluator:
             print(f"❌ 评测失败 {model} - {task_type}: {e}")
             return None
     
-    def init_csv_file(self, output_path: Path) -> str:
-        """初始化CSV文件"""
-        csv_file = output_path / "evaluation_results.csv"
-        
-        # 创建CSV文件头
-        fieldnames = [
-            'timestamp', 'benchmark_id', 'meta_theme', 'model', 'task_type', 
-            'predicted_answer', 'correct_answer', 'is_correct', 
-            'raw_response', 'parse_error'
-        ]
+    async def aevaluate_sample_task(self, sample: Dict, model: str, task_type: str) -> Dict:
+        """评测单个样本的单个任务(异步版本)"""
+        try:
+            client = self.clients[model]
+            result = await client.aevaluate_sample(sample, task_type)
+            
+            if result:
+                result.update({
+                    'model': model,
+                    'task_type': task_type,
+                    'benchmark_id': sample['benchmark_id'],
+                    'meta_theme': sample['meta_theme']
+                })
+            
+            return result
+            
+        except Exception as e:
+            print(f"❌ 评测失败 {model} - {task_type}: {e}")
+            return None
+    
+    def evaluate_sample_all_tasks(self, sample: Dict, model: str, task_types: List[str]) -> Dict[str, Dict]:
+        """一次请求评测单个样本的全部任务(解析失败的任务由客户端回退为单任务请求)"""
+        try:
+            results = self.clients[model].evaluate_sample_all_tasks(sample, task_types)
+        except Exception as e:
+            print(f"❌ 评测失败 {model} - 合并评测: {e}")
+            return {}
         
-        with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
+        for task_type, result in results.items():
+            if result:
+                result.update({
+                    'model': model,
+                    'task_type': task_type,
+                    'benchmark_id': sample['benchmark_id'],
+                    'meta_theme': sample['meta_theme']
+                })
+        return results
+    
+    async def aevaluate_sample_all_tasks(self, sample: Dict, model: str, task_types: List[str]) -> Dict[str, Dict]:
+        """evaluate_sample_all_tasks 的异步版本"""
+        try:
+            results = await self.clients[model].aevaluate_sample_all_tasks(sample, task_types)
+        except Exception as e:
+            print(f"❌ 评测失败 {model} - 合并评测: {e}")
+            return {}
         
-        print(f"📄 CSV结果文件初始化: {csv_file}")
-        return str(csv_file)
+        for task_type, result in results.items():
+            if result:
+                result.update({
+                    'model': model,
+                    'task_type': task_type,
+                    'benchmark_id': sample['benchmark_id'],
+                    'meta_theme': sample['meta_theme']
+                })
+        return results
     
-    def save_result_to_csv(self, result: Dict, csv_file: str):
-        """保存单个结果到CSV文件"""
-        if not result or result.get('parse_error', False):
-            return
-        
-        # 准备CSV行数据
-        row_data = {
-            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
-            'benchmark_id': result.get('benchmark_id', ''),
-            'meta_theme': result.get('meta_theme', ''),
-            'model': result.get('model', ''),
-            'task_type': result.get('task_type', ''),
-            'predicted_answer': result.get('predicted_answer', -1),
-            'correct_answer': result.get('correct_answer', -1),
-            'is_correct': result.get('is_correct', False),
-            'raw_response': result.get('raw_response', '').replace('\n', ' ').replace('\r', ' ')[:200],  # 限制长度
-            'parse_error': result.get('parse_error', False)
+    def _evaluate_unit(self, sample: Dict, model: str, task_types: List[str]) -> Dict[str, Dict]:
+        """执行一个工作单元: 合并模式下一次请求回答全部任务，否则单个任务"""
+        if self.single_call:
+            return self.evaluate_sample_all_tasks(sample, model, task_types)
+        return {task_types[0]: self.evaluate_sample_task(sample, model, task_types[0])}
+    
+    async def _aevaluate_unit(self, sample: Dict, model: str, task_types: List[str]) -> Dict[str, Dict]:
+        """_evaluate_unit 的异步版本"""
+        if self.single_call:
+            return await self.aevaluate_sample_all_tasks(sample, model, task_types)
+        return {task_types[0]: await self.aevaluate_sample_task(sample, model, task_types[0])}
+    
+    def _run_tasks_threaded(self, samples: List[Dict], units: List, handle_result):
+        """
+        每个模型一个线程池通道执行评测单元，按完成顺序对每个任务回调 handle_result(task, result)
+        
+        慢速或被限流的模型只会占满自己的通道，不会挤占其他模型的线程；
+        评测单元只记录样本位置，由工作线程在执行时取出样本。
+        每个通道最多有 LANE_WINDOW 倍线程数的未完成单元，处理完一个才补交一个，
+        已处理的 future(及其结果)随即释放，内存占用与评测单元总数无关
+        """
+        def run_unit(index, model, task_types):
+            return self._evaluate_unit(samples[index], model, task_types)
+        
+        lanes = {model: [] for model in self.models}
+        for unit in units:
+            lanes[unit[1]].append(unit)
+        pending = {model: iter(lane_units) for model, lane_units in lanes.items()}
+        in_flight = {}
+        
+        executors = {
+            model: ThreadPoolExecutor(max_workers=self.lane_workers[model], thread_name_prefix=f"lane-{i}")
+            for i, model in enumerate(self.models)
         }
         
-        # 线程安全地写入CSV
-        with self.csv_lock:
-            with open(csv_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=row_data.keys())
-                writer.writerow(row_data)
+        def submit_next(model):
+            unit = next(pending[model], None)
+            if unit is not None:
+                index, _, task_types = unit
+                in_flight[executors[model].submit(run_unit, index, model, task_types)] = unit
+        
+        try:
+            for model in self.models:
+                for _ in range(LANE_WINDOW * self.lane_workers[model]):
+                    submit_next(model)
+            
+            # 处理完成的评测单元，并从同一通道补交下一个
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, model, task_types = in_flight.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        print(f"❌ 任务执行异常: {e}")
+                        results = {}
+                    for task_type in task_types:
+                        handle_result((index, model, task_type), results.get(task_type))
+                    submit_next(model)
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+    
+    async def _run_tasks_async(self, samples: List[Dict], units: List, handle_result):
+        """
+        事件循环中按模型通道执行评测单元
+        
+        每个模型有 lane_workers[model] 个协程从该模型的队列中取评测单元，
+        各通道独立推进；各服务商的在途上限另由 AsyncSessionPool 的信号量控制
+        """
+        lanes = {model: [] for model in self.models}
+        for unit in units:
+            lanes[unit[1]].append(unit)
+        
+        async def worker(pending):
+            for index, model, task_types in pending:
+                try:
+                    results = await self._aevaluate_unit(samples[index], model, task_types)
+                except Exception as e:
+                    print(f"❌ 任务执行异常: {e}")
+                    results = {}
+                for task_type in task_types:
+                    handle_result((index, model, task_type), results.get(task_type))
+        
+        workers = []
+        for model, lane_units in lanes.items():
+            pending = iter(lane_units)
+            workers.extend(worker(pending) for _ in range(min(self.lane_workers[model], len(lane_units))))
+        
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # 所有客户端共享同一个事件循环的 Session, 关闭一次即可
+            for client in self.clients.values():
+                await client.ahttp.close()
     
-    def evaluate_dataset(self, samples: List[Dict], output_dir: str = None) -> Dict:
-        """评测整个数据集"""
+    def load_previous_results(self, output_path: Path, samples: List[Dict]) -> Dict[Tuple[str, str, str], Dict]:
+        """
+        读取中断前已完成的评测结果(raw_results.jsonl/.json 与 evaluation_results.csv/.jsonl/.parquet)
+        
+        只保留当前样本、当前模型且有有效答案的结果；
+        raw_results 中的 raw_response 未被截断，同一任务优先采用
+        
+        Returns:
+            {(benchmark_id, 模型, 任务类型): 评测结果}，benchmark_id 统一为字符串
+        """
+        # 与续写时相同: 先截掉崩溃时写了一半的末尾行
+        trim_partial_results(output_path)
+        sample_ids = {str(sample['benchmark_id']) for sample in samples}
+        previous = {}
+        
+        def add(result: Dict):
+            key = (str(result.get('benchmark_id')), result.get('model'), result.get('task_type'))
+            if key[0] in sample_ids and key[1] in self.models and key[2] in TASK_TYPES and key not in previous:
+                previous[key] = result
+        
+        for result in iter_raw_spool(output_path):
+            if not result.get('parse_error', False):
+                add(result)
+        
+        raw_results_file = output_path / "raw_results.json"
+        if raw_results_file.exists():
+            try:
+                with open(raw_results_file, 'r', encoding='utf-8') as f:
+                    raw_results = json.load(f)
+                for model_results in raw_results.values():
+                    for task_results in model_results.values():
+                        for result in task_results:
+                            if not result.get('parse_error', False):
+                                add(result)
+            except (json.JSONDecodeError, AttributeError) as e:
+                print(f"⚠️  无法读取 {raw_results_file}: {e}")
+        
+        for row in iter_result_rows(output_path):
+            try:
+                # CSV 中的值都是字符串, JSONL/Parquet 保留原始类型
+                result = {
+                    'predicted_answer': int(row['predicted_answer']),
+                    'correct_answer': int(row['correct_answer']),
+                    'is_correct': row['is_correct'] in (True, 'True'),
+                    'raw_response': row['raw_response'],
+                    'parse_error': row['parse_error'] in (True, 'True'),
+                    'model': row['model'],
+                    'task_type': row['task_type'],
+                    'benchmark_id': row['benchmark_id'],
+                    'meta_theme': row['meta_theme']
+                }
+            except (KeyError, TypeError, ValueError):
+                # 崩溃时写了一半的行
+                continue
+            if not result['parse_error'] and result['predicted_answer'] >= 0:
+                add(result)
+        
+        # benchmark_id 恢复为数据集中的原始类型
+        id_types = {str(sample['benchmark_id']): sample['benchmark_id'] for sample in samples}
+        for (benchmark_id, _, _), result in previous.items():
+            result['benchmark_id'] = id_types[benchmark_id]
+        return previous
+    
+    def evaluate_dataset(self, samples: List[Dict], output_dir: str = None, resume: bool = False) -> Dict:
+        """
+        评测整个数据集
+        
+        resume=True 时读取 output_dir 中已有的结果，跳过已得到有效答案的
+        (样本, 模型, 任务)，只评测剩余部分并与已有结果合并分析
+        """
         # 如果没有指定输出目录，使用时间戳创建
         if output_dir is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -136,81 +493,98 @@ class MultiThreadEvaluator:
         output_path = Path(output_dir)
         output_path.mkdir(exist_ok=True)
         
-        # 准备评测任务
-        tasks = []
-        task_types = ["atmosphere_recognition", "ky_test", "subtext_deciphering"]
+        task_types = list(TASK_TYPES)
+        previous = self.load_previous_results(output_path, samples) if resume else {}
+        if resume:
+            print(f"♻️  续跑: 已完成 {len(previous)} 个任务, 将跳过")
         
-        for sample in samples:
+        # 准备评测单元: 合并模式下每个 (样本, 模型) 一个单元, 否则每个任务一个单元
+        # 单元中只记录样本位置，惰性数据集不会因此把所有样本同时解析到内存
+        units = []
+        for index, sample in enumerate(samples):
             for model in self.models:
-                for task_type in task_types:
-                    tasks.append((sample, model, task_type))
+                remaining = [
+                    task_type for task_type in task_types
+                    if (str(sample['benchmark_id']), model, task_type) not in previous
+                ]
+                if not remaining:
+                    continue
+                if self.single_call:
+                    units.append((index, model, remaining))
+                else:
+                    for task_type in remaining:
+                        units.append((index, model, [task_type]))
         
-        total_tasks = len(tasks)
-        print(f"🎯 总评测任务数: {total_tasks}")
+        total_tasks = sum(len(unit[2]) for unit in units)
+        print(f"🎯 总评测任务数: {total_tasks} (请求单元数: {len(units)})")
         print(f"📊 样本数: {len(samples)} | 模型数: {len(self.models)} | 任务类型数: {len(task_types)}")
         
-        # 初始化CSV文件
-        csv_file = self.init_csv_file(output_path)
+        # 结果写入线程(续跑时在已有结果后追加)
+        writer = ResultWriter(output_path, fmt=self.results_format, append=resume, seed_raw=previous.values())
         
-        # 初始化结果存储
-        results = {model: {task: [] for task in task_types} for model in self.models}
-        completed_tasks = 0
-        failed_tasks = 0
-        successful_tasks = 0  # 新增：成功任务计数
+        # 运行计数(续跑时先计入已完成的结果)，内存中不保留结果本身
+        self.aggregator = ResultAggregator(self.models, task_types)
+        for result in previous.values():
+            self.aggregator.add(result)
+        previous = None
+        progress = {'completed': 0, 'successful': 0, 'failed': 0}
         
         start_time = time.time()
         
-        # 多线程执行评测
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交所有任务
-            future_to_task = {
-                executor.submit(self.evaluate_sample_task, sample, model, task_type): (sample, model, task_type)
-                for sample, model, task_type in tasks
-            }
+        def handle_result(task, result):
+            """处理一个完成的任务(线程池模式在主线程调用, 异步模式在事件循环中调用)"""
+            index, model, task_type = task
+            progress['completed'] += 1
             
-            # 处理完成的任务
-            for future in as_completed(future_to_task):
-                sample, model, task_type = future_to_task[future]
-                completed_tasks += 1
+            if result and not result.get('parse_error', False):
+                # 成功的结果
+                self.aggregator.add(result)
+                progress['successful'] += 1
                 
-                try:
-                    result = future.result()
-                    if result and not result.get('parse_error', False):
-                        # 成功的结果
-                        results[model][task_type].append(result)
-                        successful_tasks += 1
-                        
-                        # 实时保存到CSV
-                        self.save_result_to_csv(result, csv_file)
-                        
-                        if successful_tasks % 10 == 0:
-                            print(f"✅ 已成功评测 {successful_tasks} 个任务，实时保存到CSV")
-                    else:
-                        failed_tasks += 1
-                        
-                except Exception as e:
-                    print(f"❌ 任务执行异常: {e}")
-                    failed_tasks += 1
+                # 交给写入线程实时保存
+                writer.write(result)
                 
-                # 进度显示
-                if completed_tasks % 20 == 0 or completed_tasks == total_tasks:
-                    progress = completed_tasks / total_tasks * 100
-                    elapsed = time.time() - start_time
-                    eta = elapsed / completed_tasks * (total_tasks - completed_tasks) if completed_tasks > 0 else 0
-                    
-                    print(f"📈 进度: {completed_tasks}/{total_tasks} ({progress:.1f}%) "
-                          f"| 成功: {successful_tasks} | 失败: {failed_tasks} "
-                          f"| 耗时: {elapsed:.1f}s | 预计剩余: {eta:.1f}s")
-        
-        # 保存原始结果
-        raw_results_file = output_path / "raw_results.json"
-        with open(raw_results_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+                if progress['successful'] % 10 == 0:
+                    print(f"✅ 已成功评测 {progress['successful']} 个任务，实时保存到结果文件")
+            else:
+                self.aggregator.add_failure()
+                progress['failed'] += 1
+            
+            # 进度显示
+            completed_tasks = progress['completed']
+            if completed_tasks % 20 == 0 or completed_tasks == total_tasks:
+                progress_pct = completed_tasks / total_tasks * 100
+                elapsed = time.time() - start_time
+                eta = elapsed / completed_tasks * (total_tasks - completed_tasks) if completed_tasks > 0 else 0
+                
+                print(f"📈 进度: {completed_tasks}/{total_tasks} ({progress_pct:.1f}%) "
+                      f"| 成功: {progress['successful']} | 失败: {progress['failed']} "
+                      f"| 耗时: {elapsed:.1f}s | 预计剩余: {eta:.1f}s")
+            
+            # 实时准确率表
+            if completed_tasks % self.table_every == 0 and completed_tasks < total_tasks:
+                print(self.aggregator.format_table())
+        
+        try:
+            if not units:
+                print("✅ 所有任务均已完成, 直接汇总已有结果")
+            elif self.use_async:
+                # 异步执行: 数百个在途请求只占用一个线程
+                asyncio.run(self._run_tasks_async(samples, units, handle_result))
+            else:
+                # 多线程执行评测
+                self._run_tasks_threaded(samples, units, handle_result)
+        finally:
+            # 中断时也把已提交的结果写出
+            writer.close()
+        
+        # 保存原始结果(由 raw_results.jsonl 流式组装)
+        raw_results_file = assemble_raw_results(output_path, self.models, task_types)
         
         print(f"💾 原始结果已保存: {raw_results_file}")
         
         # 分析结果 (只统计成功的样本)
-        analysis = self.analyze_results(results, samples, successful_tasks, failed_tasks)
+        analysis = self.analyze_results(self.aggregator, samples, output_path)
         
         # 保存分析结果
         analysis_file = output_path / "evaluation_analysis.json"
@@ -224,214 +598,21 @@ class MultiThreadEvaluator:
         
         return analysis
     
-    def analyze_results(self, results: Dict, samples: List[Dict], successful_tasks: int, failed_tasks: int) -> Dict:
-        """分析评测结果"""
-        analysis = {
-            'summary': {},
-            'model_performance': {},
-            'task_performance': {},
-            'theme_performance': {},
-            'detailed_comparison': {}
-        }
-        
-        task_names = {
-            'atmosphere_recognition': '氛围识别',
-            'ky_test': 'KY测试',
-            'subtext_deciphering': '潜台词解码'
-        }
-        
-        # 分析每个模型的表现
-        for model in self.models:
-            model_stats = {
-                'total_samples': 0,
-                'correct_predictions': 0,
-                'accuracy': 0.0,
-                'task_accuracies': {}
-            }
-            
-            for task_type, task_results in results[model].items():
-                if not task_results:
-                    continue
-                
-                correct = sum(1 for r in task_results if r.get('is_correct', False))
-                total = len(task_results)
-                accuracy = correct / total if total > 0 else 0
-                
-                model_stats['task_accuracies'][task_type] = {
-                    'task_name': task_names.get(task_type, task_type),
-                    'correct': correct,
-                    'total': total,
-                    'accuracy': accuracy
-                }
-                
-                model_stats['total_samples'] += total
-                model_stats['correct_predictions'] += correct
-            
-            if model_stats['total_samples'] > 0:
-                model_stats['accuracy'] = model_stats['correct_predictions'] / model_stats['total_samples']
-            
-            analysis['model_performance'][model] = model_stats
-        
-        # 分析任务难度
-        for task_type in task_names.keys():
-            task_stats = {
-                'task_name': task_names[task_type],
-                'model_results': {},
-                'average_accuracy': 0.0,
-                'difficulty_level': ''
-            }
-            
-            accuracies = []
-            for model in self.models:
-                if task_type in results[model] and results[model][task_type]:
-                    task_results = results[model][task_type]
-                    correct = sum(1 for r in task_results if r.get('is_correct', False))
-                    total = len(task_results)
-                    accuracy = correct / total if total > 0 else 0
-                    
-                    task_stats['model_results'][model] = {
-                        'accuracy': accuracy,
-                        'correct': correct,
-                        'total': total
-                    }
-                    accuracies.append(accuracy)
-            
-            if accuracies:
-                avg_acc = sum(accuracies) / len(accuracies)
-                task_stats['average_accuracy'] = avg_acc
-                
-                # 难度分级
-                if avg_acc >= 0.8:
-                    task_stats['difficulty_level'] = '简单'
-                elif avg_acc >= 0.6:
-                    task_stats['difficulty_level'] = '中等'
-                elif avg_acc >= 0.4:
-                    task_stats['difficulty_level'] = '困难'
-                else:
-                    task_stats['difficulty_level'] = '极困难'
-            
-            analysis['task_performance'][task_type] = task_stats
-        
-        # 分析主题表现
-        theme_stats = defaultdict(lambda: defaultdict(list))
-        
-        for model in self.models:
-            for task_type, task_results in results[model].items():
-                for result in task_results:
-                    theme = result.get('meta_theme', '未知')
-                    is_correct = result.get('is_correct', False)
-                    theme_stats[theme][model].append(is_correct)
-        
-        for theme, model_data in theme_stats.items():
-            theme_analysis = {
-                'theme_name': theme,
-                'model_accuracies': {},
-                'average_accuracy': 0.0
-            }
-            
-            accuracies = []
-            for model, correct_list in model_data.items():
-                if correct_list:
-                    accuracy = sum(correct_list) / len(correct_list)
-                    theme_analysis['model_accuracies'][model] = {
-                        'accuracy': accuracy,
-                        'correct': sum(correct_list),
-                        'total': len(correct_list)
-                    }
-                    accuracies.append(accuracy)
-            
-            if accuracies:
-                theme_analysis['average_accuracy'] = sum(accuracies) / len(accuracies)
-            
-            analysis['theme_performance'][theme] = theme_analysis
-        
-        # 计算成功评测的样本数 (只统计成功的样本)
-        successfully_evaluated_samples = set()
-        for model_results in results.values():
-            for task_results in model_results.values():
-                for result in task_results:
-                    if result.get('is_correct') is not None:  # 有效结果
-                        successfully_evaluated_samples.add(result.get('benchmark_id'))
-        
-        best_model = max(analysis['model_performance'].items(), 
-                        key=lambda x: x[1]['accuracy']) if analysis['model_performance'] else None
-        
-        analysis['summary'] = {
-            'total_samples_in_dataset': len(samples),
-            'successfully_evaluated_samples': len(successfully_evaluated_samples),
-            'successful_tasks': successful_tasks,
-            'failed_tasks': failed_tasks,
-            'success_rate': successful_tasks / (successful_tasks + failed_tasks) * 100 if (successful_tasks + failed_tasks) > 0 else 0,
-            'models_tested': len(self.models),
-            'tasks_tested': len(task_names),
-            'best_model': best_model[0] if best_model else None,
-            'best_model_accuracy': best_model[1]['accuracy'] if best_model else 0.0
-        }
-        
-        return analysis
+    def analyze_results(self, aggregator: ResultAggregator, samples: List[Dict], output_path: Path = None) -> Dict:
+        """
+        分析评测结果
+        
+        有结果目录时由列式分析引擎读取逐条结果文件并关联样本的氛围/场景属性，
+        另外给出按氛围、核心氛围、场景拆分的准确率；失败任务数取自运行计数
+        """
+        if output_path is None:
+            return aggregator.analysis(len(samples))
+        engine = AnalysisEngine.from_output([output_path], sample_frame(samples), models=self.models)
+        return engine.analysis(len(samples), failed_tasks=aggregator.failed)
     
     def generate_report(self, analysis: Dict, output_path: Path):
         """生成评测报告"""
-        report_file = output_path / "evaluation_report.md"
-        
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write("# 模型评测报告\n\n")
-            
-            # 概览
-            summary = analysis['summary']
-            f.write("## 📊 评测概览\n\n")
-            f.write(f"- **数据集总样本数**: {summary['total_samples_in_dataset']}\n")
-            f.write(f"- **成功评测样本数**: {summary['successfully_evaluated_samples']}\n")
-            f.write(f"- **成功任务数**: {summary['successful_tasks']}\n")
-            f.write(f"- **失败任务数**: {summary['failed_tasks']}\n")
-            f.write(f"- **任务成功率**: {summary['success_rate']:.1f}%\n")
-            f.write(f"- **测试模型数**: {summary['models_tested']}\n")
-            f.write(f"- **评测任务类型数**: {summary['tasks_tested']}\n")
-            f.write(f"- **最佳模型**: {summary['best_model']} ({summary['best_model_accuracy']*100:.1f}%)\n\n")
-            f.write("**注意**: 以下所有准确率统计均基于成功评测的样本，失败的评测任务不计入统计。\n\n")
-            
-            # 模型表现
-            f.write("## 🤖 模型表现\n\n")
-            f.write("| 模型 | 总体准确率 | 氛围识别 | KY测试 | 潜台词解码 |\n")
-            f.write("|------|------------|----------|--------|----------|\n")
-            
-            for model, stats in analysis['model_performance'].items():
-                f.write(f"| {model} | {stats['accuracy']*100:.1f}% |")
-                
-                for task_type in ['atmosphere_recognition', 'ky_test', 'subtext_deciphering']:
-                    if task_type in stats['task_accuracies']:
-                        acc = stats['task_accuracies'][task_type]['accuracy']
-                        f.write(f" {acc*100:.1f}% |")
-                    else:
-                        f.write(" N/A |")
-                f.write("\n")
-            
-            f.write("\n")
-            
-            # 任务难度分析
-            f.write("## 📋 任务难度分析\n\n")
-            for task_type, task_stats in analysis['task_performance'].items():
-                f.write(f"### {task_stats['task_name']}\n")
-                f.write(f"- **平均准确率**: {task_stats['average_accuracy']*100:.1f}%\n")
-                f.write(f"- **难度等级**: {task_stats['difficulty_level']}\n")
-                
-                f.write("- **各模型表现**:\n")
-                for model, result in task_stats['model_results'].items():
-                    f.write(f"  - {model}: {result['accuracy']*100:.1f}% ({result['correct']}/{result['total']})\n")
-                f.write("\n")
-            
-            # 主题表现分析
-            f.write("## 🎭 主题表现分析\n\n")
-            for theme, theme_stats in analysis['theme_performance'].items():
-                f.write(f"### {theme}\n")
-                f.write(f"- **平均准确率**: {theme_stats['average_accuracy']*100:.1f}%\n")
-                
-                f.write("- **各模型表现**:\n")
-                for model, result in theme_stats['model_accuracies'].items():
-                    f.write(f"  - {model}: {result['accuracy']*100:.1f}% ({result['correct']}/{result['total']})\n")
-                f.write("\n")
-        
-        print(f"📄 评测报告已生成: {report_file}")
+        write_report(analysis, output_path)
     
     def print_summary(self, analysis: Dict):
         """打印评测摘要"""
@@ -471,13 +652,31 @@ def main():
     parser.add_argument("--models", nargs="+", 
                        default=["moonshotai/kimi-k2:free", "z-ai/glm-4.5-air:free"],
                        help="要评测的模型列表")
-    parser.add_argument("--workers", type=int, default=4, help="最大线程数")
+    parser.add_argument("--workers", type=int, default=4, help="每个模型通道的最大线程数(--async 时为最大在途请求数), 实际并发另受该模型的配额限制")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                       help="使用 asyncio 客户端, 单线程保持 --workers 个在途请求 (需要 aiohttp)")
     parser.add_argument("--output", default=None, help="结果输出目录(默认使用时间戳)")
+    parser.add_argument("--resume", action="store_true",
+                       help="从 --output 目录中已有的结果续跑, 跳过已得到有效答案的任务")
+    parser.add_argument("--results-format", choices=["csv", "jsonl", "parquet"], default="csv",
+                       help="逐条结果文件格式 (parquet 需要 pyarrow, 运行结束时才生成完整文件)")
+    parser.add_argument("--single-call", action="store_true",
+                       help="每个样本一次请求回答全部三个问题(解析失败时回退为逐题请求)")
+    parser.add_argument("--cache", default=None, help="LLM 响应缓存文件(SQLite), 重跑时相同请求直接读取缓存")
+    parser.add_argument("--cache-replay", action="store_true",
+                       help="只读重放缓存: 未命中的请求直接判为失败, 不调用 API")
+    parser.add_argument("--shards", type=int, default=1,
+                       help="按 benchmark_id 哈希分给多少个进程评测, 完成后合并结果 (各进程平分密钥配额)")
     
     args = parser.parse_args()
     
+    if args.resume and args.output is None:
+        print("❌ 续跑需要通过 --output 指定中断前的结果目录")
+        return
+    
     # 创建评测器
-    evaluator = MultiThreadEvaluator(models=args.models, max_workers=args.workers)
+    evaluator_kwargs = dict(models=args.models, max_workers=args.workers, use_async=args.use_async, cache_path=args.cache, cache_replay=args.cache_replay, single_call=args.single_call, results_format=args.results_format)
+    evaluator = MultiThreadEvaluator(**evaluator_kwargs)
     
     # 加载数据集
     samples = evaluator.load_dataset(args.data)
@@ -487,7 +686,13 @@ def main():
     
     # 执行评测
     print(f"\n🚀 开始评测...")
-    analysis = evaluator.evaluate_dataset(samples, args.output)
+    if args.shards > 1:
+        from sharding import run_sharded
+        output_dir = args.output or f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        analysis = run_sharded(samples, args.shards, output_dir, evaluator_kwargs, resume=args.resume)
+        evaluator.print_summary(analysis)
+        return
+    analysis = evaluator.evaluate_dataset(samples, args.output, resume=args.resume)
     
     # 打印摘要
     evaluator.print_summary(analysis)
@@ -496,6 +701,9 @@ def main():
     for model, client in evaluator.clients.items():
         print(f"\n{model} 客户端统计:")
         client.print_stats()
+    if evaluator.cache:
+        evaluator.cache.print_stats()
+    evaluator.context_cache.print_stats()
 
 if __name__ == "__main__":
     main()
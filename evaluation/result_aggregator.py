@@ -0,0 +1,196 @@
+"""
+评测结果流式聚合 - 每完成一个任务就更新 (模型, 任务, 主题) 的正确数/总数
+运行中随时可以查看实时准确率表，结束时直接由计数器生成分析结果，
+内存中不再保留每条结果和原始响应
+"""
+import threading
+from typing import Dict, List, Any, Optional
+
+TASK_NAMES = {
+    'atmosphere_recognition': '氛围识别',
+    'ky_test': 'KY测试',
+    'subtext_deciphering': '潜台词解码'
+}
+
+
+def difficulty_level(accuracy: float) -> str:
+    """按平均准确率划分任务难度"""
+    if accuracy >= 0.8:
+        return '简单'
+    elif accuracy >= 0.6:
+        return '中等'
+    elif accuracy >= 0.4:
+        return '困难'
+    return '极困难'
+
+
+class ResultAggregator:
+    """按 (模型, 任务, 主题) 维护运行计数(线程安全)"""
+    
+    def __init__(self, models: List[str], task_types: List[str]):
+        self.models = list(models)
+        self.task_types = list(task_types)
+        
+        # (模型, 任务, 主题) -> [正确数, 总数]，主题按首次出现的顺序排列
+        self.counts: Dict[tuple, List[int]] = {}
+        self.themes: Dict[str, None] = {}
+        # 至少有一个有效结果的样本
+        self.evaluated_samples = set()
+        self.successful = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+    
+    def add(self, result: Dict[str, Any]):
+        """计入一条有效结果"""
+        theme = result.get('meta_theme', '未知')
+        key = (result['model'], result['task_type'], theme)
+        with self.lock:
+            counts = self.counts.setdefault(key, [0, 0])
+            counts[0] += 1 if result.get('is_correct', False) else 0
+            counts[1] += 1
+            self.themes.setdefault(theme, None)
+            if result.get('is_correct') is not None:
+                self.evaluated_samples.add(result.get('benchmark_id'))
+            self.successful += 1
+    
+    def add_failure(self):
+        """计入一个失败的任务"""
+        with self.lock:
+            self.failed += 1
+    
+    def _sum(self, model: Optional[str] = None, task_type: Optional[str] = None, theme: Optional[str] = None) -> List[int]:
+        """按维度汇总 [正确数, 总数](调用方持有锁)"""
+        correct = total = 0
+        for (m, t, th), (c, n) in self.counts.items():
+            if (model is None or m == model) and (task_type is None or t == task_type) and (theme is None or th == theme):
+                correct += c
+                total += n
+        return [correct, total]
+    
+    def accuracy_table(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """实时准确率表: {模型: {任务: {correct, total, accuracy}}}"""
+        with self.lock:
+            table = {}
+            for model in self.models:
+                table[model] = {}
+                for task_type in self.task_types:
+                    correct, total = self._sum(model, task_type)
+                    table[model][task_type] = {
+                        'correct': correct,
+                        'total': total,
+                        'accuracy': correct / total if total > 0 else 0.0
+                    }
+            return table
+    
+    def format_table(self) -> str:
+        """实时准确率表的文本形式"""
+        table = self.accuracy_table()
+        header = f"{'模型':<30}" + "".join(f"{TASK_NAMES.get(t, t):>14}" for t in self.task_types)
+        lines = [header]
+        for model, tasks in table.items():
+            cells = "".join(
+                f"{stats['accuracy']:>8.1%} ({stats['total']:>4})" if stats['total'] else f"{'-':>14}"
+                for stats in tasks.values()
+            )
+            lines.append(f"{model:<30}{cells}")
+        return "\n".join(lines)
+    
+    def analysis(self, total_samples: int) -> Dict[str, Any]:
+        """由计数器生成与原 analyze_results 相同结构的分析结果"""
+        analysis = {
+            'summary': {},
+            'model_performance': {},
+            'task_performance': {},
+            'theme_performance': {},
+            'detailed_comparison': {}
+        }
+        
+        with self.lock:
+            # 分析每个模型的表现
+            for model in self.models:
+                model_stats = {
+                    'total_samples': 0,
+                    'correct_predictions': 0,
+                    'accuracy': 0.0,
+                    'task_accuracies': {}
+                }
+                for task_type in self.task_types:
+                    correct, total = self._sum(model, task_type)
+                    if not total:
+                        continue
+                    model_stats['task_accuracies'][task_type] = {
+                        'task_name': TASK_NAMES.get(task_type, task_type),
+                        'correct': correct,
+                        'total': total,
+                        'accuracy': correct / total
+                    }
+                    model_stats['total_samples'] += total
+                    model_stats['correct_predictions'] += correct
+                if model_stats['total_samples'] > 0:
+                    model_stats['accuracy'] = model_stats['correct_predictions'] / model_stats['total_samples']
+                analysis['model_performance'][model] = model_stats
+            
+            # 分析任务难度
+            for task_type, task_name in TASK_NAMES.items():
+                task_stats = {
+                    'task_name': task_name,
+                    'model_results': {},
+                    'average_accuracy': 0.0,
+                    'difficulty_level': ''
+                }
+                accuracies = []
+                for model in self.models:
+                    correct, total = self._sum(model, task_type)
+                    if not total:
+                        continue
+                    task_stats['model_results'][model] = {
+                        'accuracy': correct / total,
+                        'correct': correct,
+                        'total': total
+                    }
+                    accuracies.append(correct / total)
+                if accuracies:
+                    task_stats['average_accuracy'] = sum(accuracies) / len(accuracies)
+                    task_stats['difficulty_level'] = difficulty_level(task_stats['average_accuracy'])
+                analysis['task_performance'][task_type] = task_stats
+            
+            # 分析主题表现
+            for theme in self.themes:
+                theme_analysis = {
+                    'theme_name': theme,
+                    'model_accuracies': {},
+                    'average_accuracy': 0.0
+                }
+                accuracies = []
+                for model in self.models:
+                    correct, total = self._sum(model, theme=theme)
+                    if not total:
+                        continue
+                    theme_analysis['model_accuracies'][model] = {
+                        'accuracy': correct / total,
+                        'correct': correct,
+                        'total': total
+                    }
+                    accuracies.append(correct / total)
+                if accuracies:
+                    theme_analysis['average_accuracy'] = sum(accuracies) / len(accuracies)
+                analysis['theme_performance'][theme] = theme_analysis
+            
+            successful, failed = self.successful, self.failed
+            evaluated_samples = len(self.evaluated_samples)
+        
+        best_model = max(analysis['model_performance'].items(),
+                         key=lambda x: x[1]['accuracy']) if analysis['model_performance'] else None
+        
+        analysis['summary'] = {
+            'total_samples_in_dataset': total_samples,
+            'successfully_evaluated_samples': evaluated_samples,
+            'successful_tasks': successful,
+            'failed_tasks': failed,
+            'success_rate': successful / (successful + failed) * 100 if (successful + failed) > 0 else 0,
+            'models_tested': len(self.models),
+            'tasks_tested': len(TASK_NAMES),
+            'best_model': best_model[0] if best_model else None,
+            'best_model_accuracy': best_model[1]['accuracy'] if best_model else 0.0
+        }
+        return analysis
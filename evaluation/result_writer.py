@@ -0,0 +1,274 @@
+"""
+评测结果写入线程 - 评测线程/事件循环只把结果放入队列，
+由单独的写入线程持有一个打开的文件句柄，按条数或时间阈值批量写出
+支持 CSV / JSONL / Parquet(需要 pyarrow)
+
+完整的结果(含未截断的原始响应)同时追加到 raw_results.jsonl，
+运行结束后由 assemble_raw_results 流式组装为 raw_results.json，内存中不保留结果
+"""
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+sys.path.append(str(Path(__file__).parent.parent / "data_generator"))
+from dataset_writer import truncate_partial_tail
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+RESULT_FIELDS = [
+    'timestamp', 'benchmark_id', 'meta_theme', 'model', 'task_type',
+    'predicted_answer', 'correct_answer', 'is_correct',
+    'raw_response', 'parse_error'
+]
+
+RESULT_FILES = {
+    "csv": "evaluation_results.csv",
+    "jsonl": "evaluation_results.jsonl",
+    "parquet": "evaluation_results.parquet"
+}
+
+RAW_SPOOL = "raw_results.jsonl"
+
+# 结束写入线程的哨兵
+_CLOSE = object()
+
+
+def result_row(result: Dict[str, Any], truncate: Optional[int] = 200) -> Dict[str, Any]:
+    """把评测结果整理为一行(CSV 中的原始响应压成单行并截断)"""
+    raw_response = result.get('raw_response', '')
+    if truncate is not None:
+        raw_response = raw_response.replace('\n', ' ').replace('\r', ' ')[:truncate]
+    return {
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'benchmark_id': result.get('benchmark_id', ''),
+        'meta_theme': result.get('meta_theme', ''),
+        'model': result.get('model', ''),
+        'task_type': result.get('task_type', ''),
+        'predicted_answer': result.get('predicted_answer', -1),
+        'correct_answer': result.get('correct_answer', -1),
+        'is_correct': result.get('is_correct', False),
+        'raw_response': raw_response,
+        'parse_error': result.get('parse_error', False)
+    }
+
+
+def trim_partial_results(output_path: Path):
+    """
+    截掉结果文件(CSV/JSONL)和 raw_results.jsonl 中崩溃时写了一半的末尾行
+    
+    续跑时在读取已有结果和追加写入之前调用，新写入的第一行不会接在残行后面
+    """
+    output_path = Path(output_path)
+    for name in (RESULT_FILES["csv"], RESULT_FILES["jsonl"], RAW_SPOOL):
+        path = output_path / name
+        if path.exists():
+            truncate_partial_tail(path)
+
+
+def iter_raw_spool(output_path: Path) -> Iterator[Dict[str, Any]]:
+    """逐条读取 raw_results.jsonl 中的完整结果，跳过崩溃时写了一半的行"""
+    spool_file = Path(output_path) / RAW_SPOOL
+    if not spool_file.exists():
+        return
+    with open(spool_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def assemble_raw_results(output_path: Path, models: List[str], task_types: List[str]) -> Path:
+    """
+    将 raw_results.jsonl 组装为 {模型: {任务: [结果, ...]}} 结构的 raw_results.json
+    
+    每个 (模型, 任务) 流式扫描一遍 spool 文件，内存占用与结果数量无关
+    """
+    output_path = Path(output_path)
+    raw_results_file = output_path / "raw_results.json"
+    tmp_file = raw_results_file.with_name(raw_results_file.name + ".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write("{")
+        for i, model in enumerate(models):
+            f.write(f'{"," if i else ""}\n  {json.dumps(model, ensure_ascii=False)}: {{')
+            for j, task_type in enumerate(task_types):
+                f.write(f'{"," if j else ""}\n    {json.dumps(task_type)}: [')
+                first = True
+                for result in iter_raw_spool(output_path):
+                    if result.get('model') == model and result.get('task_type') == task_type:
+                        f.write(f'{"" if first else ","}\n      {json.dumps(result, ensure_ascii=False)}')
+                        first = False
+                f.write("]" if first else "\n    ]")
+            f.write("\n  }")
+        f.write("\n}\n")
+    tmp_file.replace(raw_results_file)
+    return raw_results_file
+
+
+def iter_result_rows(output_path: Path) -> Iterator[Dict[str, Any]]:
+    """读取结果目录中已写出的所有结果行(CSV / JSONL / Parquet)，跳过崩溃时写了一半的行"""
+    csv_file = output_path / RESULT_FILES["csv"]
+    if csv_file.exists():
+        with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    
+    jsonl_file = output_path / RESULT_FILES["jsonl"]
+    if jsonl_file.exists():
+        with open(jsonl_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    
+    parquet_file = output_path / RESULT_FILES["parquet"]
+    if parquet_file.exists() and pq is not None:
+        yield from pq.read_table(parquet_file).to_pylist()
+
+
+class ResultWriter:
+    """
+    单句柄结果写入器
+    
+    write() 只做一次入队，不接触磁盘；写入线程攒满 flush_every 条
+    或距上次刷新超过 flush_interval 秒时批量写出并 flush
+    """
+    
+    def __init__(
+        self,
+        output_path: Path,
+        fmt: str = "csv",
+        append: bool = False,
+        flush_every: int = 50,
+        flush_interval: float = 2.0,
+        seed_raw: Iterable[Dict[str, Any]] = ()
+    ):
+        """
+        Args:
+            output_path: 结果目录
+            fmt: 文件格式 csv / jsonl / parquet
+            append: 是否在已有结果文件后追加(续跑)
+            flush_every: 每攒多少条结果写出一次
+            flush_interval: 距上次写出超过多少秒时写出
+            seed_raw: 续跑时 raw_results.jsonl 尚不存在(旧版本的输出)，先写入这些已完成的结果
+        """
+        if fmt not in RESULT_FILES:
+            raise ValueError(f"不支持的结果格式: {fmt}")
+        if fmt == "parquet" and pq is None:
+            raise RuntimeError("Parquet 结果文件需要 pyarrow，请先执行 pip install pyarrow")
+        
+        self.fmt = fmt
+        self.path = Path(output_path) / RESULT_FILES[fmt]
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        
+        self.queue = queue.Queue()
+        self.buffer: List[Dict[str, Any]] = []
+        self.written = 0
+        self.last_flush = time.time()
+        
+        if append:
+            trim_partial_results(output_path)
+        spool_path = Path(output_path) / RAW_SPOOL
+        spool_exists = append and spool_path.exists()
+        self.spool = open(spool_path, 'a' if spool_exists else 'w', encoding='utf-8')
+        if not spool_exists:
+            for result in seed_raw:
+                self.spool.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.spool.flush()
+        
+        # CSV 只有写了一半的表头时截掉后为空文件，需要重新写表头
+        append = append and self.path.exists() and self.path.stat().st_size > 0
+        self._open(append)
+        self.thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self.thread.start()
+        print(f"📄 结果文件{'续写' if append else '初始化'}: {self.path}")
+    
+    def _open(self, append: bool):
+        """打开结果文件(整个运行期间只打开一次)"""
+        if self.fmt == "csv":
+            self.file = open(self.path, 'a' if append else 'w', newline='', encoding='utf-8')
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            if not append:
+                self.csv_writer.writeheader()
+                self.file.flush()
+        elif self.fmt == "jsonl":
+            self.file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+        else:
+            # Parquet 文件无法追加: 续跑时先把已有结果读出，作为新文件的第一个行组写回
+            existing = pq.read_table(self.path) if append else None
+            self.schema = existing.schema if existing is not None else pa.schema([
+                ('timestamp', pa.string()), ('benchmark_id', pa.string()), ('meta_theme', pa.string()),
+                ('model', pa.string()), ('task_type', pa.string()), ('predicted_answer', pa.int64()),
+                ('correct_answer', pa.int64()), ('is_correct', pa.bool_()),
+                ('raw_response', pa.string()), ('parse_error', pa.bool_())
+            ])
+            self.file = pq.ParquetWriter(str(self.path) + ".tmp", self.schema)
+            if existing is not None:
+                self.file.write_table(existing)
+    
+    def write(self, result: Dict[str, Any]):
+        """提交一条结果(不阻塞在磁盘上)"""
+        # 在提交时整理成行，时间戳记录结果完成的时刻而不是写出的时刻
+        self.queue.put((result_row(result, truncate=200 if self.fmt == "csv" else None), result))
+    
+    def _run(self):
+        """写入线程: 从队列取结果，按阈值批量写出"""
+        while True:
+            timeout = max(0.0, self.last_flush + self.flush_interval - time.time())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            
+            if item is _CLOSE:
+                self._flush()
+                return
+            if item is not None:
+                self.buffer.append(item)
+            if len(self.buffer) >= self.flush_every or time.time() - self.last_flush >= self.flush_interval:
+                self._flush()
+    
+    def _flush(self):
+        """把缓冲的结果写入文件"""
+        if self.buffer:
+            try:
+                rows = [row for row, _ in self.buffer]
+                if self.fmt == "csv":
+                    self.csv_writer.writerows(rows)
+                    self.file.flush()
+                elif self.fmt == "jsonl":
+                    self.file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+                    self.file.flush()
+                else:
+                    rows = [{**row, 'benchmark_id': str(row['benchmark_id'])} for row in rows]
+                    self.file.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+                self.spool.write("".join(json.dumps(result, ensure_ascii=False) + "\n" for _, result in self.buffer))
+                self.spool.flush()
+                self.written += len(self.buffer)
+            except Exception as e:
+                print(f"❌ 写入结果文件失败: {e}")
+            self.buffer = []
+        self.last_flush = time.time()
+    
+    def close(self):
+        """写出剩余结果并关闭文件"""
+        if not self.thread.is_alive():
+            return
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        self.file.close()
+        self.spool.close()
+        if self.fmt == "parquet":
+            Path(str(self.path) + ".tmp").replace(self.path)
+        print(f"💾 结果文件已写入 {self.written} 条: {self.path}")
@@ -29,12 +29,25 @@ def main():
                        help="数据语言: zh (中文) 或 en (英文)")
     parser.add_argument("--mode", choices=["full", "limited", "chat"], default="full",
                        help="评估模式: full (全知视角，包含隐藏动机), limited (有限信息，仅基本身份), 或 chat (闲聊模式，包含干扰话题)")
-    parser.add_argument("--workers", type=int, default=4, help="最大线程数")
+    parser.add_argument("--workers", type=int, default=4, help="每个模型通道的最大线程数(--async 时为最大在途请求数), 实际并发另受该模型的配额限制")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                       help="使用 asyncio 客户端, 单线程保持 --workers 个在途请求 (需要 aiohttp)")
     parser.add_argument("--limit", type=int, default=None, 
                        help="限制评测的样本数量 (例如: --limit 500 只评测前500条)")
     parser.add_argument("--start", type=int, default=1, 
                        help="从第几个样本开始评测 (例如: --start 18 从第18个样本开始)")
     parser.add_argument("--output", default=None, help="结果输出目录(默认使用时间戳)")
+    parser.add_argument("--resume", action="store_true",
+                       help="从 --output 目录中已有的结果续跑, 跳过已得到有效答案的 (样本, 模型, 任务)")
+    parser.add_argument("--results-format", choices=["csv", "jsonl", "parquet"], default="csv",
+                       help="逐条结果文件格式 (parquet 需要 pyarrow, 运行结束时才生成完整文件)")
+    parser.add_argument("--single-call", action="store_true",
+                       help="每个样本一次请求回答全部三个问题, 请求数和输入token约减少为1/3 (解析失败时回退为逐题请求)")
+    parser.add_argument("--cache", default=None, help="LLM 响应缓存文件(SQLite), 重跑时相同请求直接读取缓存")
+    parser.add_argument("--cache-replay", action="store_true",
+                       help="只读重放缓存: 未命中的请求直接判为失败, 不调用 API")
+    parser.add_argument("--shards", type=int, default=1,
+                       help="按 benchmark_id 哈希分给多少个进程评测, 完成后合并结果 (各进程平分密钥配额)")
     
     args = parser.parse_args()
     
@@ -53,6 +66,10 @@ def main():
     use_agentworld = args.platform == "agentworld"
     use_yunwu = args.platform == "yunwu"
     
+    if args.resume and not args.output:
+        print("❌ 续跑需要通过 --output 指定中断前的结果目录")
+        return
+    
     # 使用时间戳创建唯一的结果目录
     if args.output:
         output_dir = args.output
@@ -66,11 +83,20 @@ def main():
     print(f"🌐 API平台: {platform_name}")
     print(f"🌍 数据语言: {'中文' if language == 'zh' else '英文'}")
     print(f"🔍 评估模式: {'全知视角' if evaluation_mode == 'full' else '有限信息'}")
-    print(f"🧵 线程数: {max_workers}")
+    if args.use_async:
+        print(f"⚡ 异步模式, 在途请求数: {max_workers}")
+    else:
+        print(f"🧵 线程数: {max_workers}")
     print(f"🎯 开始样本: 第{start_sample}个")
     if sample_limit:
         print(f"📋 样本限制: 最多{sample_limit}条")
     print(f"📁 输出目录: {output_dir}")
+    if args.resume:
+        print(f"♻️  续跑模式: 跳过 {output_dir} 中已完成的任务")
+    if args.cache:
+        print(f"💾 响应缓存: {args.cache} ({'只读重放' if args.cache_replay else '读写'})")
+    if args.shards > 1:
+        print(f"🧩 分片评测: {args.shards} 个进程")
     
     # 检查数据文件
     if not Path(data_file).exists():
@@ -78,7 +104,8 @@ def main():
         return
     
     # 创建评测器
-    evaluator = MultiThreadEvaluator(models=models, max_workers=max_workers, use_siliconflow=use_siliconflow, use_agentworld=use_agentworld, use_yunwu=use_yunwu, language=language, evaluation_mode=evaluation_mode)
+    evaluator_kwargs = dict(models=models, max_workers=max_workers, use_siliconflow=use_siliconflow, use_agentworld=use_agentworld, use_yunwu=use_yunwu, language=language, evaluation_mode=evaluation_mode, use_async=args.use_async, cache_path=args.cache, cache_replay=args.cache_replay, single_call=args.single_call, results_format=args.results_format)
+    evaluator = MultiThreadEvaluator(**evaluator_kwargs)
     
     # 加载数据集
     samples = evaluator.load_dataset(data_file)
@@ -111,6 +138,8 @@ def main():
     # 确认开始评测
     print(f"\n准备评测 {len(samples)} 个样本...")
     print(f"预计总任务数: {len(samples) * len(models) * 3}")
+    if args.single_call:
+        print(f"预计请求数: {len(samples) * len(models)} (合并评测, 不含回退请求)")
     
     response = input("是否开始评测? (y/N): ")
     if response.lower() != 'y':
@@ -122,14 +151,24 @@ def main():
         print(f"\n🚀 开始评测...")
         # 运行评测
         try:
-            evaluator.evaluate_dataset(
-                samples=samples,
-                output_dir=output_dir
-            )
-            # 打印客户端统计
-            for model, client in evaluator.clients.items():
-                print(f"\n{model} 客户端统计:")
-                client.print_stats()
+            if args.shards > 1:
+                # 各分片进程有自己的客户端, 完成后合并为同样的结果文件
+                from sharding import run_sharded
+                analysis = run_sharded(samples, args.shards, output_dir, evaluator_kwargs, resume=args.resume)
+                evaluator.print_summary(analysis)
+            else:
+                evaluator.evaluate_dataset(
+                    samples=samples,
+                    output_dir=output_dir,
+                    resume=args.resume
+                )
+                # 打印客户端统计
+                for model, client in evaluator.clients.items():
+                    print(f"\n{model} 客户端统计:")
+                    client.print_stats()
+                if evaluator.cache:
+                    evaluator.cache.print_stats()
+                evaluator.context_cache.print_stats()
         except Exception as e:
             print(f"\n❌ 评测过程中出错: {e}")
             import traceback
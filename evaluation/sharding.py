@@ -0,0 +1,218 @@
+"""
+分片评测 - 按 benchmark_id 的哈希把数据集分给多个进程
+每个进程有独立的客户端、GIL 和结果目录(shard_00, shard_01, ...)，
+全部完成后合并为与单进程评测相同的 raw_results.json / evaluation_analysis.json / evaluation_report.md
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import shutil
+import zlib
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from evaluator import MultiThreadEvaluator, write_report
+from eval_client_bilingual import TASK_TYPES
+from result_writer import RESULT_FIELDS, RESULT_FILES, RAW_SPOOL, iter_raw_spool, assemble_raw_results, pa, pq
+from analysis_engine import AnalysisEngine, merge_breakdowns
+from rate_limiter import get_rate_limiter
+from dataset_loader import LazySampleList
+
+SHARD_PREFIX = "shard_"
+# 结果目录中记录分片数的文件(续跑时分片数必须相同，合并时只读取这些分片)
+SHARD_MANIFEST = "shards.json"
+
+
+def shard_of(benchmark_id: Any, num_shards: int) -> int:
+    """样本所属的分片(crc32 不受 PYTHONHASHSEED 影响，续跑时样本仍落在同一分片)"""
+    return zlib.crc32(str(benchmark_id).encode("utf-8")) % num_shards
+
+
+def shard_path(output_path: Path, index: int) -> Path:
+    """分片的结果目录"""
+    return Path(output_path) / f"{SHARD_PREFIX}{index:02d}"
+
+
+def read_num_shards(output_path: Path) -> Optional[int]:
+    """
+    结果目录记录的分片数
+    
+    没有记录文件时(旧版本的结果)按已有的 shard_XX 目录推断，没有分片结果时返回 None
+    """
+    output_path = Path(output_path)
+    manifest = output_path / SHARD_MANIFEST
+    if manifest.exists():
+        with open(manifest, 'r', encoding='utf-8') as f:
+            return json.load(f)["num_shards"]
+    if not output_path.is_dir():
+        return None
+    indices = [
+        int(path.name[len(SHARD_PREFIX):]) for path in output_path.iterdir()
+        if path.is_dir() and path.name.startswith(SHARD_PREFIX) and path.name[len(SHARD_PREFIX):].isdigit()
+    ]
+    return max(indices) + 1 if indices else None
+
+
+def split_samples(samples: List[Dict], num_shards: int) -> List[List[Dict]]:
+    """
+    按 benchmark_id 哈希把样本分到各分片(分片内保持数据集顺序)
+    
+    惰性数据集只按位置切分偏移索引，传给子进程的是索引而不是样本
+    """
+    positions = [[] for _ in range(num_shards)]
+    for index, sample in enumerate(samples):
+        positions[shard_of(sample['benchmark_id'], num_shards)].append(index)
+    if isinstance(samples, LazySampleList):
+        return [samples.select(shard) for shard in positions]
+    return [[samples[index] for index in shard] for shard in positions]
+
+
+def _run_shard(index: int, num_shards: int, samples: List[Dict], output_dir: str, evaluator_kwargs: Dict, resume: bool):
+    """分片进程: 用自己的客户端评测一个分片，结果写入分片目录"""
+    # 所有分片进程共用同一组密钥，每个进程只使用 1/num_shards 的配额
+    get_rate_limiter().share(num_shards)
+    evaluator = MultiThreadEvaluator(**evaluator_kwargs)
+    evaluator.evaluate_dataset(samples, str(shard_path(output_dir, index)), resume=resume)
+
+
+def run_sharded(samples: List[Dict], num_shards: int, output_dir: str, evaluator_kwargs: Dict, resume: bool = False) -> Dict:
+    """
+    多进程分片评测并合并结果
+    
+    Args:
+        samples: 全部样本
+        num_shards: 进程数
+        output_dir: 结果目录(分片结果在其中的 shard_XX 子目录)
+        evaluator_kwargs: 每个进程创建 MultiThreadEvaluator 的参数
+        resume: 各分片从自己的目录续跑
+    
+    Returns:
+        合并后的分析结果
+    """
+    output_path = Path(output_dir)
+    # 样本按 crc32 % 分片数 分配，分片数改变后已完成的样本会落到其他分片重新评测，合并时重复计入
+    recorded = read_num_shards(output_path)
+    if resume and recorded is not None and recorded != num_shards:
+        raise ValueError(f"{output_path} 中的结果按 {recorded} 个分片评测, 续跑必须使用相同的分片数 (--shards {recorded})")
+    if recorded is not None and recorded > num_shards:
+        print(f"⚠️  {output_path} 中 {SHARD_PREFIX}{num_shards:02d} 及之后的旧分片目录不会被合并")
+    output_path.mkdir(parents=True, exist_ok=True)
+    with open(output_path / SHARD_MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump({"num_shards": num_shards}, f)
+    shards = split_samples(samples, num_shards)
+    print(f"🧩 分片评测: {num_shards} 个进程, 各分片样本数: {', '.join(str(len(shard)) for shard in shards)}")
+    
+    # spawn: 子进程重新导入模块，不继承父进程中的线程、锁和连接池
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=_run_shard,
+            args=(index, num_shards, shard, str(output_path), evaluator_kwargs, resume),
+            name=f"shard-{index}"
+        )
+        for index, shard in enumerate(shards)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    
+    failed = [index for index, process in enumerate(processes) if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"分片 {failed} 执行失败, 可使用 --resume 重新运行后再合并")
+    return merge_shards(output_path, evaluator_kwargs.get("results_format", "csv"))
+
+
+def merge_result_files(output_path: Path, shard_paths: List[Path], fmt: str = "csv") -> Path:
+    """把各分片的逐条结果文件按分片顺序拼接为一个文件"""
+    merged_file = output_path / RESULT_FILES[fmt]
+    shard_files = [path / RESULT_FILES[fmt] for path in shard_paths if (path / RESULT_FILES[fmt]).exists()]
+    
+    if fmt == "csv":
+        with open(merged_file, 'w', newline='', encoding='utf-8') as out:
+            writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            for shard_file in shard_files:
+                with open(shard_file, 'r', newline='', encoding='utf-8') as f:
+                    writer.writerows(csv.DictReader(f))
+    elif fmt == "jsonl":
+        with open(merged_file, 'wb') as out:
+            for shard_file in shard_files:
+                with open(shard_file, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+    else:
+        if pq is None:
+            raise RuntimeError("Parquet 结果文件需要 pyarrow，请先执行 pip install pyarrow")
+        tables = [pq.read_table(shard_file) for shard_file in shard_files]
+        if tables:
+            pq.write_table(pa.concat_tables(tables), merged_file)
+    return merged_file
+
+
+def merge_shards(output_path: Path, fmt: str = "csv") -> Dict:
+    """
+    合并 output_path 下各分片的结果，生成与单进程评测相同的输出文件
+    (只合并 shard_00 到 shard_{分片数-1}，分片数见 SHARD_MANIFEST)
+    
+    Returns:
+        合并后的分析结果
+    """
+    output_path = Path(output_path)
+    num_shards = read_num_shards(output_path)
+    if num_shards is None:
+        raise ValueError(f"{output_path} 中没有分片结果")
+    shard_paths = [shard_path(output_path, index) for index in range(num_shards)]
+    
+    # 各分片的分析结果提供模型列表、样本数和失败任务数
+    analyses = []
+    for path in shard_paths:
+        analysis_file = path / "evaluation_analysis.json"
+        if not analysis_file.exists():
+            raise RuntimeError(f"分片未完成: {path}, 可使用 --resume 重新运行后再合并")
+        with open(analysis_file, 'r', encoding='utf-8') as f:
+            analyses.append(json.load(f))
+    models = list(analyses[0]['model_performance'])
+    total_samples = sum(analysis['summary']['total_samples_in_dataset'] for analysis in analyses)
+    
+    # 拼接完整结果
+    with open(output_path / RAW_SPOOL, 'w', encoding='utf-8') as spool:
+        for path in shard_paths:
+            for result in iter_raw_spool(path):
+                spool.write(json.dumps(result, ensure_ascii=False) + "\n")
+    
+    results_file = merge_result_files(output_path, shard_paths, fmt)
+    print(f"💾 逐条结果已合并: {results_file}")
+    
+    raw_results_file = assemble_raw_results(output_path, models, TASK_TYPES)
+    print(f"💾 原始结果已保存: {raw_results_file}")
+    
+    # 失败的任务不写入结果文件，只能取各分片的计数；合并时没有样本属性，拆分统计由各分片求和
+    failed_tasks = sum(analysis['summary']['failed_tasks'] for analysis in analyses)
+    analysis = AnalysisEngine.from_output([output_path], models=models).analysis(total_samples, failed_tasks)
+    analysis['breakdowns'] = merge_breakdowns(shard_analysis.get('breakdowns') for shard_analysis in analyses)
+    analysis_file = output_path / "evaluation_analysis.json"
+    with open(analysis_file, 'w', encoding='utf-8') as f:
+        json.dump(analysis, f, ensure_ascii=False, indent=2)
+    print(f"📊 分析结果已保存: {analysis_file}")
+    
+    write_report(analysis, output_path)
+    return analysis
+
+
+def main():
+    """命令行: 重新合并已完成的分片结果(例如某个分片单独续跑之后)"""
+    parser = argparse.ArgumentParser(description="合并分片评测结果")
+    parser.add_argument("output", help="分片评测的结果目录(包含 shard_XX 子目录)")
+    parser.add_argument("--results-format", choices=["csv", "jsonl", "parquet"], default="csv",
+                        help="各分片逐条结果文件的格式")
+    args = parser.parse_args()
+    
+    analysis = merge_shards(Path(args.output), args.results_format)
+    summary = analysis['summary']
+    print(f"✅ 合并完成: {summary['successful_tasks']} 个成功任务, 最佳模型 {summary['best_model']} "
+          f"({summary['best_model_accuracy']*100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+模型对比的统计显著性 - 每个任务只有几百个样本时，准确率的差异常常只是噪声
+    bootstrap 置信区间    每个 (模型, 任务) 及模型总体准确率的置信区间
+    McNemar 检验          两个模型在相同 (benchmark_id, 任务) 上的配对检验
+    配对置换检验          随机交换配对结果的符号(sign-flip)，检验准确率差
+所有重抽样都以 NumPy 矩阵一次生成，不逐次循环
+
+对 0/1 结果有放回地重抽样 n 次，等价于对各类结果的计数做多项分布抽样，
+因此重抽样矩阵的规模只与重抽样次数有关，与结果条数无关
+"""
+import math
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    # 允许在 config.py 中调整重抽样次数和置信水平
+    from config import SIGNIFICANCE_CONFIG
+except ImportError:
+    SIGNIFICANCE_CONFIG = {}
+
+DEFAULT_SIGNIFICANCE_CONFIG = {
+    "bootstrap_resamples": 10000,   # bootstrap 重抽样次数
+    "permutations": 10000,          # 置换检验的随机置换次数
+    "confidence": 0.95,             # 置信区间的置信水平
+    "alpha": 0.05,                  # 判定显著的 p 值阈值
+    "seed": 0                       # 随机种子(相同结果得到相同区间)
+}
+
+# McNemar 检验中不一致对少于该数时使用精确二项检验，否则使用带连续性校正的卡方近似
+MCNEMAR_EXACT_LIMIT = 25
+
+
+def _interval(estimates: np.ndarray, confidence: float) -> Tuple[np.ndarray, np.ndarray]:
+    """重抽样估计值的分位数区间(按列)"""
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(estimates, [tail, 100 - tail], axis=0)
+    return low, high
+
+
+def bootstrap_accuracy(correct: np.ndarray, total: np.ndarray, resamples: int, confidence: float,
+                       rng: np.random.Generator) -> np.ndarray:
+    """
+    多组准确率的 bootstrap 置信区间
+    
+    Args:
+        correct: 各组正确数
+        total: 各组结果总数
+    
+    Returns:
+        形状为 (组数, 2) 的 [下限, 上限]
+    """
+    correct = np.asarray(correct, dtype=np.int64)
+    total = np.asarray(total, dtype=np.int64)
+    if not len(total):
+        return np.empty((0, 2))
+    # (重抽样次数, 组数) 的矩阵: 每列是一组结果重抽样后的正确数
+    rates = np.divide(correct, total, out=np.zeros(len(total)), where=total > 0)
+    samples = rng.binomial(total, rates, size=(resamples, len(total)))
+    low, high = _interval(samples / np.maximum(total, 1), confidence)
+    return np.column_stack([low, high])
+
+
+def mcnemar_test(a_only: int, b_only: int) -> float:
+    """McNemar 检验的双侧 p 值(a_only/b_only 为只有一方答对的配对数)"""
+    discordant = a_only + b_only
+    if discordant == 0:
+        return 1.0
+    if discordant < MCNEMAR_EXACT_LIMIT:
+        tail = sum(math.comb(discordant, k) for k in range(min(a_only, b_only) + 1)) / 2 ** discordant
+        return min(1.0, 2 * tail)
+    statistic = (abs(a_only - b_only) - 1) ** 2 / discordant
+    return math.erfc(math.sqrt(statistic / 2))
+
+
+def paired_comparison(a: np.ndarray, b: np.ndarray, config: Dict[str, Any], rng: np.random.Generator) -> Dict[str, Any]:
+    """
+    两个模型在相同配对上的比较
+    
+    Args:
+        a, b: 两个模型在同一组 (benchmark_id, 任务) 上的 0/1 结果
+    """
+    total = len(a)
+    both = int(np.sum(a & b))
+    a_only = int(np.sum(a & ~b))
+    b_only = int(np.sum(~a & b))
+    neither = total - both - a_only - b_only
+    
+    stats = {
+        'shared': total,
+        'a_only': a_only,
+        'b_only': b_only,
+        'accuracy_diff': (a_only - b_only) / total if total else 0.0,
+        'ci_low': 0.0,
+        'ci_high': 0.0,
+        'mcnemar_p': mcnemar_test(a_only, b_only),
+        'permutation_p': 1.0,
+        'significant': False
+    }
+    if not total:
+        return stats
+    
+    # 配对 bootstrap: 对四类配对的计数做多项分布重抽样，得到 (重抽样次数, 4) 的矩阵
+    counts = rng.multinomial(total, np.array([both, a_only, b_only, neither]) / total, size=config['bootstrap_resamples'])
+    low, high = _interval((counts[:, 1] - counts[:, 2]) / total, config['confidence'])
+    stats['ci_low'], stats['ci_high'] = float(low), float(high)
+    
+    # 配对置换: 只有不一致的配对交换后会改变差值，随机交换后 a 多答对的个数服从 Binomial(不一致数, 0.5)
+    discordant = a_only + b_only
+    if discordant:
+        flipped = rng.binomial(discordant, 0.5, size=config['permutations'])
+        extreme = np.sum(np.abs(2 * flipped - discordant) >= abs(a_only - b_only))
+        stats['permutation_p'] = float((extreme + 1) / (config['permutations'] + 1))
+    stats['significant'] = stats['mcnemar_p'] < config['alpha'] and stats['permutation_p'] < config['alpha']
+    return stats
+
+
+def significance_analysis(frame: pd.DataFrame, models: List[str], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    由逐条结果计算置信区间和模型两两之间的显著性
+    
+    Args:
+        frame: 逐条结果(benchmark_id, model, task_type, is_correct)
+        models: 模型顺序
+        config: 覆盖 SIGNIFICANCE_CONFIG 的参数
+    
+    Returns:
+        {config, model_intervals: {模型: {overall, tasks}}, pairwise: {"A vs B": {model_a, model_b, overall, tasks}}, best_model}
+    """
+    config = {**DEFAULT_SIGNIFICANCE_CONFIG, **SIGNIFICANCE_CONFIG, **(config or {})}
+    rng = np.random.default_rng(config['seed'])
+    frame = frame.drop_duplicates(subset=['benchmark_id', 'model', 'task_type'], keep='last')
+    
+    result = {
+        'config': {key: config[key] for key in ('bootstrap_resamples', 'permutations', 'confidence', 'alpha')},
+        'model_intervals': {},
+        'pairwise': {},
+        'best_model': None
+    }
+    
+    # 置信区间: 所有 (模型, 任务) 组和模型总体在同一个重抽样矩阵中计算
+    by_task = frame.groupby(['model', 'task_type'], observed=True)['is_correct'].agg(correct='sum', total='size').reset_index()
+    by_model = frame.groupby('model', observed=True)['is_correct'].agg(correct='sum', total='size').reset_index()
+    groups = pd.concat([by_task, by_model.assign(task_type=None)], ignore_index=True)
+    intervals = bootstrap_accuracy(groups['correct'], groups['total'], config['bootstrap_resamples'], config['confidence'], rng)
+    for row, (low, high) in zip(groups.itertuples(index=False), intervals):
+        stats = {
+            'accuracy': int(row.correct) / int(row.total),
+            'ci_low': float(low),
+            'ci_high': float(high),
+            'total': int(row.total)
+        }
+        model_intervals = result['model_intervals'].setdefault(str(row.model), {'overall': None, 'tasks': {}})
+        if pd.isna(row.task_type):
+            model_intervals['overall'] = stats
+        else:
+            model_intervals['tasks'][str(row.task_type)] = stats
+    
+    # 配对检验: 每行一个 (benchmark_id, 任务)，每列一个模型
+    table = frame.set_index(['benchmark_id', 'task_type', 'model'], drop=True)['is_correct'].astype(float).unstack('model')
+    models = [model for model in models if model in table.columns]
+    for i, model_a in enumerate(models):
+        for model_b in models[i + 1:]:
+            pair = table[[model_a, model_b]].dropna()
+            pair_tasks = pair.index.get_level_values('task_type')
+            a = pair[model_a].to_numpy(dtype=bool)
+            b = pair[model_b].to_numpy(dtype=bool)
+            comparison = {
+                'model_a': model_a,
+                'model_b': model_b,
+                'overall': paired_comparison(a, b, config, rng),
+                'tasks': {}
+            }
+            for task_type in pd.unique(pair_tasks):
+                mask = np.asarray(pair_tasks == task_type)
+                comparison['tasks'][str(task_type)] = paired_comparison(a[mask], b[mask], config, rng)
+            result['pairwise'][f"{model_a} vs {model_b}"] = comparison
+    
+    # 最佳模型与第二名的差异是否显著
+    ranked = sorted(
+        (model for model in models if result['model_intervals'].get(model, {}).get('overall')),
+        key=lambda model: result['model_intervals'][model]['overall']['accuracy'],
+        reverse=True
+    )
+    if len(ranked) >= 2:
+        best, runner_up = ranked[0], ranked[1]
+        key = f"{best} vs {runner_up}" if f"{best} vs {runner_up}" in result['pairwise'] else f"{runner_up} vs {best}"
+        overall = result['pairwise'][key]['overall']
+        result['best_model'] = {
+            'model': best,
+            'runner_up': runner_up,
+            'mcnemar_p': overall['mcnemar_p'],
+            'permutation_p': overall['permutation_p'],
+            'significant': overall['significant']
+        }
+    return result
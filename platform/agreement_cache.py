@@ -0,0 +1,125 @@
+"""
+标注一致性缓存 - 分析接口不再每次生成 annotated_<数据集>.json 并重新读取、重新计算
+每个数据集维护一份 AgreementCounts: 第一次使用时从标注记录读入，之后每次保存标注只更新该样本的计数;
+指标和报告按版本缓存，保存标注使缓存过期，由后台线程重新生成
+
+后台线程开启时，分析接口总是立即返回最近一次生成的结果(stale 表示之后又有新的标注)，
+只有数据集第一次分析、还没有任何结果时才在请求中同步计算
+"""
+import threading
+from typing import Dict, Any, Optional
+
+from annotation_analysis import AgreementCounts, format_agreement_report
+
+
+class AgreementCache:
+    """各数据集的增量一致性计数和缓存的分析结果(线程安全)"""
+    
+    def __init__(self, store, background: bool = True):
+        """
+        Args:
+            store: AnnotationStore，数据集第一次使用时从中读入已有标注
+            background: 是否由后台线程在保存标注后重新生成指标和报告
+        """
+        self.store = store
+        self.background = background
+        self.counts: Dict[str, AgreementCounts] = {}
+        self.totals: Dict[str, int] = {}
+        self.versions: Dict[str, int] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.worker: Optional[threading.Thread] = None
+    
+    def _counts(self, dataset: str) -> AgreementCounts:
+        """数据集的计数(调用方持有锁；第一次使用时从标注记录读入)"""
+        counts = self.counts.get(dataset)
+        if counts is None:
+            counts = AgreementCounts(self.totals[dataset])
+            for benchmark_id, record in self.store.all(dataset).items():
+                counts.update(benchmark_id, record['original_labels'], record['annotations'])
+            self.counts[dataset] = counts
+            self.versions[dataset] = self.versions.get(dataset, 0) + 1
+        counts.total_samples = self.totals[dataset]
+        return counts
+    
+    def record(self, dataset: str, total_samples: int, benchmark_id: Any, original_labels: Dict, annotations: Dict):
+        """计入一次保存的标注，使该数据集缓存的结果过期"""
+        with self.lock:
+            self.totals[dataset] = total_samples
+            self._counts(dataset).update(benchmark_id, original_labels, annotations)
+            self.versions[dataset] += 1
+        self._schedule(dataset)
+    
+    def reset(self, dataset: str):
+        """丢弃数据集的计数(标注记录被批量导入后)，下次使用时重新读入"""
+        with self.lock:
+            self.counts.pop(dataset, None)
+            self.versions[dataset] = self.versions.get(dataset, 0) + 1
+    
+    def warm(self, dataset: str, total_samples: int):
+        """加载数据集时在后台读入计数并生成结果，第一次打开分析页面时无需等待"""
+        with self.lock:
+            self.totals[dataset] = total_samples
+        self._schedule(dataset)
+    
+    def _schedule(self, dataset: str):
+        if not self.background:
+            return
+        with self.lock:
+            self.pending.add(dataset)
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="agreement-cache", daemon=True)
+                self.worker.start()
+        self.wake.set()
+    
+    def _run(self):
+        """后台线程: 重新生成过期的结果(连续保存时合并为一次计算)"""
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            with self.lock:
+                datasets = list(self.pending)
+                self.pending.clear()
+            for dataset in datasets:
+                try:
+                    self._compute(dataset)
+                except Exception as e:
+                    print(f"⚠️ 一致性分析失败 ({dataset}): {e}")
+    
+    def _compute(self, dataset: str) -> Dict[str, Any]:
+        """由计数生成指标和报告并缓存(已有更新版本的结果时不覆盖)"""
+        with self.lock:
+            metrics = self._counts(dataset).metrics()
+            version = self.versions[dataset]
+        
+        result = {
+            'metrics': metrics,
+            'report': format_agreement_report(metrics),
+            'version': version
+        }
+        with self.lock:
+            cached = self.results.get(dataset)
+            if cached is None or cached['version'] < version:
+                self.results[dataset] = result
+            return self.results[dataset]
+    
+    def get(self, dataset: str, total_samples: int) -> Dict[str, Any]:
+        """
+        数据集的一致性分析结果
+        
+        Returns:
+            {metrics, report, version, stale}，stale 为 True 时后台线程正在生成更新的结果
+        """
+        with self.lock:
+            self.totals[dataset] = total_samples
+            self._counts(dataset)
+            version = self.versions[dataset]
+            cached = self.results.get(dataset)
+        
+        if cached is None or (cached['version'] < version and not self.background):
+            cached = self._compute(dataset)
+        elif cached['version'] < version:
+            self._schedule(dataset)
+        return {**cached, 'stale': cached['version'] < version}
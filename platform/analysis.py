@@ -9,6 +9,7 @@ from typing import Dict, List, Tuple
 import pandas as pd
 import numpy as np
 from collections import defaultdict
+from annotation_store import export_annotated_files
 
 class AnnotationAnalyzer:
     """标注分析器"""
@@ -33,6 +34,9 @@ class AnnotationAnalyzer:
             print(f"❌ 标注目录不存在: {self.annotated_dir}")
             return []
         
+        # 标注平台只把标注写入 annotations.db，先导出有更新的标注文件
+        export_annotated_files(self.annotated_dir)
+        
         for file_path in self.annotated_dir.glob("annotated_*.json"):
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
@@ -6,10 +6,263 @@
 import json
 import numpy as np
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import Counter
 from typing import Dict, List, Tuple, Any
 import pandas as pd
 
+TASKS = ['atmosphere_recognition', 'ky_test', 'subtext_deciphering']
+TASK_NAMES = {
+    'atmosphere_recognition': '氛围识别',
+    'ky_test': 'KY测试', 
+    'subtext_deciphering': '潜台词解码'
+}
+
+
+def label_pairs(original_labels: Dict, human_labels: Dict) -> Dict[str, Tuple[int, int]]:
+    """一个样本各任务的 (原始答案, 人工答案)"""
+    original_labels = original_labels or {}
+    human_labels = human_labels or {}
+    return {
+        task: (original_labels[task]['correct_answer_index'], human_labels[task]['correct_answer_index'])
+        for task in TASKS
+        if task in original_labels and task in human_labels
+    }
+
+
+def calculate_kappa(pairs: Counter) -> float:
+    """由 (原始答案, 人工答案) 计数计算Cohen's Kappa系数"""
+    n = sum(pairs.values())
+    if n == 0:
+        return 0.0
+    
+    # 获取所有可能的类别
+    all_categories = sorted({a for a, _ in pairs} | {b for _, b in pairs})
+    k = len(all_categories)
+    
+    if k <= 1:
+        return 1.0  # 完全一致
+    
+    # 创建混淆矩阵
+    confusion_matrix = np.zeros((k, k))
+    cat_to_idx = {cat: i for i, cat in enumerate(all_categories)}
+    
+    for (a1, a2), count in pairs.items():
+        confusion_matrix[cat_to_idx[a1]][cat_to_idx[a2]] += count
+    
+    # 计算观察到的一致性
+    po = np.trace(confusion_matrix) / n
+    
+    # 计算期望一致性
+    marginal1 = np.sum(confusion_matrix, axis=1) / n
+    marginal2 = np.sum(confusion_matrix, axis=0) / n
+    pe = np.sum(marginal1 * marginal2)
+    
+    # 计算Kappa
+    if pe == 1.0:
+        return 1.0
+    
+    kappa = (po - pe) / (1 - pe)
+    return kappa
+
+
+def interpret_kappa(kappa: float) -> str:
+    """解释Kappa系数"""
+    if kappa < 0:
+        return "差于随机 (Poor)"
+    elif kappa < 0.20:
+        return "轻微一致 (Slight)"
+    elif kappa < 0.40:
+        return "一般一致 (Fair)"
+    elif kappa < 0.60:
+        return "中等一致 (Moderate)"
+    elif kappa < 0.80:
+        return "高度一致 (Substantial)"
+    else:
+        return "几乎完全一致 (Almost Perfect)"
+
+
+def calculate_task_agreement(pairs: Counter, task: str) -> Dict[str, Any]:
+    """由 (原始答案, 人工答案) 计数计算单个任务的一致性指标"""
+    n = sum(pairs.values())
+    if not n:
+        return {"error": f"任务 {task} 没有有效数据"}
+    
+    # 计算准确率（一致性）
+    agreements = sum(count for (orig, human), count in pairs.items() if orig == human)
+    accuracy = agreements / n * 100
+    
+    # 计算Kappa系数
+    kappa = calculate_kappa(pairs)
+    
+    # 统计每个选项的分布，找出分歧最大的选项
+    original_dist = Counter()
+    human_dist = Counter()
+    disagreements = {}
+    for (orig, human), count in pairs.items():
+        original_dist[orig] += count
+        human_dist[human] += count
+        if orig != human:
+            disagreements[f"{orig}→{human}"] = count
+    
+    return {
+        "sample_count": n,
+        "accuracy": round(accuracy, 2),
+        "agreement_rate": round(accuracy, 2),  # 同accuracy，但语义更清晰
+        "kappa_coefficient": round(kappa, 3),
+        "kappa_interpretation": interpret_kappa(kappa),
+        "confusion_stats": {
+            "original_distribution": dict(original_dist),
+            "human_distribution": dict(human_dist),
+            "top_disagreements": dict(sorted(disagreements.items(), 
+                                           key=lambda x: (-x[1], x[0]))[:5])
+        },
+        "disagreement_cases": n - agreements,
+        "disagreement_rate": round((1 - agreements / n) * 100, 2)
+    }
+
+
+class AgreementCounts:
+    """
+    人工标注与原始标签的一致性计数
+    
+    每个任务只保存 (原始答案, 人工答案) 的计数，标注一个样本只更新几个计数
+    (同一样本重新标注时先减去上一次的计数)，所有指标都由计数直接算出
+    """
+    
+    def __init__(self, total_samples: int):
+        self.total_samples = total_samples
+        self.samples: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self.pairs = {task: Counter() for task in TASKS}
+    
+    def update(self, benchmark_id: Any, original_labels: Dict, human_labels: Dict):
+        """计入(或替换)一个样本的人工标注"""
+        key = str(benchmark_id)
+        for task, pair in self.samples.get(key, {}).items():
+            self.pairs[task][pair] -= 1
+            if self.pairs[task][pair] <= 0:
+                del self.pairs[task][pair]
+        
+        pairs = label_pairs(original_labels, human_labels)
+        for task, pair in pairs.items():
+            self.pairs[task][pair] += 1
+        self.samples[key] = pairs
+    
+    def metrics(self) -> Dict[str, Any]:
+        """一致性指标(结构与 AnnotationAnalyzer.calculate_agreement_metrics 相同)"""
+        if not self.samples:
+            return {"error": "没有找到已标注的样本"}
+        
+        results = {
+            "total_annotated_samples": len(self.samples),
+            "total_samples": self.total_samples,
+            "annotation_coverage": len(self.samples) / self.total_samples * 100 if self.total_samples else 0.0,
+            "task_metrics": {}
+        }
+        
+        # 分任务计算指标
+        for task in TASKS:
+            results["task_metrics"][TASK_NAMES[task]] = calculate_task_agreement(self.pairs[task], task)
+        
+        # 计算总体指标
+        total = sum(sum(pairs.values()) for pairs in self.pairs.values())
+        if not total:
+            results["overall_metrics"] = {"error": "没有有效的对比数据"}
+        else:
+            agreements = sum(
+                count for pairs in self.pairs.values()
+                for (orig, human), count in pairs.items() if orig == human
+            )
+            results["overall_metrics"] = {
+                "overall_accuracy": round(agreements / total * 100, 2),
+                "total_comparisons": total,
+                "total_agreements": agreements,
+                "total_disagreements": total - agreements
+            }
+        
+        return results
+
+
+def format_agreement_report(metrics: Dict[str, Any]) -> str:
+    """由一致性指标生成详细的分析报告"""
+    if "error" in metrics:
+        return f"错误: {metrics['error']}"
+    
+    report = []
+    report.append("=" * 60)
+    report.append("标注一致性分析报告")
+    report.append("=" * 60)
+    report.append("")
+    
+    # 基本信息
+    report.append("📊 基本信息:")
+    report.append(f"  • 总样本数: {metrics['total_samples']}")
+    report.append(f"  • 已标注样本数: {metrics['total_annotated_samples']}")
+    report.append(f"  • 标注覆盖率: {metrics['annotation_coverage']:.1f}%")
+    report.append("")
+    
+    # 总体指标
+    if "error" not in metrics["overall_metrics"]:
+        overall = metrics["overall_metrics"]
+        report.append("🎯 总体一致性:")
+        report.append(f"  • 总体准确率: {overall['overall_accuracy']:.2f}%")
+        report.append(f"  • 总对比次数: {overall['total_comparisons']}")
+        report.append(f"  • 一致次数: {overall['total_agreements']}")
+        report.append(f"  • 分歧次数: {overall['total_disagreements']}")
+        report.append("")
+    
+    # 分任务指标
+    report.append("📋 分任务分析:")
+    for task_name, task_metrics in metrics["task_metrics"].items():
+        if "error" not in task_metrics:
+            report.append(f"\n  {task_name}:")
+            report.append(f"    • 样本数: {task_metrics['sample_count']}")
+            report.append(f"    • 一致率: {task_metrics['accuracy']:.2f}%")
+            report.append(f"    • Kappa系数: {task_metrics['kappa_coefficient']:.3f} ({task_metrics['kappa_interpretation']})")
+            report.append(f"    • 分歧案例: {task_metrics['disagreement_cases']} ({task_metrics['disagreement_rate']:.2f}%)")
+            
+            if task_metrics['confusion_stats']['top_disagreements']:
+                report.append(f"    • 主要分歧类型:")
+                for disagreement, count in task_metrics['confusion_stats']['top_disagreements'].items():
+                    report.append(f"      - {disagreement}: {count}次")
+    
+    report.append("")
+    report.append("=" * 60)
+    report.append("📝 论文写作建议:")
+    report.append("")
+    
+    # 生成论文写作建议
+    overall_acc = metrics["overall_metrics"].get("overall_accuracy", 0)
+    if overall_acc >= 80:
+        report.append("✅ 模型标签质量评估: 优秀")
+        report.append("   建议表述: '大模型生成的标签与人工标注具有高度一致性'")
+    elif overall_acc >= 70:
+        report.append("✅ 模型标签质量评估: 良好") 
+        report.append("   建议表述: '大模型生成的标签与人工标注具有较好一致性'")
+    elif overall_acc >= 60:
+        report.append("⚠️ 模型标签质量评估: 中等")
+        report.append("   建议表述: '大模型生成的标签与人工标注具有中等程度一致性'")
+    else:
+        report.append("❌ 模型标签质量评估: 需要改进")
+        report.append("   建议表述: '大模型生成的标签需要进一步优化'")
+    
+    report.append("")
+    report.append("📊 可用于论文的数据:")
+    report.append(f"   • 标注者间一致性(IAA): {overall_acc:.2f}%")
+    report.append(f"   • 样本覆盖率: {metrics['annotation_coverage']:.1f}%")
+    
+    # Kappa系数汇总
+    kappa_values = []
+    for task_metrics in metrics["task_metrics"].values():
+        if "kappa_coefficient" in task_metrics:
+            kappa_values.append(task_metrics["kappa_coefficient"])
+    
+    if kappa_values:
+        avg_kappa = np.mean(kappa_values)
+        report.append(f"   • 平均Kappa系数: {avg_kappa:.3f}")
+    
+    return "\n".join(report)
+
+
 class AnnotationAnalyzer:
     """标注分析器"""
     
@@ -41,255 +294,14 @@ class AnnotationAnalyzer:
         Returns:
             包含各种一致性指标的字典
         """
-        if not self.annotated_samples:
-            return {"error": "没有找到已标注的样本"}
-        
-        results = {
-            "total_annotated_samples": len(self.annotated_samples),
-            "total_samples": len(self.data['samples']),
-            "annotation_coverage": len(self.annotated_samples) / len(self.data['samples']) * 100,
-            "task_metrics": {}
-        }
-        
-        # 分任务计算指标
-        tasks = ['atmosphere_recognition', 'ky_test', 'subtext_deciphering']
-        task_names = {
-            'atmosphere_recognition': '氛围识别',
-            'ky_test': 'KY测试', 
-            'subtext_deciphering': '潜台词解码'
-        }
-        
-        for task in tasks:
-            task_result = self._calculate_task_agreement(task)
-            results["task_metrics"][task_names[task]] = task_result
-        
-        # 计算总体指标
-        results["overall_metrics"] = self._calculate_overall_metrics()
-        
-        return results
-    
-    def _calculate_task_agreement(self, task: str) -> Dict[str, float]:
-        """计算单个任务的一致性指标"""
-        original_answers = []
-        human_answers = []
-        
+        counts = AgreementCounts(len(self.data['samples']))
         for sample in self.annotated_samples:
-            if task in sample.get('original_labels', {}):
-                orig_idx = sample['original_labels'][task]['correct_answer_index']
-                human_idx = sample['evaluation_labels'][task]['correct_answer_index']
-                
-                original_answers.append(orig_idx)
-                human_answers.append(human_idx)
-        
-        if not original_answers:
-            return {"error": f"任务 {task} 没有有效数据"}
-        
-        # 计算准确率（一致性）
-        agreements = [1 if orig == human else 0 
-                     for orig, human in zip(original_answers, human_answers)]
-        accuracy = np.mean(agreements) * 100
-        
-        # 计算Kappa系数
-        kappa = self._calculate_kappa(original_answers, human_answers)
-        
-        # 计算混淆矩阵统计
-        confusion_stats = self._calculate_confusion_stats(original_answers, human_answers)
-        
-        return {
-            "sample_count": len(original_answers),
-            "accuracy": round(accuracy, 2),
-            "agreement_rate": round(accuracy, 2),  # 同accuracy，但语义更清晰
-            "kappa_coefficient": round(kappa, 3),
-            "kappa_interpretation": self._interpret_kappa(kappa),
-            "confusion_stats": confusion_stats,
-            "disagreement_cases": len(original_answers) - sum(agreements),
-            "disagreement_rate": round((1 - np.mean(agreements)) * 100, 2)
-        }
-    
-    def _calculate_kappa(self, list1: List[int], list2: List[int]) -> float:
-        """计算Cohen's Kappa系数"""
-        if len(list1) != len(list2):
-            return 0.0
-        
-        n = len(list1)
-        if n == 0:
-            return 0.0
-        
-        # 获取所有可能的类别
-        all_categories = sorted(set(list1 + list2))
-        k = len(all_categories)
-        
-        if k <= 1:
-            return 1.0  # 完全一致
-        
-        # 创建混淆矩阵
-        confusion_matrix = np.zeros((k, k))
-        cat_to_idx = {cat: i for i, cat in enumerate(all_categories)}
-        
-        for a1, a2 in zip(list1, list2):
-            i, j = cat_to_idx[a1], cat_to_idx[a2]
-            confusion_matrix[i][j] += 1
-        
-        # 计算观察到的一致性
-        po = np.trace(confusion_matrix) / n
-        
-        # 计算期望一致性
-        marginal1 = np.sum(confusion_matrix, axis=1) / n
-        marginal2 = np.sum(confusion_matrix, axis=0) / n
-        pe = np.sum(marginal1 * marginal2)
-        
-        # 计算Kappa
-        if pe == 1.0:
-            return 1.0
-        
-        kappa = (po - pe) / (1 - pe)
-        return kappa
-    
-    def _interpret_kappa(self, kappa: float) -> str:
-        """解释Kappa系数"""
-        if kappa < 0:
-            return "差于随机 (Poor)"
-        elif kappa < 0.20:
-            return "轻微一致 (Slight)"
-        elif kappa < 0.40:
-            return "一般一致 (Fair)"
-        elif kappa < 0.60:
-            return "中等一致 (Moderate)"
-        elif kappa < 0.80:
-            return "高度一致 (Substantial)"
-        else:
-            return "几乎完全一致 (Almost Perfect)"
-    
-    def _calculate_confusion_stats(self, original: List[int], human: List[int]) -> Dict:
-        """计算混淆矩阵统计信息"""
-        # 统计每个选项的分布
-        original_dist = Counter(original)
-        human_dist = Counter(human)
-        
-        # 找出分歧最大的选项
-        disagreements = defaultdict(int)
-        for orig, human in zip(original, human):
-            if orig != human:
-                disagreements[f"{orig}→{human}"] += 1
-        
-        return {
-            "original_distribution": dict(original_dist),
-            "human_distribution": dict(human_dist),
-            "top_disagreements": dict(sorted(disagreements.items(), 
-                                           key=lambda x: x[1], reverse=True)[:5])
-        }
-    
-    def _calculate_overall_metrics(self) -> Dict[str, float]:
-        """计算总体指标"""
-        all_agreements = []
-        
-        tasks = ['atmosphere_recognition', 'ky_test', 'subtext_deciphering']
-        
-        for sample in self.annotated_samples:
-            sample_agreements = []
-            for task in tasks:
-                if (task in sample.get('original_labels', {}) and 
-                    task in sample.get('evaluation_labels', {})):
-                    orig_idx = sample['original_labels'][task]['correct_answer_index']
-                    human_idx = sample['evaluation_labels'][task]['correct_answer_index']
-                    sample_agreements.append(1 if orig_idx == human_idx else 0)
-            
-            if sample_agreements:
-                all_agreements.extend(sample_agreements)
-        
-        if not all_agreements:
-            return {"error": "没有有效的对比数据"}
-        
-        overall_accuracy = np.mean(all_agreements) * 100
-        
-        return {
-            "overall_accuracy": round(overall_accuracy, 2),
-            "total_comparisons": len(all_agreements),
-            "total_agreements": sum(all_agreements),
-            "total_disagreements": len(all_agreements) - sum(all_agreements)
-        }
+            counts.update(sample['benchmark_id'], sample.get('original_labels'), sample.get('evaluation_labels'))
+        return counts.metrics()
     
     def generate_detailed_report(self) -> str:
         """生成详细的分析报告"""
-        metrics = self.calculate_agreement_metrics()
-        
-        if "error" in metrics:
-            return f"错误: {metrics['error']}"
-        
-        report = []
-        report.append("=" * 60)
-        report.append("标注一致性分析报告")
-        report.append("=" * 60)
-        report.append("")
-        
-        # 基本信息
-        report.append("📊 基本信息:")
-        report.append(f"  • 总样本数: {metrics['total_samples']}")
-        report.append(f"  • 已标注样本数: {metrics['total_annotated_samples']}")
-        report.append(f"  • 标注覆盖率: {metrics['annotation_coverage']:.1f}%")
-        report.append("")
-        
-        # 总体指标
-        if "error" not in metrics["overall_metrics"]:
-            overall = metrics["overall_metrics"]
-            report.append("🎯 总体一致性:")
-            report.append(f"  • 总体准确率: {overall['overall_accuracy']:.2f}%")
-            report.append(f"  • 总对比次数: {overall['total_comparisons']}")
-            report.append(f"  • 一致次数: {overall['total_agreements']}")
-            report.append(f"  • 分歧次数: {overall['total_disagreements']}")
-            report.append("")
-        
-        # 分任务指标
-        report.append("📋 分任务分析:")
-        for task_name, task_metrics in metrics["task_metrics"].items():
-            if "error" not in task_metrics:
-                report.append(f"\n  {task_name}:")
-                report.append(f"    • 样本数: {task_metrics['sample_count']}")
-                report.append(f"    • 一致率: {task_metrics['accuracy']:.2f}%")
-                report.append(f"    • Kappa系数: {task_metrics['kappa_coefficient']:.3f} ({task_metrics['kappa_interpretation']})")
-                report.append(f"    • 分歧案例: {task_metrics['disagreement_cases']} ({task_metrics['disagreement_rate']:.2f}%)")
-                
-                if task_metrics['confusion_stats']['top_disagreements']:
-                    report.append(f"    • 主要分歧类型:")
-                    for disagreement, count in task_metrics['confusion_stats']['top_disagreements'].items():
-                        report.append(f"      - {disagreement}: {count}次")
-        
-        report.append("")
-        report.append("=" * 60)
-        report.append("📝 论文写作建议:")
-        report.append("")
-        
-        # 生成论文写作建议
-        overall_acc = metrics["overall_metrics"].get("overall_accuracy", 0)
-        if overall_acc >= 80:
-            report.append("✅ 模型标签质量评估: 优秀")
-            report.append("   建议表述: '大模型生成的标签与人工标注具有高度一致性'")
-        elif overall_acc >= 70:
-            report.append("✅ 模型标签质量评估: 良好") 
-            report.append("   建议表述: '大模型生成的标签与人工标注具有较好一致性'")
-        elif overall_acc >= 60:
-            report.append("⚠️ 模型标签质量评估: 中等")
-            report.append("   建议表述: '大模型生成的标签与人工标注具有中等程度一致性'")
-        else:
-            report.append("❌ 模型标签质量评估: 需要改进")
-            report.append("   建议表述: '大模型生成的标签需要进一步优化'")
-        
-        report.append("")
-        report.append("📊 可用于论文的数据:")
-        report.append(f"   • 标注者间一致性(IAA): {overall_acc:.2f}%")
-        report.append(f"   • 样本覆盖率: {metrics['annotation_coverage']:.1f}%")
-        
-        # Kappa系数汇总
-        kappa_values = []
-        for task_metrics in metrics["task_metrics"].values():
-            if "kappa_coefficient" in task_metrics:
-                kappa_values.append(task_metrics["kappa_coefficient"])
-        
-        if kappa_values:
-            avg_kappa = np.mean(kappa_values)
-            report.append(f"   • 平均Kappa系数: {avg_kappa:.3f}")
-        
-        return "\n".join(report)
+        return format_agreement_report(self.calculate_agreement_metrics())
     
     def export_to_csv(self, output_path: str = None) -> str:
         """导出详细数据到CSV文件"""
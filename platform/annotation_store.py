@@ -0,0 +1,258 @@
+"""
+标注存储 - 每次保存只写入一行 SQLite 记录(以数据集和 benchmark_id 为键)，
+不再复制并重写整个数据集；annotated_<数据集>.json 在需要时(分析、导出)由原始数据集和标注记录流式生成
+
+保存的耗时与数据集大小无关，同一样本重复保存只保留最后一次标注，
+第一次标注时记录的原始答案(original_labels)保持不变；记录最后保存该样本的标注员
+
+所有标注员的会话共用一个实例: 写入在锁内串行提交(每次只有一行)，WAL 模式下读取不阻塞写入
+
+离线分析工具(run_analysis.py、analysis.py)读取 annotated_*.json 前调用 export_annotated_files，
+也可以直接运行本模块导出全部数据集: python annotation_store.py
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Union
+
+sys.path.append(str(Path(__file__).parent.parent / "data_generator"))
+from dataset_loader import iter_samples, load_dataset_info
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR.parent / "data_generator" / "data"
+ANNOTATED_DIR = BASE_DIR / "annotated_data"
+# 标注记录数据库在标注目录中的文件名
+ANNOTATION_DB_NAME = "annotations.db"
+
+
+class AnnotationStore:
+    """SQLite 标注记录(线程安全)"""
+    
+    def __init__(self, path: Union[str, Path]):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS annotations (
+                dataset TEXT NOT NULL,
+                benchmark_id TEXT NOT NULL,
+                annotations TEXT NOT NULL,
+                original_labels TEXT,
+                updated REAL NOT NULL,
+                annotator TEXT,
+                PRIMARY KEY (dataset, benchmark_id)
+            )
+        """)
+        # 旧版本的数据库没有 annotator 列
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(annotations)")}
+        if "annotator" not in columns:
+            self.conn.execute("ALTER TABLE annotations ADD COLUMN annotator TEXT")
+        self.conn.commit()
+        self.lock = threading.Lock()
+    
+    def save(self, dataset: str, benchmark_id: Any, annotations: Any, original_labels: Any = None,
+             annotator: Optional[str] = None):
+        """写入一个样本的标注(已有记录时只更新标注和标注员，保留第一次记录的原始答案)"""
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO annotations (dataset, benchmark_id, annotations, original_labels, updated, annotator)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dataset, benchmark_id) DO UPDATE SET
+                    annotations = excluded.annotations, updated = excluded.updated, annotator = excluded.annotator
+            """, (
+                dataset, str(benchmark_id),
+                json.dumps(annotations, ensure_ascii=False),
+                json.dumps(original_labels, ensure_ascii=False),
+                time.time(),
+                annotator
+            ))
+            self.conn.commit()
+    
+    def get(self, dataset: str, benchmark_id: Any) -> Optional[Dict[str, Any]]:
+        """读取一个样本的标注记录 {annotations, original_labels, annotator}，没有时返回 None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT annotations, original_labels, annotator FROM annotations WHERE dataset = ? AND benchmark_id = ?",
+                (dataset, str(benchmark_id))
+            ).fetchone()
+        if row is None:
+            return None
+        return {"annotations": json.loads(row[0]), "original_labels": json.loads(row[1]), "annotator": row[2]}
+    
+    def all(self, dataset: str) -> Dict[str, Dict[str, Any]]:
+        """数据集的全部标注记录 {benchmark_id: {annotations, original_labels, annotator}}"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT benchmark_id, annotations, original_labels, annotator FROM annotations WHERE dataset = ?",
+                (dataset,)
+            ).fetchall()
+        return {
+            benchmark_id: {
+                "annotations": json.loads(annotations),
+                "original_labels": json.loads(original_labels),
+                "annotator": annotator
+            }
+            for benchmark_id, annotations, original_labels, annotator in rows
+        }
+    
+    def datasets(self) -> List[str]:
+        """有标注记录的数据集"""
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT dataset FROM annotations ORDER BY dataset").fetchall()
+        return [row[0] for row in rows]
+    
+    def count(self, dataset: str) -> int:
+        """数据集已标注的样本数"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM annotations WHERE dataset = ?", (dataset,)).fetchone()[0]
+    
+    def count_by_annotator(self, dataset: str) -> Dict[str, int]:
+        """各标注员最后保存的样本数"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT COALESCE(annotator, ''), COUNT(*) FROM annotations WHERE dataset = ? GROUP BY annotator",
+                (dataset,)
+            ).fetchall()
+        return dict(rows)
+    
+    def last_updated(self, dataset: str) -> float:
+        """数据集最近一次保存标注的时间(没有标注时为 0)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COALESCE(MAX(updated), 0) FROM annotations WHERE dataset = ?", (dataset,)
+            ).fetchone()[0]
+    
+    def import_annotated(self, dataset: str, samples: Iterable[Dict[str, Any]]) -> int:
+        """
+        导入旧版本整体重写的标注文件中的人工标注(human_annotated 的样本)
+        
+        Returns:
+            导入的样本数
+        """
+        now = time.time()
+        rows = [
+            (dataset, str(sample['benchmark_id']),
+             json.dumps(sample.get('evaluation_labels'), ensure_ascii=False),
+             json.dumps(sample.get('original_labels'), ensure_ascii=False), now)
+            for sample in samples if sample.get('human_annotated')
+        ]
+        with self.lock:
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO annotations (dataset, benchmark_id, annotations, original_labels, updated)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            self.conn.commit()
+        return len(rows)
+    
+    def materialize(self, dataset: str, data: Dict[str, Any], output_file: Union[str, Path]) -> Path:
+        """
+        生成带人工标注的数据集文件(与旧版本 annotated_<数据集>.json 的结构相同)
+        
+        Args:
+            dataset: 数据集名
+            data: {'dataset_info': ..., 'samples': 可迭代的样本}，样本逐个读取并写出
+            output_file: 输出文件
+        """
+        output_file = Path(output_file)
+        records = self.all(dataset)
+        tmp_file = output_file.with_name(output_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write("{")
+            for key, value in data.items():
+                if key != 'samples':
+                    f.write(f"\n  {json.dumps(key, ensure_ascii=False)}: "
+                            f"{json.dumps(value, ensure_ascii=False, indent=2).replace(chr(10), chr(10) + '  ')},")
+            f.write('\n  "samples": [')
+            first = True
+            for sample in data.get('samples', []):
+                record = records.get(str(sample['benchmark_id']))
+                if record is not None:
+                    sample['original_labels'] = record['original_labels']
+                    sample['evaluation_labels'] = record['annotations']
+                    sample['human_annotated'] = True
+                    if record['annotator']:
+                        sample['annotator'] = record['annotator']
+                text = json.dumps(sample, ensure_ascii=False, indent=2).replace("\n", "\n    ")
+                f.write(f'{"" if first else ","}\n    {text}')
+                first = False
+            f.write("\n  ]\n}\n" if not first else "]\n}\n")
+        os.replace(tmp_file, output_file)
+        return output_file
+    
+    def export(self, dataset: str, data: Dict[str, Any], output_file: Union[str, Path]) -> Optional[Path]:
+        """
+        标注有更新(或文件不存在)时用 materialize 重新生成 output_file
+        
+        Returns:
+            标注文件路径，没有任何标注时返回 None
+        """
+        last_updated = self.last_updated(dataset)
+        if not last_updated:
+            return None
+        output_file = Path(output_file)
+        if not output_file.exists() or output_file.stat().st_mtime < last_updated:
+            self.materialize(dataset, data, output_file)
+        return output_file
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+
+def export_annotated_files(annotated_dir: Union[str, Path] = ANNOTATED_DIR,
+                           data_dir: Union[str, Path] = DATA_DIR) -> List[Path]:
+    """
+    把标注记录导出为 annotated_dir 下的 annotated_<数据集>.json(只重新生成有更新的文件)
+    
+    标注平台保存时只写数据库，离线分析工具读取标注文件前调用此函数；没有数据库时不做任何事
+    
+    Returns:
+        已是最新的标注文件
+    """
+    annotated_dir = Path(annotated_dir)
+    db_path = annotated_dir / ANNOTATION_DB_NAME
+    if not db_path.exists():
+        return []
+    
+    store = AnnotationStore(db_path)
+    exported = []
+    try:
+        for dataset in store.datasets():
+            data_file = Path(data_dir) / dataset
+            if not data_file.exists():
+                print(f"⚠️  数据集文件不存在, 跳过导出: {data_file}")
+                continue
+            data = {'dataset_info': load_dataset_info(data_file), 'samples': iter_samples(data_file)}
+            output_file = store.export(dataset, data, annotated_dir / f"annotated_{dataset}")
+            if output_file is not None:
+                exported.append(output_file)
+    finally:
+        store.close()
+    return exported
+
+
+def main():
+    """命令行: 把标注记录导出为 annotated_<数据集>.json"""
+    parser = argparse.ArgumentParser(description="导出标注记录为 annotated_<数据集>.json")
+    parser.add_argument("--annotated-dir", default=str(ANNOTATED_DIR), help="标注目录(包含 annotations.db)")
+    parser.add_argument("--data-dir", default=str(DATA_DIR), help="原始数据集目录")
+    args = parser.parse_args()
+    
+    exported = export_annotated_files(args.annotated_dir, args.data_dir)
+    if not exported:
+        print("❌ 没有可导出的标注记录")
+        return
+    for output_file in exported:
+        print(f"💾 标注文件: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
 """
 人工标注核验平台 - Flask后端
+支持多名标注员同时使用: 每个标注员(请求头 X-Annotator-Id)有独立的文件、位置和模式，
+已加载的数据集由所有会话只读共享
 """
 import os
+import sys
 import json
-import copy
+import gzip
+import hashlib
+import threading
+from urllib.parse import unquote
 from flask import Flask, render_template, request, jsonify, send_from_directory
 from pathlib import Path
-from annotation_analysis import AnnotationAnalyzer
+from annotation_store import AnnotationStore, ANNOTATION_DB_NAME
+from agreement_cache import AgreementCache
+
+sys.path.append(str(Path(__file__).parent.parent / "data_generator"))
+from dataset_loader import open_dataset, iter_samples
 
 app = Flask(__name__)
 
@@ -15,26 +25,108 @@ BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR.parent / "data_generator" / "data"
 ANNOTATED_DIR = BASE_DIR / "annotated_data"
 ANNOTATED_DIR.mkdir(exist_ok=True)
+# 标注记录(每次保存写入一行)，annotated_<数据集>.json 在导出时由此生成
+ANNOTATION_DB = ANNOTATED_DIR / ANNOTATION_DB_NAME
 
 # 重标注模式配置
 RELABEL_DIR = BASE_DIR.parent / "relabel"
 RELABEL_DATA_FILE = RELABEL_DIR / "relabel_whole_data.json"
 RELABELED_OUTPUT_FILE = RELABEL_DIR / "relabeled_data.json"
 
+# 标识标注员的请求头(前端生成并保存在 localStorage)，未提供时使用默认会话
+ANNOTATOR_HEADER = "X-Annotator-Id"
+DEFAULT_ANNOTATOR = "default"
+
+# 样本响应默认不返回的字段(请求参数 include 可以加回)
+DEFAULT_EXCLUDED_FIELDS = {'original_labels'}
+# 预取接口一次最多返回的样本数
+PREFETCH_MAX = 10
+# 超过该字节数的 JSON 响应在客户端支持时 gzip 压缩
+GZIP_MIN_BYTES = 1024
+# 保存标注后由后台线程重新生成一致性分析(关闭时在分析请求中同步生成)
+ANALYSIS_IN_BACKGROUND = True
+
 print(f"数据目录: {DATA_DIR.absolute()}")
 print(f"数据目录存在: {DATA_DIR.exists()}")
 if DATA_DIR.exists():
     print(f"数据文件: {list(DATA_DIR.glob('*.json'))}")
 
-class AnnotationPlatform:
-    """标注平台核心逻辑"""
+class DatasetRegistry:
+    """
+    进程内共享的数据集(只读)
+    
+    同一文件只建立一次偏移索引和 benchmark_id 索引，所有标注员的会话引用同一个样本列表；
+    重标注结果也由所有会话共享，写入时加锁
+    """
     
     def __init__(self):
+        self.datasets = {}
+        self.lock = threading.Lock()
+        self.relabeled_data = None
+        self.relabel_positions = {}  # benchmark_id -> 在 relabeled_samples 中的位置
+        self.relabel_lock = threading.Lock()
+    
+    def get(self, file_path):
+        """
+        共享的数据集(文件被修改后重新打开)
+        
+        Returns:
+            ({'dataset_info', 'samples'}, {benchmark_id: 样本位置})
+        """
+        file_path = Path(file_path)
+        key = str(file_path.resolve())
+        mtime = file_path.stat().st_mtime_ns
+        with self.lock:
+            entry = self.datasets.get(key)
+            if entry is None or entry[0] != mtime:
+                # 只建立样本偏移索引，样本在访问时才解析
+                samples = open_dataset(file_path)
+                entry = (mtime, {'dataset_info': samples.dataset_info, 'samples': samples}, samples.id_index())
+                self.datasets[key] = entry
+            return entry[1], entry[2]
+    
+    def get_relabeled_data(self):
+        """共享的重标注结果(第一次调用时从 relabeled_data.json 读取并建立 benchmark_id 索引)"""
+        with self.relabel_lock:
+            if self.relabeled_data is None:
+                if RELABELED_OUTPUT_FILE.exists():
+                    with open(RELABELED_OUTPUT_FILE, 'r', encoding='utf-8') as f:
+                        self.relabeled_data = json.load(f)
+                else:
+                    # 初始化重标注结果数据结构
+                    self.relabeled_data = {
+                        "dataset_info": {
+                            "description": "人工重标注结果",
+                            "source": str(RELABEL_DATA_FILE),
+                            "total_relabeled": 0
+                        },
+                        "relabeled_samples": []
+                    }
+                self.relabel_positions = {
+                    str(record['benchmark_id']): position
+                    for position, record in enumerate(self.relabeled_data['relabeled_samples'])
+                }
+            return self.relabeled_data
+
+
+# 所有会话共享的数据集和标注记录
+registry = DatasetRegistry()
+annotation_store = AnnotationStore(ANNOTATION_DB)
+agreement_cache = AgreementCache(annotation_store, background=ANALYSIS_IN_BACKGROUND)
+
+
+class AnnotationPlatform:
+    """标注平台核心逻辑(一个标注员的会话)"""
+    
+    def __init__(self, annotator_id=DEFAULT_ANNOTATOR):
+        self.annotator_id = annotator_id
         self.current_file = None
         self.current_data = None
+        self.positions = {}  # benchmark_id -> 样本位置(与数据集一起共享)
         self.current_sample_index = 0
         self.relabel_mode = False  # 重标注模式标志
-        self.relabeled_data = None  # 重标注结果数据
+        self.relabeled_data = None  # 重标注结果数据(所有会话共享)
+        self.store = annotation_store
         
     def load_dataset(self, filename):
         """加载数据集"""
@@ -47,17 +139,42 @@ class AnnotationPlatform:
             return False
             
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                self.current_data = json.load(f)
+            self.current_data, self.positions = registry.get(file_path)
             self.current_file = filename
             self.current_sample_index = 0
+            self.relabel_mode = False
+            self._import_legacy_annotations(filename)
+            agreement_cache.warm(filename, len(self.current_data['samples']))
             print(f"成功加载文件，样本数: {len(self.current_data.get('samples', []))}")
             return True
         except Exception as e:
             print(f"加载文件失败: {e}")
             return False
     
-    def get_available_files(self):
+    def _import_legacy_annotations(self, filename):
+        """数据集还没有标注记录时，导入旧版本整体重写的 annotated_<数据集>.json"""
+        annotated_file = ANNOTATED_DIR / f"annotated_{filename}"
+        if annotated_file.exists() and self.store.count(filename) == 0:
+            imported = self.store.import_annotated(filename, iter_samples(annotated_file))
+            agreement_cache.reset(filename)
+            print(f"导入已有标注: {imported} 个样本")
+    
+    def find_sample(self, sample_id):
+        """
+        按 benchmark_id 查找样本
+        
+        Returns:
+            (样本位置, 样本)，找不到时为 (None, None)
+        """
+        if not self.current_data:
+            return None, None
+        position = self.positions.get(str(sample_id))
+        if position is None:
+            return None, None
+        return position, self.current_data['samples'][position]
+    
+    @staticmethod
+    def get_available_files():
         """获取可用的数据文件"""
         if not DATA_DIR.exists():
             return []
@@ -74,16 +191,25 @@ class AnnotationPlatform:
             
         return samples[self.current_sample_index]
     
-    def get_dataset_info(self):
-        """获取数据集信息"""
+    def get_dataset_info(self, full=True):
+        """获取数据集信息(full=False 时只返回当前位置和样本总数，供导航使用)"""
         if not self.current_data:
             return None
             
-        info = self.current_data.get('dataset_info', {})
+        # 复制一份，共享的 dataset_info 不写入会话状态
+        info = dict(self.current_data.get('dataset_info', {})) if full else {}
         info['current_index'] = self.current_sample_index
         info['total_samples'] = len(self.current_data.get('samples', []))
         return info
     
+    def get_samples(self, start, count):
+        """从 start 开始的最多 count 个样本 [(位置, 样本), ...]"""
+        if not self.current_data:
+            return []
+        samples = self.current_data['samples']
+        start = max(start, 0)
+        return [(index, samples[index]) for index in range(start, min(start + count, len(samples)))]
+    
     def save_annotation(self, sample_id, annotations):
         """保存标注结果"""
         if not self.current_data:
@@ -93,28 +219,31 @@ class AnnotationPlatform:
             # 重标注模式：保存到relabeled_data.json
             return self.save_relabel_annotation(sample_id, annotations)
             
-        # 创建带标注的数据副本
-        annotated_data = copy.deepcopy(self.current_data)
-        
-        # 更新对应样本的标注
-        for sample in annotated_data['samples']:
-            if sample['benchmark_id'] == sample_id:
-                # 保存原始答案
-                if 'original_labels' not in sample:
-                    sample['original_labels'] = copy.deepcopy(sample['evaluation_labels'])
-                
-                # 更新为人工标注答案
-                sample['evaluation_labels'] = annotations
-                sample['human_annotated'] = True
-                break
+        _, sample = self.find_sample(sample_id)
+        if sample is None:
+            return False
         
-        # 保存到标注文件夹
-        annotated_file = ANNOTATED_DIR / f"annotated_{self.current_file}"
-        with open(annotated_file, 'w', encoding='utf-8') as f:
-            json.dump(annotated_data, f, ensure_ascii=False, indent=2)
-            
+        # 只写入这一个样本的标注记录(第一次标注时同时记录原始答案)
+        original_labels = sample.get('original_labels', sample.get('evaluation_labels'))
+        self.store.save(self.current_file, sample_id, annotations, original_labels, self.annotator_id)
+        # 一致性计数只更新这一个样本(原始答案以标注记录中第一次保存的为准)
+        record = self.store.get(self.current_file, sample_id)
+        agreement_cache.record(self.current_file, len(self.current_data['samples']), sample_id,
+                               record['original_labels'], record['annotations'])
         return True
     
+    def export_annotations(self):
+        """
+        生成带人工标注的 annotated_<数据集>.json(标注有更新时才重新生成)
+        
+        Returns:
+            标注文件路径，没有任何标注时返回 None
+        """
+        if not self.current_data or self.relabel_mode:
+            return None
+        
+        return self.store.export(self.current_file, self.current_data, ANNOTATED_DIR / f"annotated_{self.current_file}")
+    
     def load_relabel_data(self):
         """加载重标注数据"""
         if not RELABEL_DATA_FILE.exists():
@@ -122,26 +251,13 @@ class AnnotationPlatform:
             return False
         
         try:
-            with open(RELABEL_DATA_FILE, 'r', encoding='utf-8') as f:
-                self.current_data = json.load(f)
+            self.current_data, self.positions = registry.get(RELABEL_DATA_FILE)
             self.current_file = "relabel_whole_data.json"
             self.current_sample_index = 0
             self.relabel_mode = True
             
             # 加载已有的重标注结果（如果存在）
-            if RELABELED_OUTPUT_FILE.exists():
-                with open(RELABELED_OUTPUT_FILE, 'r', encoding='utf-8') as f:
-                    self.relabeled_data = json.load(f)
-            else:
-                # 初始化重标注结果数据结构
-                self.relabeled_data = {
-                    "dataset_info": {
-                        "description": "人工重标注结果",
-                        "source": str(RELABEL_DATA_FILE),
-                        "total_relabeled": 0
-                    },
-                    "relabeled_samples": []
-                }
+            self.relabeled_data = registry.get_relabeled_data()
             
             print(f"成功加载重标注数据，样本数: {len(self.current_data.get('samples', []))}")
             return True
@@ -155,11 +271,7 @@ class AnnotationPlatform:
             return False
         
         # 查找当前样本
-        current_sample = None
-        for sample in self.current_data['samples']:
-            if sample['benchmark_id'] == sample_id:
-                current_sample = sample
-                break
+        _, current_sample = self.find_sample(sample_id)
         
         if not current_sample:
             return False
@@ -169,26 +281,26 @@ class AnnotationPlatform:
             "benchmark_id": sample_id,
             "conflict_task_types": current_sample.get('conflict_task_types', []),
             "human_annotations": annotations,
-            "human_annotated": True
+            "human_annotated": True,
+            "annotator": self.annotator_id
         }
         
-        # 更新或添加记录
-        found = False
-        for i, record in enumerate(self.relabeled_data['relabeled_samples']):
-            if record['benchmark_id'] == sample_id:
-                self.relabeled_data['relabeled_samples'][i] = relabel_record
-                found = True
-                break
-        
-        if not found:
-            self.relabeled_data['relabeled_samples'].append(relabel_record)
-        
-        # 更新统计
-        self.relabeled_data['dataset_info']['total_relabeled'] = len(self.relabeled_data['relabeled_samples'])
-        
-        # 保存到文件
-        with open(RELABELED_OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.relabeled_data, f, ensure_ascii=False, indent=2)
+        # 重标注结果由所有会话共享，更新和写文件都在锁内完成
+        with registry.relabel_lock:
+            # 更新或添加记录
+            position = registry.relabel_positions.get(str(sample_id))
+            if position is not None:
+                self.relabeled_data['relabeled_samples'][position] = relabel_record
+            else:
+                registry.relabel_positions[str(sample_id)] = len(self.relabeled_data['relabeled_samples'])
+                self.relabeled_data['relabeled_samples'].append(relabel_record)
+            
+            # 更新统计
+            self.relabeled_data['dataset_info']['total_relabeled'] = len(self.relabeled_data['relabeled_samples'])
+            
+            # 保存到文件
+            with open(RELABELED_OUTPUT_FILE, 'w', encoding='utf-8') as f:
+                json.dump(self.relabeled_data, f, ensure_ascii=False, indent=2)
         
         return True
     
@@ -197,6 +309,7 @@ class AnnotationPlatform:
         self.relabel_mode = False
         self.relabeled_data = None
         self.current_data = None
+        self.positions = {}
         self.current_file = None
         self.current_sample_index = 0
     
@@ -228,9 +341,65 @@ class AnnotationPlatform:
             self.current_sample_index = index
             return True
         return False
+    
+    def goto_sample_id(self, sample_id):
+        """跳转到指定 benchmark_id 的样本"""
+        position, _ = self.find_sample(sample_id)
+        if position is None:
+            return False
+        self.current_sample_index = position
+        return True
+
+def project_sample(sample):
+    """
+    按请求参数裁剪样本字段
+    
+    fields=a,b 只返回这些字段；否则去掉 DEFAULT_EXCLUDED_FIELDS 中的字段，include=a,b 可以加回
+    """
+    if sample is None:
+        return None
+    fields = request.args.get('fields')
+    if fields:
+        wanted = set(fields.split(','))
+        return {key: value for key, value in sample.items() if key in wanted}
+    excluded = DEFAULT_EXCLUDED_FIELDS - set(request.args.get('include', '').split(','))
+    return {key: value for key, value in sample.items() if key not in excluded}
+
+
+def json_response(payload):
+    """
+    紧凑的 JSON 响应
+    
+    GET 请求带弱 ETag，内容未变时返回 304；响应较大且客户端支持时 gzip 压缩
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    response = app.response_class(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if request.method == 'GET':
+        response.set_etag(hashlib.md5(body).hexdigest(), weak=True)
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 
-# 全局平台实例
-platform = AnnotationPlatform()
+# 各标注员的会话
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def get_session():
+    """当前请求的标注员会话(按请求头 X-Annotator-Id 区分，第一次请求时创建)"""
+    annotator_id = unquote(request.headers.get(ANNOTATOR_HEADER, '')) or request.args.get('annotator') or DEFAULT_ANNOTATOR
+    with sessions_lock:
+        session = sessions.get(annotator_id)
+        if session is None:
+            session = sessions[annotator_id] = AnnotationPlatform(annotator_id)
+        return session
 
 @app.route('/')
 def index():
@@ -240,18 +409,19 @@ def index():
 @app.route('/api/files')
 def get_files():
     """获取可用文件列表"""
-    files = platform.get_available_files()
+    files = AnnotationPlatform.get_available_files()
     return jsonify({'files': files})
 
 @app.route('/api/load/<filename>')
 def load_file(filename):
     """加载指定文件"""
-    success = platform.load_dataset(filename)
+    session = get_session()
+    success = session.load_dataset(filename)
     if success:
-        return jsonify({
+        return json_response({
             'success': True,
-            'dataset_info': platform.get_dataset_info(),
-            'sample': platform.get_current_sample()
+            'dataset_info': session.get_dataset_info(),
+            'sample': project_sample(session.get_current_sample())
         })
     else:
         return jsonify({'success': False, 'error': '文件加载失败'})
@@ -259,50 +429,88 @@ def load_file(filename):
 @app.route('/api/sample')
 def get_sample():
     """获取当前样本"""
-    sample = platform.get_current_sample()
-    dataset_info = platform.get_dataset_info()
+    session = get_session()
+    sample = session.get_current_sample()
+    dataset_info = session.get_dataset_info(full=False)
     
     if sample:
-        return jsonify({
+        return json_response({
             'success': True,
-            'sample': sample,
+            'sample': project_sample(sample),
             'dataset_info': dataset_info
         })
     else:
         return jsonify({'success': False, 'error': '没有可用样本'})
 
+@app.route('/api/sample/<path:benchmark_id>')
+def get_sample_by_id(benchmark_id):
+    """按 benchmark_id 获取样本(不改变当前位置)"""
+    session = get_session()
+    index, sample = session.find_sample(benchmark_id)
+    
+    if sample:
+        return json_response({
+            'success': True,
+            'sample': project_sample(sample),
+            'index': index
+        })
+    else:
+        return jsonify({'success': False, 'error': f'没有找到样本: {benchmark_id}'})
+
 @app.route('/api/navigate', methods=['POST'])
 def navigate():
     """样本导航"""
+    session = get_session()
     data = request.get_json()
     action = data.get('action')
     
     success = False
     if action == 'next':
-        success = platform.next_sample()
+        success = session.next_sample()
     elif action == 'prev':
-        success = platform.prev_sample()
+        success = session.prev_sample()
     elif action == 'goto':
         index = data.get('index', 0)
-        success = platform.goto_sample(index)
+        success = session.goto_sample(index)
+    elif action == 'goto_id':
+        success = session.goto_sample_id(data.get('benchmark_id'))
     
     if success:
-        return jsonify({
-            'success': True,
-            'sample': platform.get_current_sample(),
-            'dataset_info': platform.get_dataset_info()
-        })
+        payload = {'success': True, 'dataset_info': session.get_dataset_info(full=False)}
+        # 前端已预取目标样本时只同步位置
+        if data.get('include_sample', True):
+            payload['sample'] = project_sample(session.get_current_sample())
+        return json_response(payload)
     else:
         return jsonify({'success': False, 'error': '导航失败'})
 
+@app.route('/api/prefetch')
+def prefetch():
+    """
+    预取样本: 从 start(默认为当前样本的下一个)开始的 k 个样本
+    
+    不改变当前位置；支持与 /api/sample 相同的 fields / include 参数
+    """
+    session = get_session()
+    start = request.args.get('start', session.current_sample_index + 1, type=int)
+    count = min(max(request.args.get('k', 3, type=int), 0), PREFETCH_MAX)
+    return json_response({
+        'success': True,
+        'samples': [
+            {'index': index, 'sample': project_sample(sample)}
+            for index, sample in session.get_samples(start, count)
+        ]
+    })
+
 @app.route('/api/annotate', methods=['POST'])
 def annotate():
     """保存标注"""
+    session = get_session()
     data = request.get_json()
     sample_id = data.get('sample_id')
     annotations = data.get('annotations')
     
-    success = platform.save_annotation(sample_id, annotations)
+    success = session.save_annotation(sample_id, annotations)
     
     if success:
         return jsonify({'success': True, 'message': '标注已保存'})
@@ -311,29 +519,62 @@ def annotate():
 
 @app.route('/api/analysis')
 def get_analysis():
-    """获取标注分析结果"""
-    if not platform.current_file:
+    """获取标注分析结果(由增量计数缓存，不重新生成和读取标注文件)"""
+    session = get_session()
+    if not session.current_file:
         return jsonify({'success': False, 'error': '没有加载数据文件'})
-    
-    annotated_file = ANNOTATED_DIR / f"annotated_{platform.current_file}"
-    
-    if not annotated_file.exists():
+    if session.relabel_mode or not annotation_store.count(session.current_file):
         return jsonify({'success': False, 'error': '没有找到标注文件'})
     
     try:
-        analyzer = AnnotationAnalyzer(str(annotated_file))
-        metrics = analyzer.calculate_agreement_metrics()
-        report = analyzer.generate_detailed_report()
-        
+        result = agreement_cache.get(session.current_file, len(session.current_data['samples']))
+        annotated_file = ANNOTATED_DIR / f"annotated_{session.current_file}"
         return jsonify({
             'success': True,
-            'metrics': metrics,
-            'report': report,
-            'annotated_file': str(annotated_file)
+            'metrics': result['metrics'],
+            'report': result['report'],
+            'version': result['version'],
+            'stale': result['stale'],
+            'annotated_file': str(annotated_file) if annotated_file.exists() else None
         })
     except Exception as e:
         return jsonify({'success': False, 'error': f'分析失败: {str(e)}'})
 
+@app.route('/api/annotations/export')
+def export_annotations():
+    """生成带人工标注的 annotated_<数据集>.json(标注有更新时才重新生成)"""
+    session = get_session()
+    if not session.current_file:
+        return jsonify({'success': False, 'error': '没有加载数据文件'})
+    
+    annotated_file = session.export_annotations()
+    if annotated_file is None:
+        return jsonify({'success': False, 'error': '没有找到标注文件'})
+    return jsonify({'success': True, 'annotated_file': str(annotated_file)})
+
+@app.route('/api/sessions')
+def get_sessions():
+    """所有标注员的当前文件、位置和已保存的样本数"""
+    with sessions_lock:
+        active = list(sessions.values())
+    annotated = {}
+    for session in active:
+        if session.current_file and not session.relabel_mode and session.current_file not in annotated:
+            annotated[session.current_file] = annotation_store.count_by_annotator(session.current_file)
+    return jsonify({
+        'success': True,
+        'sessions': [
+            {
+                'annotator': session.annotator_id,
+                'file': session.current_file,
+                'current_index': session.current_sample_index,
+                'relabel_mode': session.relabel_mode,
+                'annotated': annotated.get(session.current_file, {}).get(session.annotator_id, 0)
+            }
+            for session in active
+        ]
+    })
+
 @app.route('/analysis')
 def analysis_page():
     """分析页面"""
@@ -344,14 +585,15 @@ def analysis_page():
 @app.route('/api/relabel/load')
 def load_relabel_data():
     """加载重标注数据"""
-    success = platform.load_relabel_data()
+    session = get_session()
+    success = session.load_relabel_data()
     if success:
-        return jsonify({
+        return json_response({
             'success': True,
-            'dataset_info': platform.get_dataset_info(),
-            'sample': platform.get_current_sample(),
+            'dataset_info': session.get_dataset_info(),
+            'sample': project_sample(session.get_current_sample()),
             'relabel_mode': True,
-            'total_relabeled': len(platform.relabeled_data.get('relabeled_samples', [])) if platform.relabeled_data else 0
+            'total_relabeled': len(session.relabeled_data.get('relabeled_samples', [])) if session.relabeled_data else 0
         })
     else:
         return jsonify({'success': False, 'error': '重标注数据加载失败'})
@@ -359,16 +601,18 @@ def load_relabel_data():
 @app.route('/api/relabel/exit')
 def exit_relabel_mode():
     """退出重标注模式"""
-    platform.exit_relabel_mode()
+    session = get_session()
+    session.exit_relabel_mode()
     return jsonify({'success': True, 'message': '已退出重标注模式'})
 
 @app.route('/api/relabel/status')
 def get_relabel_status():
     """获取重标注模式状态"""
+    session = get_session()
     return jsonify({
-        'relabel_mode': platform.relabel_mode,
+        'relabel_mode': session.relabel_mode,
         'relabel_file_exists': RELABEL_DATA_FILE.exists(),
-        'total_relabeled': len(platform.relabeled_data.get('relabeled_samples', [])) if platform.relabeled_data else 0
+        'total_relabeled': len(session.relabeled_data.get('relabeled_samples', [])) if session.relabeled_data else 0
     })
 
 if __name__ == '__main__':
@@ -11,6 +11,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from annotation_analysis import AnnotationAnalyzer
+from annotation_store import export_annotated_files
 
 def check_dependencies():
     """检查依赖包"""
@@ -47,6 +48,9 @@ def main():
         print(f"标注文件应保存在: {annotated_dir.absolute()}")
         return
     
+    # 标注平台只把标注写入 annotations.db，先导出有更新的标注文件
+    export_annotated_files(annotated_dir)
+    
     # 查找标注文件
     annotated_files = list(annotated_dir.glob("annotated_*.json"))
     if not annotated_files:
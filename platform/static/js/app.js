@@ -12,12 +12,48 @@ class AnnotationPlatform {
         this.relabelMode = false;  // 重标注模式标志
         this.totalRelabeled = 0;   // 已重标注数量
         this.visibleTasks = [];    // 重标注模式下可见的任务列表
+        this.annotatorId = this.getAnnotatorId();  // 标注员 ID（区分服务器上各标注员的会话）
+        this.sampleCache = new Map();   // 预取的样本：位置 -> 样本
+        this.cacheKey = 0;              // 切换数据集或模式时递增，丢弃过期的预取结果
+        this.prefetchCount = 3;         // 向后预取的样本数
+        this.syncQueue = Promise.resolve();  // 按顺序向服务器同步位置
         
         this.initializeEventListeners();
         this.loadAvailableFiles();
         this.checkRelabelStatus();
     }
     
+    // 读取标注员 ID（首次使用时输入名称，保存在 localStorage）
+    getAnnotatorId() {
+        let annotatorId = null;
+        try {
+            annotatorId = localStorage.getItem('annotator_id');
+        } catch (e) {
+            annotatorId = null;
+        }
+        if (!annotatorId) {
+            const name = (window.prompt('请输入标注员名称') || '').trim();
+            annotatorId = name || `annotator-${Math.random().toString(36).slice(2, 8)}`;
+            try {
+                localStorage.setItem('annotator_id', annotatorId);
+            } catch (e) {
+                console.error('保存标注员 ID 失败:', e);
+            }
+        }
+        return annotatorId;
+    }
+    
+    // 带标注员 ID 的请求（请求头只能是 ASCII，名称做 URL 编码）
+    api(url, options = {}) {
+        return fetch(url, {
+            ...options,
+            headers: {
+                ...(options.headers || {}),
+                'X-Annotator-Id': encodeURIComponent(this.annotatorId)
+            }
+        });
+    }
+    
     // 规范化角色名（用于颜色映射 key）
     normalizeRoleName(roleName) {
         return (roleName ?? '').toString().trim().toLowerCase();
@@ -128,8 +164,13 @@ class AnnotationPlatform {
         });
         
         document.getElementById('gotoBtn').addEventListener('click', () => {
-            const index = parseInt(document.getElementById('gotoInput').value) - 1;
-            this.navigate('goto', index);
+            // 输入纯数字时按序号跳转，否则按 benchmark_id 跳转
+            const value = document.getElementById('gotoInput').value.trim();
+            if (/^\d+$/.test(value)) {
+                this.navigate('goto', parseInt(value) - 1);
+            } else if (value) {
+                this.navigateToId(value);
+            }
         });
         
         // 保存按钮
@@ -152,7 +193,7 @@ class AnnotationPlatform {
     
     async checkRelabelStatus() {
         try {
-            const response = await fetch('/api/relabel/status');
+            const response = await this.api('/api/relabel/status');
             const data = await response.json();
             
             // 更新重标注按钮状态
@@ -183,11 +224,13 @@ class AnnotationPlatform {
         this.showLoading(true);
         
         try {
-            const response = await fetch('/api/relabel/load');
+            await this.syncQueue;
+            const response = await this.api('/api/relabel/load');
             const data = await response.json();
             
             if (data.success) {
                 this.relabelMode = true;
+                this.resetSampleCache();
                 this.datasetInfo = data.dataset_info;
                 this.currentSample = data.sample;
                 this.totalRelabeled = data.total_relabeled || 0;
@@ -254,9 +297,11 @@ class AnnotationPlatform {
     
     async exitRelabelMode() {
         try {
-            await fetch('/api/relabel/exit');
+            await this.syncQueue;
+            await this.api('/api/relabel/exit');
             
             this.relabelMode = false;
+            this.resetSampleCache();
             this.currentSample = null;
             this.datasetInfo = null;
             this.totalRelabeled = 0;
@@ -296,7 +341,7 @@ class AnnotationPlatform {
     
     async loadAvailableFiles() {
         try {
-            const response = await fetch('/api/files');
+            const response = await this.api('/api/files');
             const data = await response.json();
             
             const select = document.getElementById('fileSelect');
@@ -325,7 +370,8 @@ class AnnotationPlatform {
         
         try {
             console.log('开始请求文件:', filename);
-            const response = await fetch(`/api/load/${filename}`);
+            await this.syncQueue;
+            const response = await this.api(`/api/load/${filename}`);
             console.log('收到响应:', response.status);
             
             const data = await response.json();
@@ -333,6 +379,7 @@ class AnnotationPlatform {
             
             if (data.success) {
                 console.log('数据加载成功，开始显示');
+                this.resetSampleCache();
                 this.datasetInfo = data.dataset_info;
                 this.currentSample = data.sample;
                 console.log('当前样本:', this.currentSample);
@@ -354,13 +401,25 @@ class AnnotationPlatform {
     }
     
     async navigate(action, index = null) {
+        // 目标样本已预取时立即显示，再在后台同步服务器上的位置
+        const target = this.navigationTarget(action, index);
+        if (target !== null && this.sampleCache.has(target)) {
+            this.datasetInfo = { ...this.datasetInfo, current_index: target };
+            this.currentSample = this.sampleCache.get(target);
+            this.displaySample();
+            this.syncPosition(target);
+            return;
+        }
+        
         const payload = { action };
         if (index !== null) {
             payload.index = index;
         }
         
         try {
-            const response = await fetch('/api/navigate', {
+            // 等待之前的位置同步完成，避免服务器按乱序的请求移动位置
+            await this.syncQueue;
+            const response = await this.api('/api/navigate', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -371,7 +430,7 @@ class AnnotationPlatform {
             const data = await response.json();
             
             if (data.success) {
-                this.datasetInfo = data.dataset_info;
+                this.datasetInfo = { ...this.datasetInfo, ...data.dataset_info };
                 this.currentSample = data.sample;
                 this.displaySample();
             } else {
@@ -383,6 +442,101 @@ class AnnotationPlatform {
         }
     }
     
+    // 导航后的目标位置（无法确定时返回 null）
+    navigationTarget(action, index) {
+        if (!this.datasetInfo) return null;
+        const current = this.datasetInfo.current_index;
+        let target = null;
+        if (action === 'next') {
+            target = current + 1;
+        } else if (action === 'prev') {
+            target = current - 1;
+        } else if (action === 'goto') {
+            target = index;
+        }
+        if (target === null || target < 0 || target >= this.datasetInfo.total_samples) {
+            return null;
+        }
+        return target;
+    }
+    
+    // 在后台把服务器上的位置同步到 index（不取回样本）
+    syncPosition(index) {
+        this.syncQueue = this.syncQueue.then(() => this.api('/api/navigate', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ action: 'goto', index: index, include_sample: false })
+        })).catch(error => {
+            console.error('同步位置失败:', error);
+        });
+    }
+    
+    // 预取当前样本之后的几个样本
+    async prefetchSamples() {
+        if (!this.datasetInfo) return;
+        const current = this.datasetInfo.current_index;
+        
+        // 只保留当前位置附近的缓存
+        for (const index of [...this.sampleCache.keys()]) {
+            if (index < current - this.prefetchCount || index > current + this.prefetchCount * 2) {
+                this.sampleCache.delete(index);
+            }
+        }
+        
+        let start = current + 1;
+        while (this.sampleCache.has(start)) {
+            start++;
+        }
+        const end = Math.min(current + this.prefetchCount, this.datasetInfo.total_samples - 1);
+        if (start > end) return;
+        
+        try {
+            const cacheKey = this.cacheKey;
+            const response = await this.api(`/api/prefetch?start=${start}&k=${end - start + 1}`);
+            const data = await response.json();
+            // 期间切换了数据集或模式时丢弃
+            if (data.success && cacheKey === this.cacheKey) {
+                data.samples.forEach(item => this.sampleCache.set(item.index, item.sample));
+            }
+        } catch (error) {
+            console.error('预取样本失败:', error);
+        }
+    }
+    
+    // 切换数据集或模式时清空预取缓存
+    resetSampleCache() {
+        this.sampleCache.clear();
+        this.cacheKey++;
+    }
+    
+    async navigateToId(benchmarkId) {
+        try {
+            await this.syncQueue;
+            const response = await this.api('/api/navigate', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ action: 'goto_id', benchmark_id: benchmarkId })
+            });
+            
+            const data = await response.json();
+            
+            if (data.success) {
+                this.datasetInfo = { ...this.datasetInfo, ...data.dataset_info };
+                this.currentSample = data.sample;
+                this.displaySample();
+            } else {
+                this.showAlert(`没有找到样本: ${benchmarkId}`, 'warning');
+            }
+        } catch (error) {
+            console.error('跳转失败:', error);
+            this.showAlert('跳转失败', 'danger');
+        }
+    }
+    
     displaySample() {
         console.log('开始显示样本');
         if (!this.currentSample) {
@@ -408,6 +562,10 @@ class AnnotationPlatform {
         console.log('更新导航状态');
         this.updateNavigation();
         
+        // 缓存当前样本并在后台预取后面的样本
+        this.sampleCache.set(this.datasetInfo.current_index, this.currentSample);
+        this.prefetchSamples();
+        
         console.log('样本显示完成');
     }
     
@@ -966,7 +1124,7 @@ class AnnotationPlatform {
         }
         
         try {
-            const response = await fetch('/api/annotate', {
+            const response = await this.api('/api/annotate', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -1037,7 +1195,7 @@ class AnnotationPlatform {
         }
         
         try {
-            const response = await fetch('/api/annotate', {
+            const response = await this.api('/api/annotate', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'